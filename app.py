@@ -9,7 +9,9 @@ from services import (
     enhance_prompt,
     generative_fill,
     generate_hd_image,
-    erase_foreground
+    erase_foreground,
+    fan_out,
+    ImageHandle
 )
 from PIL import Image
 import io
@@ -17,9 +19,13 @@ import requests
 import json
 import time
 import base64
+import hashlib
+import uuid
 from streamlit_drawable_canvas import st_canvas
 import numpy as np
 from services.erase_foreground import erase_foreground
+from services import transport, jobs, job_queue, metrics, adaptive, breaker, cassette, CircuitOpenError, CancelToken
+from utils import image_ops
 
 # Configure Streamlit page with enhanced layout
 st.set_page_config(
@@ -133,13 +139,36 @@ st.markdown("""
 print("Loading environment variables...")
 load_dotenv(verbose=True)
 
+@st.cache_resource
+def warm_up_connections():
+    """Pre-open pooled Bria API connections once per process."""
+    return transport.warm_up_in_background()
+
+if os.getenv('BRIA_WARMUP', '').lower() in ('1', 'true', 'yes'):
+    warm_up_connections()
+
+@st.cache_resource
+def start_metrics_server(port):
+    """Expose Prometheus metrics on /metrics once per process."""
+    return metrics.start_http_server(port)
+
+if os.getenv('BRIA_METRICS_PORT'):
+    start_metrics_server(int(os.getenv('BRIA_METRICS_PORT')))
+
 def initialize_session_state():
     """Initialize session state variables with improved structure."""
     defaults = {
         'api_key': os.getenv('BRIA_API_KEY'),
         'generated_images': [],
+        'image_seeds': {},
         'current_image': None,
         'pending_urls': [],
+        'queued_jobs': [],
+        'notices': [],
+        'downloads': {},
+        'user_id': uuid.uuid4().hex,
+        'background_mode': False,
+        'image_handles': {},
         'edited_image': None,
         'original_prompt': "",
         'enhanced_prompt': None,
@@ -152,15 +181,261 @@ def initialize_session_state():
         if key not in st.session_state:
             st.session_state[key] = value
 
+@st.cache_resource
+def get_job_tracker():
+    """Process-wide poller for placeholder URLs returned by sync=False calls."""
+    return jobs.JobTracker()
+
+def queue_background_result(result, label):
+    """Register the placeholder URLs of a sync=False response for polling."""
+    urls = jobs.result_urls(result)
+    if not urls:
+        notify("error", "Unexpected response format from API")
+        return
+    get_job_tracker().track(urls, label=label)
+    st.session_state.pending_urls.extend(url for url in urls if url not in st.session_state.pending_urls)
+    st.session_state.history.append(f"Queued {label}")
+    notify("info", f"⏳ {label} queued — results will appear below as they finish.")
+
+@st.cache_resource
+def get_job_queue():
+    """Process-wide worker pool that runs Bria calls outside the script thread."""
+    max_per_user = os.getenv('BRIA_QUEUE_MAX_PER_USER')
+    abandon_after = float(os.getenv('BRIA_QUEUE_ABANDON_AFTER', '60'))
+    return job_queue.JobQueue(
+        workers=int(os.getenv('BRIA_QUEUE_WORKERS', '4')),
+        max_per_user=int(max_per_user) if max_per_user else None,
+        # Job panels poll every second while they have jobs; silence means the tab is gone
+        abandon_after=abandon_after if abandon_after > 0 else None
+    )
+
+def submission_key(fn, kwargs):
+    """Fingerprint of a service call, used to spot repeated submissions."""
+    digest = hashlib.sha256(f"{fn.__module__}.{fn.__qualname__}".encode())
+    for name in sorted(kwargs):
+        if name in ('api_key', 'cancel'):
+            continue
+        value = kwargs[name]
+        if isinstance(value, (bytes, ImageHandle)):
+            value = ImageHandle.of(value).digest
+        digest.update(f"\0{name}={value!r}".encode())
+    return digest.hexdigest()
+
+def enqueue_job(fn, kwargs, label, background=False, slot=None):
+    """
+    Run a service call on the job queue; its result is collected on a later rerun.
+    
+    A submission identical to a job still in progress is ignored. A new job in
+    ``slot`` (e.g. the tab whose result it fills) cancels the previous one there.
+    """
+    queue = get_job_queue()
+    key = submission_key(fn, kwargs)
+    for entry in st.session_state.queued_jobs:
+        job = queue.get(entry['id'])
+        if job is None or job.done:
+            continue
+        if entry.get('key') == key:
+            metrics.increment("debounced_submissions")
+            st.info(f"🧵 {label} is already in progress.")
+            return entry['id']
+        if slot is not None and entry.get('slot') == slot:
+            queue.cancel(entry['id'], reason="superseded")
+    
+    token = CancelToken()
+    job_id = queue.submit(
+        fn,
+        kwargs=dict(kwargs, cancel=token),
+        user=st.session_state.user_id,
+        # Nobody waits on a sync=False submission, so let interactive calls go first
+        priority=job_queue.BATCH if background else job_queue.INTERACTIVE,
+        label=label,
+        cancel=token
+    )
+    st.session_state.queued_jobs.append(
+        {'id': job_id, 'label': label, 'background': background, 'key': key, 'slot': slot}
+    )
+    st.info(f"🧵 {label} queued — the result will appear when it is ready.")
+    return job_id
+
+def result_seeds(result, count):
+    """Seed of each result image: per sub-request for a fan-out, else the response's own seed."""
+    if isinstance(result, dict):
+        if result.get('result_seeds'):
+            return result['result_seeds']
+        if result.get('seed') is not None:
+            return [result['seed']] * count
+    return [None] * count
+
+def apply_job_result(entry, result):
+    """Move a finished job's result into session state."""
+    if entry['background']:
+        queue_background_result(result, entry['label'])
+        return
+    urls = jobs.result_urls(result)
+    if not urls:
+        notify("error", f"Unexpected response format from API for {entry['label']}")
+        return
+    if isinstance(result, dict) and (len(urls) > 1 or "result_urls" in result):
+        st.session_state.generated_images = urls
+        st.session_state.image_seeds = dict(zip(urls, result_seeds(result, len(urls))))
+    st.session_state.edited_image = urls[0]
+    st.session_state.history.append(f"Finished {entry['label']}")
+    notify("success", f"✨ {entry['label']} ready!")
+
+def render_queued_jobs():
+    """
+    Move finished queue jobs into session state and show the ones still running.
+    
+    Returns True if any job finished.
+    """
+    entries = st.session_state.get('queued_jobs') or []
+    if not entries:
+        return False
+    
+    queue = get_job_queue()
+    waiting, finished = [], []
+    for entry in entries:
+        job = queue.get(entry['id'])
+        if job is None:
+            notify("warning", f"{entry['label']} is no longer tracked")
+        elif job.status == job_queue.DONE:
+            apply_job_result(entry, job.result)
+            finished.append(job.id)
+        elif job.status == job_queue.FAILED:
+            if isinstance(job.error, CircuitOpenError):
+                notify("warning", f"⚠️ {str(job.error)}")
+            else:
+                notify("error", f"Error in {entry['label']}: {str(job.error)}")
+            finished.append(job.id)
+        elif job.status == job_queue.CANCELLED:
+            reason = job.cancel.reason if job.cancel is not None else None
+            if reason == "superseded":
+                notify("caption", f"{entry['label']} was replaced by a newer request")
+            else:
+                notify("info", f"{entry['label']} was cancelled")
+            finished.append(job.id)
+        else:
+            waiting.append((entry, job))
+    
+    if waiting:
+        with st.expander(f"🧵 Jobs ({len(waiting)} in progress)", expanded=True):
+            for entry, job in waiting:
+                if job.status == job_queue.RUNNING:
+                    st.caption(f"▶️ {entry['label']} — running for {time.time() - job.started_at:.0f}s")
+                else:
+                    st.caption(f"🕒 {entry['label']} — queued, {queue.position(job.id) or 0} job(s) ahead")
+    
+    queue.forget(finished)
+    st.session_state.queued_jobs = [entry for entry, _ in waiting]
+    return len(waiting) < len(entries)
+
+def render_pending_results():
+    """Show background results as they become ready. Returns True if any finished."""
+    pending = st.session_state.get('pending_urls') or []
+    if not pending:
+        return False
+    
+    tracker = get_job_tracker()
+    ready, failed, waiting = [], [], []
+    for url in pending:
+        status = tracker.status(url)
+        if status == jobs.READY:
+            ready.append(url)
+        elif status == jobs.FAILED or status is None:
+            failed.append(url)
+        else:
+            waiting.append(url)
+    
+    if ready:
+        st.session_state.generated_images = ready + [
+            url for url in st.session_state.generated_images if url not in ready
+        ]
+        st.session_state.edited_image = ready[0]
+    
+    with st.expander(f"⏳ Background Jobs ({len(waiting)} running)", expanded=True):
+        done = len(ready) + len(failed)
+        st.progress(done / len(pending))
+        if ready:
+            img_cols = st.columns(min(4, len(ready)))
+            for idx, url in enumerate(ready):
+                with img_cols[idx % len(img_cols)]:
+                    st.image(url, use_column_width=True)
+        for url in failed:
+            result = tracker.get(url)
+            notify("warning", f"A background result failed: {result.error if result else 'no longer tracked'}")
+    
+    tracker.forget(ready + failed)
+    st.session_state.pending_urls = waiting
+    return bool(ready or failed)
+
+def poll_jobs():
+    """Collect finished jobs; rerun the whole app only when one has a result to show."""
+    get_job_queue().touch(st.session_state.user_id)
+    finished = render_queued_jobs()
+    finished = render_pending_results() or finished
+    if finished:
+        st.rerun()
+
+def render_jobs_panel():
+    """Show queued and background jobs, refreshing only this panel while any are running."""
+    if st.session_state.queued_jobs:
+        interval = 1
+    elif st.session_state.pending_urls:
+        interval = 2
+    else:
+        return
+    st.fragment(run_every=interval)(poll_jobs)()
+
+def notify(kind, message):
+    """Queue a message for the next full run; job results arrive during panel-only reruns."""
+    st.session_state.notices.append((kind, message))
+
+def show_notices():
+    """Show and clear the messages queued by notify()."""
+    for kind, message in st.session_state.notices:
+        getattr(st, kind)(message)
+    st.session_state.notices = []
+
+def get_image_handle(uploaded_file):
+    """Return a cached ImageHandle for an upload so it is read and encoded only once."""
+    file_key = getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+    handles = st.session_state.image_handles
+    if file_key not in handles:
+        # Keep only the most recent uploads to bound session memory
+        while len(handles) >= 4:
+            handles.pop(next(iter(handles)))
+        handles[file_key] = ImageHandle(uploaded_file.getvalue(), name=uploaded_file.name)
+    return handles[file_key]
+
+def show_endpoint_status(*paths):
+    """Warn when one of the tab's endpoints is failing fast behind an open circuit breaker."""
+    for status in breaker.degraded():
+        # Versioned endpoints (e.g. /v1/text-to-image/hd/2.2) match their base path
+        if not status['endpoint'].startswith(paths):
+            continue
+        if status['state'] == breaker.OPEN:
+            st.warning(
+                f"⚠️ `{status['endpoint']}` is degraded — requests are paused for "
+                f"{status['retry_in']:.0f}s after repeated failures."
+            )
+        else:
+            st.info(f"🔄 `{status['endpoint']}` is recovering — a few test requests are being let through.")
+
 def download_image(url):
-    """Download image from URL with enhanced error handling."""
+    """Download image from URL with enhanced error handling, once per session."""
+    downloads = st.session_state.downloads
+    if url in downloads:
+        return downloads[url]
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        return response.content
+        data = transport.download(url, timeout=10)
     except requests.exceptions.RequestException as e:
         st.error(f"🚨 Error downloading image: {str(e)}")
         return None
+    # Enough for a full 32-image grid; the oldest downloads go first
+    while len(downloads) >= 32:
+        downloads.pop(next(iter(downloads)))
+    downloads[url] = data
+    return data
 
 def create_feature_card(title, description, icon="✨"):
     """Create a consistent feature card UI element."""
@@ -180,7 +455,7 @@ def show_image_editor(image, key_suffix=""):
         with cols[0]:
             filter_type = st.selectbox(
                 "Select Filter", 
-                ["None", "Grayscale", "Sepia", "High Contrast", "Blur"],
+                image_ops.FILTERS,
                 key=f"filter_{key_suffix}"
             )
             
@@ -219,22 +494,7 @@ def show_image_editor(image, key_suffix=""):
             img = Image.open(io.BytesIO(image)) if isinstance(image, bytes) else image
             
             if filter_type != "None":
-                if filter_type == "Grayscale":
-                    img = img.convert('L')
-                elif filter_type == "Sepia":
-                    width, height = img.size
-                    pixels = img.load()
-                    for x in range(width):
-                        for y in range(height):
-                            r, g, b = img.getpixel((x, y))[:3]
-                            tr = int(0.393 * r + 0.769 * g + 0.189 * b)
-                            tg = int(0.349 * r + 0.686 * g + 0.168 * b)
-                            tb = int(0.272 * r + 0.534 * g + 0.131 * b)
-                            img.putpixel((x, y), (min(tr, 255), min(tg, 255), min(tb, 255)))
-                elif filter_type == "High Contrast":
-                    img = img.point(lambda x: x * 1.5)
-                elif filter_type == "Blur":
-                    img = img.filter(Image.BLUR)
+                img = image_ops.apply_filter(img, filter_type)
             
             # Apply other adjustments
             # (Implementation would go here)
@@ -297,6 +557,12 @@ def main():
                 st.success("API key saved!")
             
             st.markdown("[Get an API key](https://api.pixeloom.ai)")
+            
+            st.session_state.background_mode = st.toggle(
+                "Run in background",
+                value=st.session_state.background_mode,
+                help="Submit without waiting; results appear as they finish"
+            )
         
         # Quick Actions
         with st.expander("⚡ Quick Actions", expanded=True):
@@ -320,6 +586,10 @@ def main():
                 for action in reversed(st.session_state.history[-3:]):
                     st.caption(f"• {action}")
     
+    # Results of queued calls, then of background (sync=False) jobs
+    show_notices()
+    jobs_panel = st.container()
+    
     # Main tabs with enhanced UI
     tab_labels = [
         "🎨 Generate Image", 
@@ -335,6 +605,7 @@ def main():
     with tabs[0]:
         st.header("AI Image Generation")
         st.markdown("Create stunning images from text prompts with our advanced AI models.")
+        show_endpoint_status("/v1/text-to-image/hd")
         
         # Feature cards
         create_feature_card(
@@ -390,6 +661,8 @@ def main():
                                 st.session_state.enhanced_prompt_gen = result
                                 st.session_state.history.append(f"Enhanced prompt: {prompt[:30]}...")
                                 st.success("Prompt enhanced!")
+                        except CircuitOpenError as e:
+                            st.warning(f"⚠️ {str(e)}")
                         except Exception as e:
                             st.error(f"Error enhancing prompt: {str(e)}")
         
@@ -401,7 +674,7 @@ def main():
                     <h4 style="margin-top: 0;">⚙️ Generation Settings</h4>
                 """, unsafe_allow_html=True)
                 
-                num_images = st.slider("Number of images", 1, 4, 1, key="num_images_gen")
+                num_images = st.slider("Number of images", 1, 32, 1, key="num_images_gen")
                 aspect_ratio = st.selectbox("Aspect ratio", ["1:1", "16:9", "9:16", "4:3", "3:4"], key="aspect_gen")
                 style = st.selectbox("Style", [
                     "Realistic", "Artistic", "Cartoon", "Sketch", 
@@ -414,64 +687,58 @@ def main():
         if st.button("🚀 Generate Images", type="primary", key="generate_btn_main"):
             if not st.session_state.api_key:
                 st.error("Please enter your API key in the sidebar")
-                return
-                
-            if not prompt:
+            elif not prompt:
                 st.warning("Please enter a prompt")
-                return
-                
-            with st.spinner("🎨 Creating your masterpiece..."):
-                try:
-                    # Convert aspect ratio to proper format
-                    result = generate_hd_image(
+            else:
+                # More than four images are requested as parallel batches of four
+                enqueue_job(
+                    fan_out,
+                    dict(
+                        fn=generate_hd_image,
                         prompt=st.session_state.enhanced_prompt_gen or prompt,
                         api_key=st.session_state.api_key,
                         num_results=num_images,
                         aspect_ratio=aspect_ratio,
-                        sync=True,
+                        sync=not st.session_state.background_mode,
                         enhance_image=True,
                         medium="art" if style != "Realistic" else "photography",
                         content_moderation=True
-                    )
-                    
-                    if result:
-                        # Process results
-                        if isinstance(result, dict):
-                            if "result_url" in result:
-                                st.session_state.edited_image = result["result_url"]
-                                st.session_state.history.append(f"Generated image from prompt: {prompt[:30]}...")
-                                st.success("✨ Image generated successfully!")
-                            elif "result_urls" in result:
-                                st.session_state.generated_images = result["result_urls"]
-                                st.session_state.edited_image = result["result_urls"][0]
-                                st.session_state.history.append(f"Generated {len(result['result_urls'])} images")
-                                st.success(f"✨ {len(result['result_urls'])} images generated successfully!")
-                        else:
-                            st.error("Unexpected response format from API")
-                            
-                        # Display results
-                        if st.session_state.get('generated_images'):
-                            st.subheader("Generated Images")
-                            img_cols = st.columns(min(4, len(st.session_state.generated_images)))
-                            for idx, img_url in enumerate(st.session_state.generated_images[:4]):
-                                with img_cols[idx]:
-                                    st.image(img_url, use_column_width=True)
-                                    img_data = download_image(img_url)
-                                    if img_data:
-                                        st.download_button(
-                                            f"⬇️ Download #{idx+1}",
-                                            img_data,
-                                            f"generated_image_{idx+1}.png",
-                                            "image/png",
-                                            key=f"dl_gen_{idx}"
-                                        )
-                except Exception as e:
-                    st.error(f"Error generating images: {str(e)}")
+                    ),
+                    f"{num_images} image(s) for: {prompt[:30]}...",
+                    background=st.session_state.background_mode,
+                    slot="generate"
+                )
+        
+        # Display results
+        if st.session_state.get('generated_images'):
+            st.subheader("Generated Images")
+            img_cols = st.columns(min(4, len(st.session_state.generated_images)))
+            for idx, img_url in enumerate(st.session_state.generated_images):
+                with img_cols[idx % 4]:
+                    st.image(img_url, use_column_width=True)
+                    seed = st.session_state.image_seeds.get(img_url)
+                    if seed is not None:
+                        st.caption(f"Seed: {seed}")
+                    img_data = download_image(img_url)
+                    if img_data:
+                        st.download_button(
+                            f"⬇️ Download #{idx+1}",
+                            img_data,
+                            f"generated_image_{idx+1}.png",
+                            "image/png",
+                            key=f"dl_gen_{idx}"
+                        )
     
     # Product Photography Tab - Enhanced
     with tabs[1]:
         st.header("Professional Product Shots")
         st.markdown("Transform product images into professional lifestyle shots and packshots.")
+        show_endpoint_status(
+            "/v1/product/packshot",
+            "/v1/product/shadow",
+            "/v1/product/lifestyle_shot_by_text",
+            "/v1/product/lifestyle_shot_by_image"
+        )
         
         # Feature cards
         create_feature_card(
@@ -520,23 +787,19 @@ def main():
                         content_moderation = st.toggle("Content Moderation", True)
                         
                         if st.button("🖼️ Create Packshot", key="packshot_btn"):
-                            with st.spinner("Creating professional packshot..."):
-                                try:
-                                    result = create_packshot(
-                                        st.session_state.api_key,
-                                        uploaded_file.getvalue(),
-                                        background_color=bg_color,
-                                        sku=sku if sku else None,
-                                        force_rmbg=force_rmbg,
-                                        content_moderation=content_moderation
-                                    )
-                                    
-                                    if result and "result_url" in result:
-                                        st.session_state.edited_image = result["result_url"]
-                                        st.session_state.history.append("Created packshot")
-                                        st.success("✨ Packshot created successfully!")
-                                except Exception as e:
-                                    st.error(f"Error creating packshot: {str(e)}")
+                            enqueue_job(
+                                create_packshot,
+                                dict(
+                                    api_key=st.session_state.api_key,
+                                    image_data=get_image_handle(uploaded_file),
+                                    background_color=bg_color,
+                                    sku=sku if sku else None,
+                                    force_rmbg=force_rmbg,
+                                    content_moderation=content_moderation
+                                ),
+                                "Packshot",
+                                slot="product"
+                            )
                 
                 # Shadow options
                 elif edit_option == "Add Shadow":
@@ -556,24 +819,20 @@ def main():
                             offset_y = st.slider("Y Offset", -50, 50, 15)
                         
                         if st.button("🌓 Add Shadow", key="shadow_btn"):
-                            with st.spinner("Adding shadow effect..."):
-                                try:
-                                    result = add_shadow(
-                                        api_key=st.session_state.api_key,
-                                        image_data=uploaded_file.getvalue(),
-                                        shadow_type=shadow_type.lower(),
-                                        shadow_color=shadow_color,
-                                        shadow_offset=[offset_x, offset_y],
-                                        shadow_intensity=shadow_intensity,
-                                        shadow_blur=shadow_blur
-                                    )
-                                    
-                                    if result and "result_url" in result:
-                                        st.session_state.edited_image = result["result_url"]
-                                        st.session_state.history.append("Added shadow effect")
-                                        st.success("✨ Shadow added successfully!")
-                                except Exception as e:
-                                    st.error(f"Error adding shadow: {str(e)}")
+                            enqueue_job(
+                                add_shadow,
+                                dict(
+                                    api_key=st.session_state.api_key,
+                                    image_data=get_image_handle(uploaded_file),
+                                    shadow_type=shadow_type.lower(),
+                                    shadow_color=shadow_color,
+                                    shadow_offset=[offset_x, offset_y],
+                                    shadow_intensity=shadow_intensity,
+                                    shadow_blur=shadow_blur
+                                ),
+                                "Shadow effect",
+                                slot="product"
+                            )
                 
                 # Lifestyle shot options
                 elif edit_option == "Lifestyle Shot":
@@ -588,44 +847,35 @@ def main():
                                 if not prompt:
                                     st.warning("Please describe the scene")
                                 else:
-                                    with st.spinner("Creating lifestyle shot..."):
-                                        try:
-                                            result = lifestyle_shot_by_text(
-                                                api_key=st.session_state.api_key,
-                                                image_data=uploaded_file.getvalue(),
-                                                scene_description=prompt,
-                                                num_results=num_results,
-                                                sync=True
-                                            )
-                                            
-                                            if result:
-                                                if "result_urls" in result:
-                                                    st.session_state.generated_images = result["result_urls"]
-                                                    st.session_state.edited_image = result["result_urls"][0]
-                                                    st.session_state.history.append(f"Generated {len(result['result_urls'])} lifestyle shots")
-                                                    st.success(f"✨ {len(result['result_urls'])} lifestyle shots created!")
-                                        except Exception as e:
-                                            st.error(f"Error: {str(e)}")
+                                    enqueue_job(
+                                        lifestyle_shot_by_text,
+                                        dict(
+                                            api_key=st.session_state.api_key,
+                                            image_data=get_image_handle(uploaded_file),
+                                            scene_description=prompt,
+                                            num_results=num_results,
+                                            sync=not st.session_state.background_mode
+                                        ),
+                                        f"{num_results} lifestyle shot(s)",
+                                        background=st.session_state.background_mode,
+                                        slot="product"
+                                    )
                         else:
                             ref_image = st.file_uploader("Upload Reference Scene", type=["png", "jpg", "jpeg"])
                             ref_influence = st.slider("Reference Influence", 0.0, 1.0, 0.7)
                             
                             if st.button("🌆 Generate Lifestyle Shot", key="lifestyle_ref_btn") and ref_image:
-                                with st.spinner("Creating lifestyle shot..."):
-                                    try:
-                                        result = lifestyle_shot_by_image(
-                                            api_key=st.session_state.api_key,
-                                            image_data=uploaded_file.getvalue(),
-                                            reference_image=ref_image.getvalue(),
-                                            ref_image_influence=ref_influence
-                                        )
-                                        
-                                        if result and "result_url" in result:
-                                            st.session_state.edited_image = result["result_url"]
-                                            st.session_state.history.append("Created lifestyle shot from reference")
-                                            st.success("✨ Lifestyle shot created successfully!")
-                                    except Exception as e:
-                                        st.error(f"Error: {str(e)}")
+                                enqueue_job(
+                                    lifestyle_shot_by_image,
+                                    dict(
+                                        api_key=st.session_state.api_key,
+                                        image_data=get_image_handle(uploaded_file),
+                                        reference_image=get_image_handle(ref_image),
+                                        ref_image_influence=ref_influence
+                                    ),
+                                    "Lifestyle shot from reference",
+                                    slot="product"
+                                )
             
             with cols[1]:
                 # Results display
@@ -667,6 +917,7 @@ def main():
     with tabs[2]:
         st.header("AI-Powered Generative Fill")
         st.markdown("Remove unwanted elements or add new ones with AI magic.")
+        show_endpoint_status("/v1/gen_fill")
         
         # Feature cards
         create_feature_card(
@@ -734,34 +985,27 @@ def main():
                 if st.button("✨ Generate", type="primary", key="gen_fill_btn"):
                     if not prompt:
                         st.warning("Please describe what to generate")
-                    elif canvas_result.image_data is None or not np.any(canvas_result.image_data[..., -1] > 0):
+                    elif not image_ops.has_mask(canvas_result.image_data):
                         st.warning("Please draw a mask on the image first")
                     else:
-                        with st.spinner("Generating content..."):
-                            try:
-                                # Prepare mask
-                                mask_img = Image.fromarray(canvas_result.image_data.astype('uint8'), mode='RGBA')
-                                mask_img = mask_img.convert('L')
-                                mask_bytes = io.BytesIO()
-                                mask_img.save(mask_bytes, format='PNG')
-                                
-                                result = generative_fill(
-                                    st.session_state.api_key,
-                                    uploaded_file.getvalue(),
-                                    mask_bytes.getvalue(),
-                                    prompt,
-                                    negative_prompt=negative_prompt if negative_prompt else None,
-                                    num_results=num_variations,
-                                    sync=True
-                                )
-                                
-                                if result and "result_urls" in result:
-                                    st.session_state.generated_images = result["result_urls"]
-                                    st.session_state.edited_image = result["result_urls"][0]
-                                    st.session_state.history.append("Performed generative fill")
-                                    st.success(f"✨ Generated {len(result['result_urls'])} variations!")
-                            except Exception as e:
-                                st.error(f"Error: {str(e)}")
+                        # Prepare mask
+                        mask_bytes = image_ops.canvas_to_mask(canvas_result.image_data)
+                        
+                        enqueue_job(
+                            generative_fill,
+                            dict(
+                                api_key=st.session_state.api_key,
+                                image_data=get_image_handle(uploaded_file),
+                                mask_data=mask_bytes,
+                                prompt=prompt,
+                                negative_prompt=negative_prompt if negative_prompt else None,
+                                num_results=num_variations,
+                                sync=not st.session_state.background_mode
+                            ),
+                            f"{num_variations} generative fill variation(s)",
+                            background=st.session_state.background_mode,
+                            slot="fill"
+                        )
             
             with cols[1]:
                 st.subheader("Result")
@@ -802,6 +1046,7 @@ def main():
     with tabs[3]:
         st.header("AI Object Removal")
         st.markdown("Remove unwanted objects from your images seamlessly.")
+        show_endpoint_status("/v1/erase_foreground")
         
         # Feature cards
         create_feature_card(
@@ -856,29 +1101,19 @@ def main():
                     enhance_result = st.checkbox("Enhance Result Quality", True)
                 
                 if st.button("🧹 Remove Selected", type="primary", key="erase_btn_v2"):
-                    if canvas_result.image_data is None or not np.any(canvas_result.image_data[..., -1] > 0):
+                    if not image_ops.has_mask(canvas_result.image_data):
                         st.warning("Please select areas to remove first")
                     else:
-                        with st.spinner("Removing selected objects..."):
-                            try:
-                                # Prepare mask
-                                mask_img = Image.fromarray(canvas_result.image_data.astype('uint8'), mode='RGBA')
-                                mask_img = mask_img.convert('L')
-                                mask_bytes = io.BytesIO()
-                                mask_img.save(mask_bytes, format='PNG')
-                                
-                                result = erase_foreground(
-                                    st.session_state.api_key,
-                                    uploaded_file.getvalue(),
-                                    content_moderation=content_moderation
-                                )
-                                
-                                if result and "result_url" in result:
-                                    st.session_state.edited_image = result["result_url"]
-                                    st.session_state.history.append("Removed objects from image")
-                                    st.success("✨ Objects removed successfully!")
-                            except Exception as e:
-                                st.error(f"Error: {str(e)}")
+                        enqueue_job(
+                            erase_foreground,
+                            dict(
+                                api_key=st.session_state.api_key,
+                                image_data=get_image_handle(uploaded_file),
+                                content_moderation=content_moderation
+                            ),
+                            "Object removal",
+                            slot="erase"
+                        )
             
             with cols[1]:
                 st.subheader("Result")
@@ -928,15 +1163,79 @@ def main():
                 st.success("API Key: Configured")
                 st.code(f"Last used: {time.strftime('%Y-%m-%d %H:%M')}")
                 
-                usage_cols = st.columns(3)
+                tape = cassette.get_cassette()
+                if tape is not None:
+                    tape_stats = tape.stats()
+                    st.info(
+                        f"📼 Cassette {tape.mode}: `{tape_stats['path']}` — "
+                        f"{tape_stats['calls']} calls, {tape_stats['images']} images"
+                    )
+                
+                summary = metrics.endpoint_summary()
+                calls = sum(row['calls'] for row in summary)
+                errors = sum(row['errors'] for row in summary)
+                cache_hits = sum(row['cache_hits'] + row['coalesced'] for row in summary)
+                total_s = sum(row['total_s'] for row in summary)
+                wasted = sum(row['wasted'] for row in summary)
+                cancelled = sum(row['cancelled'] for row in summary)
+                
+                usage_cols = st.columns(4)
                 with usage_cols[0]:
-                    st.metric("This Month", "1,243", "12% ↑")
+                    st.metric("API Calls", f"{calls:,}", f"{cache_hits:,} saved", delta_color="off")
                 with usage_cols[1]:
-                    st.metric("Credits Left", "8,757", "87%")
+                    st.metric("Errors", f"{errors:,}", f"{errors / calls:.0%}" if calls else None, delta_color="inverse")
                 with usage_cols[2]:
-                    st.metric("Avg. Cost", "$0.12", "5% ↓")
+                    st.metric("Avg. Latency", f"{total_s / calls:.2f}s" if calls else "–")
+                with usage_cols[3]:
+                    st.metric("Wasted Calls", f"{wasted:,}", f"{cancelled:,} cancelled unsent", delta_color="off")
                 
-                st.progress(0.13)
+                if summary:
+                    st.dataframe(
+                        [
+                            {
+                                "Endpoint": row['endpoint'],
+                                "Calls": row['calls'],
+                                "Errors": row['errors'],
+                                "Cache hits": row['cache_hits'],
+                                "Shared": row['coalesced'],
+                                "Cancelled": row['cancelled'],
+                                "Wasted": row['wasted'],
+                                "p50 (s)": round(row['p50_s'], 2) if row['p50_s'] is not None else None,
+                                "p95 (s)": round(row['p95_s'], 2) if row['p95_s'] is not None else None,
+                                "p99 (s)": round(row['p99_s'], 2) if row['p99_s'] is not None else None,
+                                "Uploaded (MB)": round(row['bytes_up'] / 1e6, 2),
+                                "Downloaded (KB)": round(row['bytes_down'] / 1e3, 1),
+                                "Concurrency limit": row['concurrency_limit']
+                            }
+                            for row in summary
+                        ],
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                    adjustments = adaptive.history()[-10:]
+                    if adjustments:
+                        st.markdown("**Recent concurrency adjustments**")
+                        st.dataframe(
+                            [
+                                {
+                                    "Time": time.strftime('%H:%M:%S', time.localtime(change['time'])),
+                                    "Endpoint": change['endpoint'],
+                                    "Limit": f"{change['from']} → {change['to']}",
+                                    "Reason": change['reason']
+                                }
+                                for change in reversed(adjustments)
+                            ],
+                            use_container_width=True,
+                            hide_index=True
+                        )
+                    st.download_button(
+                        "📈 Export Prometheus metrics",
+                        metrics.render_prometheus(),
+                        file_name="bria_metrics.prom",
+                        mime="text/plain"
+                    )
+                else:
+                    st.info("No API calls made in this session yet.")
             else:
                 st.warning("No API key configured")
         
@@ -951,6 +1250,10 @@ def main():
             ### App Version
            DreamPixel  AI Studio v2.1.0
             """)
+    
+    # Drawn last so jobs submitted during this run are polled too
+    with jobs_panel:
+        render_jobs_panel()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""
+Local image operations: editor filters and mask preparation.
+
+Covers every filter of the image editor, converting a drawing-canvas array
+into a PNG mask, and aligning an image and its mask before a generative fill
+upload.
+"""
+from typing import Dict, Any, List, Sequence
+import io
+
+import numpy as np
+from PIL import Image
+
+from services import ingest
+from utils import image_ops
+
+from .harness import measure, sample_image
+
+DEFAULT_SIZES = (512, 1024)
+
+# Widest canvas the app draws on.
+CANVAS_WIDTH = 700
+
+
+def _canvas(width: int, height: int) -> np.ndarray:
+    # A transparent canvas with one thick brush stroke across the middle.
+    data = np.zeros((height, width, 4), dtype=np.float64)
+    data[height // 3:2 * height // 3, width // 4:3 * width // 4] = (255, 255, 255, 255)
+    return data
+
+
+def run(sizes: Sequence[int] = DEFAULT_SIZES, repeat: int = 5) -> List[Dict[str, Any]]:
+    """Benchmark the editor filters at each size, and mask preparation."""
+    results = []
+    for size in sizes:
+        source = Image.open(io.BytesIO(sample_image(size)))
+        source.load()
+        for filter_type in image_ops.FILTERS[1:]:
+            state = {}
+
+            def setup():
+                # Sepia edits the image in place.
+                state["img"] = source.copy()
+
+            results.append(measure(
+                f"image_ops.filter.{filter_type.lower().replace(' ', '_')}.{size}px",
+                lambda: image_ops.apply_filter(state["img"], filter_type),
+                repeat=repeat,
+                setup=setup,
+                size=size
+            ))
+
+    canvas = _canvas(CANVAS_WIDTH, CANVAS_WIDTH)
+    results.append(measure(
+        f"image_ops.canvas_to_mask.{CANVAS_WIDTH}px",
+        lambda: image_ops.canvas_to_mask(canvas),
+        repeat=repeat,
+        size=CANVAS_WIDTH
+    ))
+
+    for size in (2048, 4096):
+        image = sample_image(size)
+        mask = image_ops.canvas_to_mask(_canvas(size, size))
+        results.append(measure(
+            f"image_ops.prepare_image_and_mask.{size}px",
+            lambda: ingest.prepare_image_and_mask(image, mask, "/v1/gen_fill"),
+            repeat=repeat,
+            setup=ingest.clear_cache,
+            size=size
+        ))
+    return results
+
+
+__all__ = ['DEFAULT_SIZES', 'run']
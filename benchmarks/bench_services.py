@@ -0,0 +1,100 @@
+"""
+Request build and encode cost per service.
+
+Each benchmark builds one request with the service's own builder (ingest
+downscaling and recompression included) and streams the body the way the
+transport sends it, without any network I/O. The ingest memo is cleared
+before every run so each run pays the full cost, as a first upload does.
+"""
+from typing import Dict, Any, Callable, List, Sequence
+import inspect
+
+from services import ingest
+from services.erase_foreground import _erase_foreground_request, erase_foreground
+from services.generative_fill import _generative_fill_request, generative_fill
+from services.image import ImageHandle
+from services.lifestyle_shot import (
+    _lifestyle_image_request,
+    _lifestyle_text_request,
+    lifestyle_shot_by_image,
+    lifestyle_shot_by_text
+)
+from services.packshot import _packshot_request, create_packshot
+from services.shadow import _shadow_request, add_shadow
+from services.streaming import JSONStreamBody
+
+from .harness import API_KEY, measure, sample_image
+
+DEFAULT_SIZES = (512, 2048, 4096)
+
+
+def _builder(builder: Callable, public_fn: Callable, **kwargs) -> Callable[[], Any]:
+    # Bind against the public signature so the request is built with the
+    # same defaults the app gets.
+    bound = inspect.signature(public_fn).bind(api_key=API_KEY, **kwargs)
+    bound.apply_defaults()
+    bound.arguments.pop("cancel", None)
+    return lambda: builder(**bound.arguments)
+
+
+def _cases(image: bytes, mask: bytes, reference: bytes) -> Dict[str, Callable[[], Callable[[], Any]]]:
+    # Fresh handles per run, so digests and base64 are not reused either.
+    return {
+        "packshot": lambda: _builder(_packshot_request, create_packshot, image_data=ImageHandle(image)),
+        "shadow": lambda: _builder(_shadow_request, add_shadow, image_data=ImageHandle(image)),
+        "lifestyle_text": lambda: _builder(
+            _lifestyle_text_request, lifestyle_shot_by_text,
+            image_data=ImageHandle(image), scene_description="on a marble kitchen counter"
+        ),
+        "lifestyle_image": lambda: _builder(
+            _lifestyle_image_request, lifestyle_shot_by_image,
+            image_data=ImageHandle(image), reference_image=ImageHandle(reference)
+        ),
+        "gen_fill": lambda: _builder(
+            _generative_fill_request, generative_fill,
+            image_data=ImageHandle(image), mask_data=ImageHandle(mask), prompt="a ceramic vase"
+        ),
+        "erase_foreground": lambda: _builder(
+            _erase_foreground_request, erase_foreground, image_data=ImageHandle(image)
+        ),
+    }
+
+
+def build_and_encode(build: Callable[[], Any]) -> int:
+    """Build a request and stream its body; returns the bytes that would be sent."""
+    _, _, payload = build()
+    sent = 0
+    for chunk in JSONStreamBody(payload):
+        sent += len(chunk)
+    return sent
+
+
+def run(sizes: Sequence[int] = DEFAULT_SIZES, repeat: int = 5) -> List[Dict[str, Any]]:
+    """Benchmark every image-carrying service at each image size."""
+    results = []
+    for size in sizes:
+        image = sample_image(size)
+        mask = sample_image(size, fmt="PNG")
+        reference = sample_image(max(size // 2, 256))
+        for service, make in _cases(image, mask, reference).items():
+            state: Dict[str, Callable[[], Any]] = {}
+
+            def setup():
+                ingest.clear_cache()
+                state["build"] = make()
+
+            row = measure(
+                f"services.build_encode.{service}.{size}px",
+                lambda: build_and_encode(state["build"]),
+                repeat=repeat,
+                setup=setup,
+                size=size,
+                input_bytes=len(image)
+            )
+            setup()
+            row["body_bytes"] = build_and_encode(state["build"])
+            results.append(row)
+    return results
+
+
+__all__ = ['DEFAULT_SIZES', 'build_and_encode', 'run']
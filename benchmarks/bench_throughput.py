@@ -0,0 +1,94 @@
+"""
+Throughput of the service layer under concurrent callers.
+
+N callers each send ``calls`` packshot requests to the mock API, either from
+a thread pool through the synchronous services or as asyncio tasks through
+``services.aio``. Requests per second and per-request latency percentiles
+are reported for each level of concurrency.
+"""
+from typing import Dict, Any, List, Sequence
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services import ImageHandle, aio, create_packshot
+
+from .harness import API_KEY, measure, sample_image
+
+DEFAULT_CONCURRENCY = (1, 4, 16)
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "p50": statistics.median(ordered),
+        "p95": ordered[int(0.95 * (len(ordered) - 1))],
+        "p99": ordered[int(0.99 * (len(ordered) - 1))],
+    }
+
+
+def run(
+    concurrency: Sequence[int] = DEFAULT_CONCURRENCY,
+    calls: int = 10,
+    size: int = 512,
+    repeat: int = 3
+) -> List[Dict[str, Any]]:
+    """Benchmark sync (threads) and async (tasks) callers at each concurrency level."""
+    image = ImageHandle(sample_image(size))
+    results = []
+    for workers in concurrency:
+        latencies: List[float] = []
+
+        def one_call():
+            started = time.perf_counter()
+            create_packshot(API_KEY, image)
+            latencies.append(time.perf_counter() - started)
+
+        def threaded(workers=workers, one_call=one_call):
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for future in [pool.submit(one_call) for _ in range(workers * calls)]:
+                    future.result()
+
+        row = measure(
+            f"throughput.sync.{workers}_callers",
+            threaded,
+            repeat=repeat,
+            ops=workers * calls,
+            concurrency=workers,
+            size=size
+        )
+        row["latency_s"] = _percentiles(latencies)
+        results.append(row)
+
+        async_latencies: List[float] = []
+
+        async def caller(async_latencies=async_latencies):
+            for _ in range(calls):
+                started = time.perf_counter()
+                await aio.create_packshot(API_KEY, image)
+                async_latencies.append(time.perf_counter() - started)
+
+        async def gathered(workers=workers, caller=caller):
+            await asyncio.gather(*(caller() for _ in range(workers)))
+
+        # One event loop for all runs, so the pooled client is reused as in the app.
+        loop = asyncio.new_event_loop()
+        try:
+            row = measure(
+                f"throughput.async.{workers}_callers",
+                lambda gathered=gathered: loop.run_until_complete(gathered()),
+                repeat=repeat,
+                ops=workers * calls,
+                concurrency=workers,
+                size=size
+            )
+        finally:
+            loop.run_until_complete(aio.aclose())
+            loop.close()
+        row["latency_s"] = _percentiles(async_latencies)
+        results.append(row)
+    return results
+
+
+__all__ = ['DEFAULT_CONCURRENCY', 'run']
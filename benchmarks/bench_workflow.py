@@ -0,0 +1,48 @@
+"""
+End-to-end latency of ``workflows.generate_ad_set`` against the mock API.
+
+Runs the workflow with every stage switched on, once starting from an
+uploaded product image and once from a text prompt. The stages that
+actually ran are stored with each result.
+"""
+from typing import Dict, Any, List
+
+from workflows.generate_ad_set import generate_ad_set
+
+from .harness import API_KEY, measure, sample_image
+
+ALL_STAGES = {
+    "create_packshot": True,
+    "add_shadow": True,
+    "lifestyle_shot": True,
+    "scene_description": "on a marble kitchen counter, morning light",
+    "num_results": 1,
+}
+
+
+def run(size: int = 2048, repeat: int = 5) -> List[Dict[str, Any]]:
+    """Benchmark the ad-set workflow from an image and from a prompt."""
+    image = sample_image(size)
+    scenarios = {
+        f"from_image.{size}px": {"image": image},
+        "from_prompt": {"prompt": "a glass perfume bottle on a white background"},
+    }
+    results = []
+    for scenario, inputs in scenarios.items():
+        def call(inputs=inputs):
+            return generate_ad_set(API_KEY, config=dict(ALL_STAGES), **inputs)
+
+        # The first call doubles as the warm-up and reports which stages ran.
+        stages = sorted(call())
+        results.append(measure(
+            f"workflow.generate_ad_set.{scenario}",
+            call,
+            repeat=repeat,
+            warmup=0,
+            ops=len(stages),
+            stages=stages
+        ))
+    return results
+
+
+__all__ = ['ALL_STAGES', 'run']
@@ -0,0 +1,225 @@
+"""
+Measurement helpers shared by the benchmark suites.
+
+``measure`` times a callable over several repeats, then runs it once more
+under tracemalloc to record the peak Python heap it allocated; timing runs
+are kept separate because tracing slows allocation-heavy code down a lot.
+``mock_api`` points the services at an in-process mock Bria server with
+the client-side caches and limits switched off, so every call is sent and
+timed.
+"""
+from typing import Dict, Any, Callable, Iterator, List, Optional
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from PIL import Image
+
+from services import adaptive, breaker, cache, hedging, limiter, singleflight, transport
+from tools.mock_bria import MockConfig, start_in_thread
+
+API_KEY = "benchmark-key"
+
+
+def measure(
+    name: str,
+    fn: Callable[[], Any],
+    repeat: int = 5,
+    warmup: int = 1,
+    setup: Optional[Callable[[], None]] = None,
+    ops: int = 1,
+    trace_memory: bool = True,
+    **info
+) -> Dict[str, Any]:
+    """
+    Time ``fn`` and record its peak memory.
+
+    Args:
+        name: Unique benchmark name, used to match results between runs
+        fn: Code under test
+        repeat: Timed runs
+        warmup: Untimed runs first (connection set-up, imports, caches)
+        setup: Called before every run, outside the timing
+        ops: Operations (e.g. requests) done by one call of ``fn``
+        trace_memory: Do an extra run under tracemalloc for ``peak_kb``
+        **info: Extra fields stored with the result (sizes, concurrency, ...)
+
+    Returns:
+        A result row with wall-time statistics in seconds, ``ops_per_s`` and ``peak_kb``
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+
+    times: List[float] = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+
+    peak_kb = None
+    if trace_memory:
+        if setup:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        finally:
+            tracemalloc.stop()
+
+    ordered = sorted(times)
+    mean = statistics.fmean(times)
+    return {
+        "name": name,
+        **info,
+        "repeat": repeat,
+        "ops": ops,
+        "wall_s": {
+            "min": ordered[0],
+            "mean": mean,
+            "p50": statistics.median(ordered),
+            "p95": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+            "max": ordered[-1],
+        },
+        "ops_per_s": ops / mean if mean else None,
+        "peak_kb": peak_kb,
+    }
+
+
+def sample_image(width: int, height: Optional[int] = None, fmt: str = "JPEG", alpha: bool = False) -> bytes:
+    """
+    Encode a synthetic photo-like image (gradients plus noise).
+
+    Noise keeps the compressed size close to that of a real photo, so upload
+    and encoding costs are realistic.
+    """
+    height = height or width
+    noise = Image.effect_noise((width, height), 48)
+    red = Image.linear_gradient("L").resize((width, height))
+    green = red.transpose(Image.Transpose.ROTATE_90)
+    img = Image.merge("RGB", (
+        Image.blend(red, noise, 0.5),
+        Image.blend(green, noise, 0.5),
+        noise
+    ))
+    if alpha:
+        img.putalpha(Image.radial_gradient("L").resize((width, height)))
+    out = io.BytesIO()
+    if fmt == "JPEG":
+        img.save(out, format=fmt, quality=90)
+    else:
+        img.save(out, format=fmt)
+    return out.getvalue()
+
+
+@contextmanager
+def mock_api(config: Optional[MockConfig] = None, keep_limits: bool = False) -> Iterator[str]:
+    """
+    Serve a mock Bria API in this process and point the services at it.
+
+    Args:
+        config: Mock server settings
+        keep_limits: Leave the rate limiter, AIMD controller and circuit
+            breakers as configured instead of lifting them
+
+    Yields:
+        The mock server's base URL
+    """
+    server = start_in_thread(config or MockConfig())
+    previous_url = transport.get_config().base_url
+    transport.configure(base_url=server.base_url)
+    cache.configure(enabled=False)
+    singleflight.set_enabled(False)
+    hedging.configure(enabled=False)
+    if not keep_limits:
+        limiter.configure(rate=0, max_in_flight=0)
+        adaptive.configure(enabled=False)
+        breaker.configure(enabled=False)
+    try:
+        yield server.base_url
+    finally:
+        transport.configure(base_url=previous_url)
+        server.shutdown()
+        server.server_close()
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(path: str, results: List[Dict[str, Any]], settings: Dict[str, Any]) -> None:
+    """Write results with enough context (revision, interpreter, host) to compare runs."""
+    document = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": settings,
+        "results": results,
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    """Read a results file, keyed by benchmark name."""
+    with open(path) as f:
+        return {row["name"]: row for row in json.load(f)["results"]}
+
+
+def format_table(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """Render results as a text table, with the change in mean time against ``baseline``."""
+    header = f"{'benchmark':<52} {'mean':>10} {'p95':>10} {'ops/s':>10} {'peak':>10}"
+    if baseline is not None:
+        header += f" {'vs base':>9}"
+    lines = [header, "-" * len(header)]
+    for row in results:
+        wall = row["wall_s"]
+        peak = f"{row['peak_kb'] / 1024:.1f}MB" if row["peak_kb"] is not None else "-"
+        line = (
+            f"{row['name']:<52} {wall['mean'] * 1000:>8.1f}ms {wall['p95'] * 1000:>8.1f}ms "
+            f"{row['ops_per_s'] or 0:>10.1f} {peak:>10}"
+        )
+        if baseline is not None:
+            before = baseline.get(row["name"])
+            if before:
+                change = (wall["mean"] - before["wall_s"]["mean"]) / before["wall_s"]["mean"] * 100
+                line += f" {change:>+8.1f}%"
+            else:
+                line += f" {'new':>9}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+__all__ = [
+    'API_KEY',
+    'measure',
+    'sample_image',
+    'mock_api',
+    'write_results',
+    'load_results',
+    'format_table'
+]
@@ -0,0 +1,88 @@
+"""
+Run the benchmark suites and write comparable JSON results.
+
+    python -m benchmarks.run                       # every suite
+    python -m benchmarks.run --suite services --suite image_ops
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --compare before.json
+
+Network suites talk to an in-process mock Bria API (``tools.mock_bria``), so
+no API key or credits are needed. Client-side caching, coalescing and
+hedging are switched off so that every call is really sent; pass
+``--keep-limits`` to also keep the rate limiter, adaptive concurrency and
+circuit breakers in the loop.
+"""
+from typing import List, Optional
+import argparse
+import logging
+import time
+
+from tools.mock_bria import MockConfig
+
+from .harness import format_table, load_results, mock_api, write_results
+
+SUITES = ("services", "workflow", "throughput", "image_ops")
+
+# Defaults repeated from the suites, which are only imported when selected.
+DEFAULT_SIZES = [512, 2048, 4096]
+DEFAULT_EDITOR_SIZES = [512, 1024]
+DEFAULT_CONCURRENCY = [1, 4, 16]
+
+
+def _ints(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the service, workflow and image hot paths")
+    parser.add_argument("--suite", action="append", choices=SUITES,
+                        help="Suite to run (repeatable; default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--sizes", type=_ints, default=DEFAULT_SIZES,
+                        help="Comma-separated image sizes for the services suite")
+    parser.add_argument("--editor-sizes", type=_ints, default=DEFAULT_EDITOR_SIZES,
+                        help="Comma-separated image sizes for the editor filters")
+    parser.add_argument("--concurrency", type=_ints, default=DEFAULT_CONCURRENCY,
+                        help="Comma-separated numbers of concurrent callers")
+    parser.add_argument("--calls", type=int, default=10, help="Requests per caller in the throughput suite")
+    parser.add_argument("--latency-scale", type=float, default=0.01,
+                        help="Scale of the mock API's latencies (0 measures client overhead only)")
+    parser.add_argument("--keep-limits", action="store_true",
+                        help="Keep the rate limiter, adaptive concurrency and breakers enabled")
+    parser.add_argument("--output", default=f"benchmark_results/{time.strftime('%Y%m%d-%H%M%S')}.json",
+                        help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    # Per-request logging would be measured along with the code under test.
+    logging.getLogger("services").setLevel(logging.WARNING)
+    suites = args.suite or list(SUITES)
+    results = []
+
+    if "services" in suites:
+        from . import bench_services
+        results += bench_services.run(args.sizes, args.repeat)
+    if "image_ops" in suites:
+        from . import bench_image_ops
+        results += bench_image_ops.run(args.editor_sizes, args.repeat)
+    if "workflow" in suites or "throughput" in suites:
+        config = MockConfig(latency_scale=args.latency_scale, seed=0)
+        with mock_api(config, keep_limits=args.keep_limits):
+            if "workflow" in suites:
+                from . import bench_workflow
+                results += bench_workflow.run(repeat=args.repeat)
+            if "throughput" in suites:
+                from . import bench_throughput
+                results += bench_throughput.run(args.concurrency, args.calls, repeat=args.repeat)
+
+    settings = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    settings["suite"] = suites
+    write_results(args.output, results, settings)
+
+    baseline = load_results(args.compare) if args.compare else None
+    print(format_table(results, baseline))
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
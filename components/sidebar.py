@@ -1,18 +1,10 @@
 import streamlit as st
 
+from workflows.config import default_config
+
 def get_config():
     """Get configuration from sidebar."""
-    config = {
-        "create_packshot": False,
-        "add_shadow": False,
-        "lifestyle_shot": False,
-        "background_color": "#FFFFFF",
-        "shadow_type": "natural",
-        "scene_description": "",
-        "num_results": 1,
-        "aspect_ratio": "1:1",
-        "sync": True
-    }
+    config = default_config()
     
     st.sidebar.header("Configuration")
     
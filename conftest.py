@@ -0,0 +1 @@
+"""Lets pytest import ``services`` and ``workflows`` from the repository root."""
@@ -5,6 +5,10 @@ from .prompt_enhancement import enhance_prompt
 from .generative_fill import generative_fill
 from .hd_image_generation import generate_hd_image
 from .erase_foreground import erase_foreground
+from .image import ImageHandle
+from .breaker import CircuitOpenError
+from .cancellation import Cancelled, CancelToken
+from .fanout import fan_out
 
 __all__ = [
     'lifestyle_shot_by_text',
@@ -14,5 +18,10 @@ __all__ = [
     'enhance_prompt',
     'generative_fill',
     'generate_hd_image',
-    'erase_foreground'
+    'erase_foreground',
+    'ImageHandle',
+    'CircuitOpenError',
+    'Cancelled',
+    'CancelToken',
+    'fan_out'
 ] 
\ No newline at end of file
@@ -0,0 +1,244 @@
+"""
+Adaptive (AIMD) concurrency limits per Bria endpoint.
+
+The rate limiter caps in-flight requests with ``BRIA_MAX_IN_FLIGHT``; this
+module moves the effective cap below that ceiling at runtime, the way TCP
+congestion control does:
+
+* every successful attempt adds ``1 / limit``, so the limit grows by about
+  one per round of requests while the endpoint stays healthy;
+* a 429 or 503, or a latency well above the endpoint's baseline, multiplies
+  the limit by ``BRIA_ADAPTIVE_DECREASE`` (at most once per cool-down, so
+  a burst of failures from one round only counts once);
+* a ``Retry-After`` header pauses new requests to the endpoint for that long.
+
+Settings come from the environment:
+
+    BRIA_ADAPTIVE            "0" keeps the static BRIA_MAX_IN_FLIGHT cap
+    BRIA_ADAPTIVE_INITIAL    starting limit (default 4)
+    BRIA_ADAPTIVE_MIN        lowest limit (default 1)
+    BRIA_ADAPTIVE_MAX        ceiling when BRIA_MAX_IN_FLIGHT is unlimited (default 64)
+    BRIA_ADAPTIVE_DECREASE   multiplicative decrease factor (default 0.5)
+    BRIA_ADAPTIVE_LATENCY    latency / baseline ratio treated as congestion (default 3)
+
+The current limit is exported as the ``concurrency_limit`` gauge and every
+change is kept in ``history()``.
+"""
+from typing import Dict, Any, List, Optional
+import email.utils
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from . import metrics
+
+# Statuses that mean the endpoint is overloaded.
+OVERLOAD_STATUSES = frozenset({429, 503})
+
+# Longest Retry-After we honor, in seconds.
+MAX_RETRY_AFTER = 120.0
+
+# Attempts observed before latency is used as a congestion signal.
+LATENCY_WARMUP = 20
+
+HISTORY_SIZE = 50
+
+
+@dataclass
+class AdaptiveConfig:
+    """Tunables for the AIMD controllers."""
+    enabled: bool = os.getenv("BRIA_ADAPTIVE", "1").lower() not in ("0", "false", "no")
+    initial: float = float(os.getenv("BRIA_ADAPTIVE_INITIAL", "4"))
+    minimum: float = float(os.getenv("BRIA_ADAPTIVE_MIN", "1"))
+    maximum: float = float(os.getenv("BRIA_ADAPTIVE_MAX", "64"))
+    decrease: float = float(os.getenv("BRIA_ADAPTIVE_DECREASE", "0.5"))
+    latency_ratio: float = float(os.getenv("BRIA_ADAPTIVE_LATENCY", "3"))
+    cooldown: float = 1.0
+
+
+class AIMDController:
+    """
+    Additive-increase, multiplicative-decrease limit for one endpoint.
+
+    Args:
+        endpoint: Endpoint path, used for metrics and history
+        ceiling: Largest limit allowed
+        config: Controller settings
+    """
+
+    def __init__(self, endpoint: str, ceiling: float, config: AdaptiveConfig):
+        self.endpoint = endpoint
+        self.ceiling = ceiling
+        self.config = config
+        self.limit = max(config.minimum, min(config.initial, ceiling))
+        self.baseline: Optional[float] = None
+        self.samples = 0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._history: deque = deque(maxlen=HISTORY_SIZE)
+        self._lock = threading.Lock()
+        metrics.set_gauge("concurrency_limit", endpoint, int(self.limit))
+
+    def _set(self, limit: float, reason: str) -> None:
+        old = int(self.limit)
+        self.limit = max(self.config.minimum, min(limit, self.ceiling))
+        if int(self.limit) != old:
+            self._history.append({
+                "time": time.time(),
+                "endpoint": self.endpoint,
+                "from": old,
+                "to": int(self.limit),
+                "reason": reason
+            })
+            metrics.set_gauge("concurrency_limit", self.endpoint, int(self.limit))
+            metrics.increment("concurrency_increases" if int(self.limit) > old else "concurrency_decreases", self.endpoint)
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.config.cooldown:
+            return
+        self._last_decrease = now
+        self._set(self.limit * self.config.decrease, reason)
+
+    def record(self, status: Optional[int], seconds: float, retry_after: Optional[float] = None) -> None:
+        """Feed back the outcome of one attempt."""
+        with self._lock:
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + min(retry_after, MAX_RETRY_AFTER))
+            if status in OVERLOAD_STATUSES:
+                self._decrease(f"HTTP {status}")
+                return
+            if status is None or status >= 500:
+                return
+
+            self.samples += 1
+            congested = (
+                self.baseline is not None
+                and self.samples > LATENCY_WARMUP
+                and seconds > self.baseline * self.config.latency_ratio
+            )
+            # The baseline follows improvements quickly and regressions slowly.
+            if self.baseline is None or seconds < self.baseline:
+                self.baseline = seconds if self.baseline is None else 0.5 * self.baseline + 0.5 * seconds
+            else:
+                self.baseline = 0.98 * self.baseline + 0.02 * seconds
+            if congested:
+                self._decrease(f"latency {seconds:.1f}s > {self.config.latency_ratio:g}x baseline {self.baseline:.1f}s")
+            else:
+                self._set(self.limit + 1 / self.limit, "healthy")
+
+    def pause_remaining(self) -> float:
+        """Seconds until new requests may start, after a Retry-After."""
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def history(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._history)
+
+
+_config = AdaptiveConfig()
+_controllers: Dict[str, AIMDController] = {}
+_lock = threading.Lock()
+
+
+def configure(**overrides) -> AdaptiveConfig:
+    """
+    Update the AIMD settings and reset every controller.
+
+    Args:
+        **overrides: Any ``AdaptiveConfig`` field, e.g. ``initial=8``
+    """
+    global _config
+    with _lock:
+        _config = AdaptiveConfig(**{**_config.__dict__, **overrides})
+        _controllers.clear()
+    return _config
+
+
+def get_controller(endpoint: str, ceiling: int = 0) -> AIMDController:
+    """Return the controller for ``endpoint``; ``ceiling`` 0 means the configured maximum."""
+    controller = _controllers.get(endpoint)
+    if controller is None:
+        with _lock:
+            controller = _controllers.get(endpoint)
+            if controller is None:
+                controller = AIMDController(endpoint, ceiling or _config.maximum, _config)
+                _controllers[endpoint] = controller
+    return controller
+
+
+def current_limit(endpoint: str, ceiling: int = 0) -> int:
+    """
+    Return the in-flight limit to enforce for ``endpoint``.
+
+    Args:
+        endpoint: Endpoint path
+        ceiling: Static cap (0 = unlimited)
+
+    Returns:
+        The adaptive limit, or ``ceiling`` unchanged when adaptation is off
+    """
+    if not _config.enabled:
+        return ceiling
+    controller = get_controller(endpoint, ceiling)
+    controller.ceiling = ceiling or _config.maximum
+    return int(min(controller.limit, controller.ceiling))
+
+
+def pause_remaining(endpoint: str) -> float:
+    """Seconds new requests to ``endpoint`` must still wait after a Retry-After."""
+    controller = _controllers.get(endpoint)
+    return controller.pause_remaining() if controller else 0.0
+
+
+def record(endpoint: str, status: Optional[int], seconds: float, retry_after: Optional[float] = None) -> None:
+    """
+    Feed the outcome of one HTTP attempt to the endpoint's controller.
+
+    Args:
+        endpoint: Endpoint path
+        status: HTTP status, or None if no response arrived
+        seconds: Time the attempt spent on the wire
+        retry_after: Parsed ``Retry-After`` header, if any
+    """
+    if _config.enabled:
+        get_controller(endpoint).record(status, seconds, retry_after)
+
+
+def history(endpoint: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Return recent limit changes, newest last, for one or all endpoints."""
+    controllers = [_controllers[endpoint]] if endpoint in _controllers else (
+        [] if endpoint else list(_controllers.values())
+    )
+    changes = [change for controller in controllers for change in controller.history()]
+    return sorted(changes, key=lambda change: change["time"])
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+__all__ = [
+    'AdaptiveConfig',
+    'AIMDController',
+    'configure',
+    'get_controller',
+    'current_limit',
+    'pause_remaining',
+    'record',
+    'history',
+    'parse_retry_after'
+]
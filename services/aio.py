@@ -0,0 +1,409 @@
+"""
+Asyncio-native variants of the Bria service functions.
+
+Each coroutine mirrors the synchronous function of the same name exported by
+``services`` and reuses its request builder, but sends through a shared
+``httpx.AsyncClient``. A semaphore caps how many requests are in flight per
+event loop, so batch jobs can keep dozens of calls running from one loop::
+
+    from services import aio
+
+    results = await asyncio.gather(*(
+        aio.create_packshot(api_key, image) for image in images
+    ))
+"""
+from typing import Dict, Any, Optional, Callable, Tuple
+import asyncio
+import inspect
+import logging
+import os
+import threading
+import time
+import weakref
+
+import httpx
+
+from . import transport, breaker, cache, cancellation, cassette, hedging, instrumentation, limiter, singleflight
+from .breaker import CircuitOpenError
+from .cancellation import Cancelled, CancelToken
+from .streaming import JSONStreamBody
+from .lifestyle_shot import (
+    _lifestyle_text_request,
+    _lifestyle_image_request,
+    lifestyle_shot_by_text as _lifestyle_shot_by_text,
+    lifestyle_shot_by_image as _lifestyle_shot_by_image
+)
+from .shadow import _shadow_request, add_shadow as _add_shadow
+from .packshot import _packshot_request, create_packshot as _create_packshot
+from .prompt_enhancement import _prompt_enhancer_request, enhance_prompt as _enhance_prompt
+from .generative_fill import _generative_fill_request, generative_fill as _generative_fill
+from .hd_image_generation import _hd_image_request, generate_hd_image as _generate_hd_image
+from .erase_foreground import _erase_foreground_request, erase_foreground as _erase_foreground
+
+logger = logging.getLogger(__name__)
+
+_max_concurrency = int(os.getenv("BRIA_ASYNC_CONCURRENCY", "32"))
+
+# One client and semaphore per event loop; both are bound to the loop that
+# created them.
+_loop_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+
+def set_concurrency_limit(limit: int) -> None:
+    """
+    Set the maximum number of in-flight requests per event loop.
+
+    Takes effect for event loops that have not made a request yet.
+    """
+    global _max_concurrency
+    if limit < 1:
+        raise ValueError("Concurrency limit must be at least 1")
+    _max_concurrency = limit
+
+
+def _get_state() -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        config = transport.get_config()
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=_max_concurrency,
+                max_keepalive_connections=_max_concurrency
+            )
+        )
+        state = (client, asyncio.Semaphore(_max_concurrency))
+        _loop_state[loop] = state
+    return state
+
+
+async def aclose() -> None:
+    """Close the async client bound to the running event loop."""
+    state = _loop_state.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state[0].aclose()
+
+
+async def post(
+    url: str,
+    headers: Dict[str, str],
+    json: Dict[str, Any],
+    timeout: Optional[float] = None,
+    trace: Optional[instrumentation.RequestTrace] = None,
+    cancel: Optional[threading.Event] = None
+) -> httpx.Response:
+    """
+    Async counterpart of :func:`services.transport.post`.
+
+    The rate-limiter slot and the concurrency slot are held only while a
+    request is on the wire, not during retry backoff. ``cancel`` behaves as
+    in the synchronous version; cancelling the task works too.
+    """
+    client, semaphore = _get_state()
+    config = transport.get_config()
+    read_timeout = timeout if timeout is not None else config.read_timeout
+    endpoint = transport.endpoint_path(url)
+    body = JSONStreamBody(json)
+    headers = {**headers, 'Content-Length': str(len(body))}
+    if trace is not None:
+        trace.payload_bytes = len(body)
+        instrumentation.debug_request(url, headers, json)
+
+    attempt = 0
+    try:
+        while True:
+            cancellation.check(cancel, endpoint)
+            try:
+                async with limiter.aslot(headers.get('api_token'), endpoint, cancel), semaphore:
+                    cancellation.check(cancel, endpoint)
+                    sent_at = time.perf_counter()
+                    request = client.build_request(
+                        "POST",
+                        url,
+                        headers=headers,
+                        content=body.aiter_chunks(),
+                        timeout=httpx.Timeout(read_timeout, connect=config.connect_timeout)
+                    )
+                    response = await client.send(request, stream=True)
+                    if trace is not None:
+                        trace.ttfb_ms = (time.perf_counter() - sent_at) * 1000
+                    if cancel is not None and cancel.is_set():
+                        if trace is not None:
+                            trace.status = response.status_code
+                        await response.aclose()
+                        cancellation.check(cancel, endpoint)
+                    await response.aread()
+                    retry_after = transport.record_response(
+                        endpoint, response.status_code, response.headers.get('Retry-After'),
+                        time.perf_counter() - sent_at
+                    )
+            except (httpx.NetworkError, httpx.RemoteProtocolError, httpx.ConnectTimeout) as e:
+                reached_server = not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if not transport.may_resend(endpoint, json, reached_server, attempt, config):
+                    raise
+                retry_after = None
+            else:
+                if not transport.should_retry(response.status_code, attempt, config):
+                    if trace is not None:
+                        trace.status = response.status_code
+                        trace.response_bytes = len(response.content)
+                    return response
+                await response.aclose()
+
+            await asyncio.sleep(transport.retry_delay(attempt, retry_after, config))
+            attempt += 1
+    finally:
+        if trace is not None:
+            trace.attempts = attempt + 1
+            trace.encode_ms = body.encode_seconds * 1000
+
+
+def _succeeded(task: "asyncio.Task") -> bool:
+    return (
+        not task.cancelled() and task.exception() is None
+        and breaker.outcome(task.result().status_code) is not False
+    )
+
+
+async def _hedged_post(
+    url: str,
+    headers: Dict[str, str],
+    json: Dict[str, Any],
+    timeout: Optional[float],
+    trace: instrumentation.RequestTrace,
+    delay: float,
+    cancel: Optional[CancelToken] = None
+) -> httpx.Response:
+    # Async counterpart of transport._hedged_post; the loser is cancelled outright.
+    endpoint = transport.endpoint_path(url)
+    traces = [instrumentation.RequestTrace(endpoint=endpoint) for _ in range(2)]
+    started = time.perf_counter()
+
+    async def run(index: int) -> httpx.Response:
+        try:
+            response = await post(url, headers, json, timeout=timeout, trace=traces[index], cancel=cancel)
+        except (asyncio.CancelledError, Cancelled):
+            if index == 0:
+                # Dropped for the hedge: its latency was at least this long.
+                hedging.record_primary(endpoint, time.perf_counter() - started, abandoned=True)
+            raise
+        if index == 0:
+            hedging.record_primary(endpoint, time.perf_counter() - started)
+        return response
+
+    tasks = [asyncio.ensure_future(run(0))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and not (cancel is not None and cancel.is_set()) and hedging.try_spend(endpoint):
+            tasks.append(asyncio.ensure_future(run(1)))
+
+        winner = None
+        pending = set(tasks)
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in done if _succeeded(task)), None)
+        winner = winner or tasks[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    index = tasks.index(winner)
+    if index:
+        hedging.record_win(endpoint)
+    trace.extra['hedged'] = len(tasks) > 1
+    transport.merge_trace(trace, traces[index], sum(t.attempts for t in traces))
+    return winner.result()
+
+
+async def _call_api(
+    url: str,
+    headers: Dict[str, str],
+    json: Dict[str, Any],
+    timeout: Optional[float],
+    trace: instrumentation.RequestTrace,
+    endpoint: str,
+    key: Optional[str],
+    cancel: Optional[CancelToken] = None
+) -> Dict[str, Any]:
+    # One real API call behind the circuit breaker; the result is cached.
+    probe = breaker.before_call(endpoint)
+    healthy = None
+    try:
+        delay = hedging.hedge_delay(endpoint, json)
+        if delay is None:
+            sent_at = time.perf_counter()
+            response = await post(url, headers, json, timeout=timeout, trace=trace, cancel=cancel)
+            if hedging.is_eligible(endpoint, json):
+                hedging.record_primary(endpoint, time.perf_counter() - sent_at)
+        else:
+            response = await _hedged_post(url, headers, json, timeout, trace, delay, cancel)
+        healthy = breaker.outcome(response.status_code)
+    except httpx.HTTPError:
+        healthy = False
+        raise
+    finally:
+        breaker.record(endpoint, healthy, probe)
+    response.raise_for_status()
+    result = response.json()
+    # The cache lives on disk; keep its IO off the event loop.
+    await asyncio.to_thread(cache.store, endpoint, key, result)
+    return result
+
+
+async def _fetch_json(
+    url: str,
+    headers: Dict[str, str],
+    json: Dict[str, Any],
+    timeout: Optional[float],
+    trace: instrumentation.RequestTrace,
+    endpoint: str,
+    cancel: Optional[CancelToken] = None
+) -> Dict[str, Any]:
+    key, cached = await asyncio.to_thread(transport.fetch_cached, endpoint, json, trace)
+    if cached is not None:
+        return cached
+
+    flight = singleflight.flight_key(endpoint, headers.get('api_token'), json, key)
+    if flight is None:
+        return await _call_api(url, headers, json, timeout, trace, endpoint, key, cancel)
+
+    # Shared with other callers; cancelled only once all of them have cancelled.
+    async def call(flight_cancel: CancelToken) -> Dict[str, Any]:
+        return await _call_api(url, headers, json, timeout, trace, endpoint, key, flight_cancel)
+    result, shared = await singleflight.do_async(flight, endpoint, call, cancel)
+    if shared:
+        trace.cache = "shared"
+    return result
+
+
+async def post_json(
+    url: str,
+    headers: Dict[str, str],
+    json: Dict[str, Any],
+    timeout: Optional[float] = None,
+    cancel: Optional[CancelToken] = None
+) -> Dict[str, Any]:
+    """Async counterpart of :func:`services.transport.post_json`."""
+    endpoint = transport.endpoint_path(url)
+    trace = instrumentation.start(endpoint)
+    started = time.perf_counter()
+    try:
+        cancellation.check(cancel, endpoint)
+        # Cassettes are SQLite files; their IO runs off the event loop.
+        replayed = None
+        if cassette.replaying() is not None:
+            replayed = await asyncio.to_thread(transport.replay, endpoint, json, trace)
+        if replayed is not None:
+            result, delay = replayed
+            await asyncio.sleep(delay)
+            return result
+
+        recording = cassette.recording() is not None
+        try:
+            result = await _fetch_json(url, headers, json, timeout, trace, endpoint, cancel)
+        except httpx.HTTPStatusError as e:
+            if recording:
+                await asyncio.to_thread(transport.record_call, endpoint, json, time.perf_counter() - started, error=e)
+            raise
+        if recording:
+            await asyncio.to_thread(transport.record_call, endpoint, json, time.perf_counter() - started, result)
+        cancellation.check(cancel, endpoint)
+        return result
+    except cancellation.Cancelled:
+        transport.count_cancelled(endpoint, trace)
+        raise
+    except Exception as e:
+        trace.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        transport.finish_call(endpoint, trace, started)
+
+
+async def _build(builder: Callable, sync_fn: Callable, args: tuple, kwargs: dict):
+    # Bind against the synchronous signature so both variants share one set
+    # of defaults.
+    bound = inspect.signature(sync_fn).bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    cancel = arguments.pop('cancel', None)
+    # Builders decode, downscale and hash uploads; keep that off the event loop.
+    return await asyncio.to_thread(builder, **arguments), cancel
+
+
+async def _call(
+    builder: Callable,
+    sync_fn: Callable,
+    args: tuple,
+    kwargs: dict,
+    failure: str
+) -> Dict[str, Any]:
+    (url, headers, data), cancel = await _build(builder, sync_fn, args, kwargs)
+    try:
+        return await post_json(url, headers=headers, json=data, cancel=cancel)
+    except (CircuitOpenError, Cancelled):
+        raise
+    except Exception as e:
+        raise Exception(f"{failure}: {str(e)}")
+
+
+async def generate_hd_image(*args, **kwargs) -> Dict[str, Any]:
+    """Async variant of :func:`services.generate_hd_image`."""
+    return await _call(_hd_image_request, _generate_hd_image, args, kwargs, "HD image generation failed")
+
+
+async def create_packshot(*args, **kwargs) -> Dict[str, Any]:
+    """Async variant of :func:`services.create_packshot`."""
+    return await _call(_packshot_request, _create_packshot, args, kwargs, "Packshot creation failed")
+
+
+async def add_shadow(*args, **kwargs) -> Dict[str, Any]:
+    """Async variant of :func:`services.add_shadow`."""
+    return await _call(_shadow_request, _add_shadow, args, kwargs, "Shadow addition failed")
+
+
+async def lifestyle_shot_by_text(*args, **kwargs) -> Dict[str, Any]:
+    """Async variant of :func:`services.lifestyle_shot_by_text`."""
+    return await _call(_lifestyle_text_request, _lifestyle_shot_by_text, args, kwargs, "Lifestyle shot generation failed")
+
+
+async def lifestyle_shot_by_image(*args, **kwargs) -> Dict[str, Any]:
+    """Async variant of :func:`services.lifestyle_shot_by_image`."""
+    return await _call(_lifestyle_image_request, _lifestyle_shot_by_image, args, kwargs, "Lifestyle shot generation failed")
+
+
+async def generative_fill(*args, **kwargs) -> Dict[str, Any]:
+    """Async variant of :func:`services.generative_fill`."""
+    return await _call(_generative_fill_request, _generative_fill, args, kwargs, "Generative fill failed")
+
+
+async def erase_foreground(*args, **kwargs) -> Dict[str, Any]:
+    """Async variant of :func:`services.erase_foreground`."""
+    return await _call(_erase_foreground_request, _erase_foreground, args, kwargs, "Erase foreground failed")
+
+
+async def enhance_prompt(*args, **kwargs) -> str:
+    """Async variant of :func:`services.enhance_prompt`."""
+    (url, headers, data), cancel = await _build(_prompt_enhancer_request, _enhance_prompt, args, kwargs)
+    try:
+        result = await post_json(url, headers=headers, json=data, cancel=cancel)
+        return result.get("prompt variations", data['prompt'])
+    except (CircuitOpenError, Cancelled):
+        raise
+    except Exception as e:
+        logger.warning("Error enhancing prompt: %s", e)
+        return data['prompt']
+
+
+__all__ = [
+    'lifestyle_shot_by_text',
+    'lifestyle_shot_by_image',
+    'add_shadow',
+    'create_packshot',
+    'enhance_prompt',
+    'generative_fill',
+    'generate_hd_image',
+    'erase_foreground',
+    'set_concurrency_limit',
+    'aclose'
+]
@@ -0,0 +1,247 @@
+"""
+Per-endpoint circuit breakers for the Bria API.
+
+When an endpoint keeps failing (5xx responses, timeouts, connection errors)
+there is no point in making every caller wait for its own failure. Each
+endpoint has a breaker that watches a sliding window of recent calls:
+
+* CLOSED: calls go through; once at least ``min_calls`` calls in the window
+  failed at ``failure_rate`` or more, the breaker opens.
+* OPEN: calls fail immediately with ``CircuitOpenError`` until ``cooldown``
+  seconds have passed.
+* HALF_OPEN: up to ``probes`` calls are let through; if they all succeed the
+  breaker closes, and any failure opens it again.
+
+Client errors (4xx, including 429 rate limiting) and cache hits do not count. Settings come from the
+environment:
+
+    BRIA_BREAKER               "0" disables the breakers
+    BRIA_BREAKER_FAILURE_RATE  failure ratio that opens the breaker (default 0.5)
+    BRIA_BREAKER_MIN_CALLS     calls in the window before it can open (default 5)
+    BRIA_BREAKER_WINDOW        window length in seconds (default 60)
+    BRIA_BREAKER_COOLDOWN      seconds to stay open before probing (default 30)
+    BRIA_BREAKER_PROBES        probe calls in the half-open state (default 2)
+"""
+from typing import Dict, Any, List, Optional
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from . import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Gauge values exported as ``circuit_state``.
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose breaker is open."""
+
+    def __init__(self, endpoint: str, retry_in: float):
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+        super().__init__(
+            f"{endpoint} is temporarily unavailable (too many recent failures); "
+            f"retrying in {retry_in:.0f}s"
+        )
+
+
+@dataclass
+class BreakerConfig:
+    """Tunables for the circuit breakers."""
+    enabled: bool = os.getenv("BRIA_BREAKER", "1").lower() not in ("0", "false", "no")
+    failure_rate: float = float(os.getenv("BRIA_BREAKER_FAILURE_RATE", "0.5"))
+    min_calls: int = int(os.getenv("BRIA_BREAKER_MIN_CALLS", "5"))
+    window: float = float(os.getenv("BRIA_BREAKER_WINDOW", "60"))
+    cooldown: float = float(os.getenv("BRIA_BREAKER_COOLDOWN", "30"))
+    probes: int = int(os.getenv("BRIA_BREAKER_PROBES", "2"))
+
+
+class CircuitBreaker:
+    """
+    Breaker state for one endpoint.
+
+    Args:
+        endpoint: Endpoint path
+        config: Breaker settings
+    """
+
+    def __init__(self, endpoint: str, config: BreakerConfig):
+        self.endpoint = endpoint
+        self.config = config
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._outcomes: deque = deque()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        metrics.set_gauge("circuit_state", self.endpoint, STATE_VALUES[state])
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            metrics.increment("circuit_opens", self.endpoint)
+        elif state == HALF_OPEN:
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        else:
+            self._outcomes.clear()
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker starts probing."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.config.cooldown - time.monotonic())
+
+    def before_call(self) -> bool:
+        """
+        Admit a call or raise ``CircuitOpenError``.
+
+        Returns:
+            True if the call is a half-open probe
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if self.retry_in() > 0:
+                    metrics.increment("circuit_rejections", self.endpoint)
+                    raise CircuitOpenError(self.endpoint, self.retry_in())
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight + self._probe_successes >= self.config.probes:
+                    metrics.increment("circuit_rejections", self.endpoint)
+                    raise CircuitOpenError(self.endpoint, 0.0)
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def record(self, success: Optional[bool], probe: bool = False) -> None:
+        """Record the outcome of an admitted call; None means it never reached the endpoint."""
+        with self._lock:
+            if probe:
+                if self.state != HALF_OPEN:
+                    return
+                self._probes_in_flight -= 1
+                if success is None:
+                    return
+                if not success:
+                    self._transition(OPEN)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.config.probes:
+                        self._transition(CLOSED)
+                return
+
+            if self.state != CLOSED or success is None:
+                return
+            now = time.monotonic()
+            self._outcomes.append((now, success))
+            while self._outcomes and self._outcomes[0][0] < now - self.config.window:
+                self._outcomes.popleft()
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (
+                len(self._outcomes) >= self.config.min_calls
+                and failures / len(self._outcomes) >= self.config.failure_rate
+            ):
+                self._transition(OPEN)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = self.retry_in()
+            # Past the cool-down the next call is a probe, even before it arrives.
+            state = HALF_OPEN if self.state == OPEN and not retry_in else self.state
+            return {"endpoint": self.endpoint, "state": state, "retry_in": retry_in}
+
+
+_config = BreakerConfig()
+_breakers: Dict[str, CircuitBreaker] = {}
+_lock = threading.Lock()
+
+
+def configure(**overrides) -> BreakerConfig:
+    """
+    Update the breaker settings and reset every breaker.
+
+    Args:
+        **overrides: Any ``BreakerConfig`` field, e.g. ``cooldown=10``
+    """
+    global _config
+    with _lock:
+        _config = BreakerConfig(**{**_config.__dict__, **overrides})
+        _breakers.clear()
+    return _config
+
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    """Return the breaker for ``endpoint``, creating it on first use."""
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.setdefault(endpoint, CircuitBreaker(endpoint, _config))
+    return breaker
+
+
+def before_call(endpoint: str) -> bool:
+    """Admit a call to ``endpoint`` or raise ``CircuitOpenError``; True for probes."""
+    if not _config.enabled:
+        return False
+    return get_breaker(endpoint).before_call()
+
+
+def outcome(status_code: int) -> Optional[bool]:
+    """
+    How a response with ``status_code`` counts for the breaker.
+
+    Returns:
+        True for successes, False for server errors, and None for client
+        errors (including 429), which say nothing about the endpoint's health
+    """
+    if status_code >= 500:
+        return False
+    if status_code >= 400:
+        return None
+    return True
+
+
+def record(endpoint: str, success: Optional[bool], probe: bool = False) -> None:
+    """Record the outcome of a call admitted by ``before_call``."""
+    if _config.enabled:
+        get_breaker(endpoint).record(success, probe)
+
+
+def status(endpoint: str) -> Dict[str, Any]:
+    """Return ``{"endpoint", "state", "retry_in"}`` for ``endpoint``."""
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        return {"endpoint": endpoint, "state": CLOSED, "retry_in": 0.0}
+    return breaker.snapshot()
+
+
+def degraded() -> List[Dict[str, Any]]:
+    """Return the status of every endpoint whose breaker is not closed."""
+    return [
+        snapshot for snapshot in (breaker.snapshot() for breaker in list(_breakers.values()))
+        if snapshot["state"] != CLOSED
+    ]
+
+
+__all__ = [
+    'CircuitOpenError',
+    'BreakerConfig',
+    'CircuitBreaker',
+    'CLOSED',
+    'OPEN',
+    'HALF_OPEN',
+    'configure',
+    'get_breaker',
+    'before_call',
+    'outcome',
+    'record',
+    'status',
+    'degraded'
+]
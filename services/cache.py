@@ -0,0 +1,271 @@
+"""
+Content-addressed, disk-backed cache for deterministic Bria calls.
+
+Packshot, shadow and erase-foreground always return the same result for the
+same input, and so do seeded generation calls. Their responses are stored on
+disk keyed by a hash of the endpoint, the normalized payload and the digest
+of every embedded image, so re-running an identical call costs no credits.
+
+Settings come from the environment:
+
+    BRIA_CACHE         "0" disables the cache (enabled by default)
+    BRIA_CACHE_DIR     cache directory (default ".bria_cache")
+    BRIA_CACHE_MAX_MB  size limit before least-recently-used eviction
+    BRIA_CACHE_TTL     entry lifetime in seconds
+"""
+from typing import Dict, Any, Optional
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+from .image import ImageHandle
+
+# Payload fields that carry images.
+IMAGE_FIELDS = ('file', 'mask_file', 'ref_image_file')
+
+# Endpoints whose output depends only on their input.
+DETERMINISTIC_ENDPOINTS = (
+    '/v1/product/packshot',
+    '/v1/product/shadow',
+    '/v1/erase_foreground',
+)
+
+# Generation endpoints that are deterministic only when a seed is given.
+SEEDED_ENDPOINTS = (
+    '/v1/text-to-image/hd',
+    '/v1/gen_fill',
+)
+
+
+def is_deterministic(endpoint: str, payload: Dict[str, Any]) -> bool:
+    """Return True if repeating the call yields the same result."""
+    if endpoint.startswith(DETERMINISTIC_ENDPOINTS):
+        return True
+    if endpoint.startswith(SEEDED_ENDPOINTS):
+        return payload.get('seed') is not None
+    return False
+
+
+def is_repeatable(endpoint: str, payload: Dict[str, Any]) -> bool:
+    """Return True if sending the call twice is harmless: same result, and no second async job."""
+    return payload.get('sync') is not False and is_deterministic(endpoint, payload)
+
+
+def is_cacheable(endpoint: str, payload: Dict[str, Any]) -> bool:
+    """Return True if the call is deterministic and safe to serve from cache."""
+    if payload.get('sync') is False:
+        # Placeholder URLs may still fail to render.
+        return False
+    return is_deterministic(endpoint, payload)
+
+
+def _digest(value: Any) -> str:
+    if isinstance(value, ImageHandle):
+        return "sha256:" + value.digest
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return "sha256:" + hashlib.sha256(value).hexdigest()
+
+
+def cache_key(endpoint: str, payload: Dict[str, Any], host: str = "") -> str:
+    """
+    Hash the endpoint and payload, replacing image fields by their digest.
+
+    ``host`` keeps responses from a non-default API host (e.g. a local mock
+    server) apart from production ones.
+    """
+    normalized = {
+        key: _digest(value) if key in IMAGE_FIELDS else value
+        for key, value in payload.items()
+    }
+    material = {'endpoint': endpoint, 'payload': normalized}
+    if host:
+        material['host'] = host
+    material = json.dumps(material, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU cache of JSON responses stored as one file per entry.
+
+    Args:
+        directory: Where entries are stored
+        max_bytes: Total size above which the least recently used entries are evicted
+        ttl: Seconds an entry stays valid
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._total = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        # Rebuild recency order from file modification times.
+        if self._index is None:
+            entries = []
+            if os.path.isdir(self.directory):
+                for root, _, files in os.walk(self.directory):
+                    for name in files:
+                        if name.endswith(".json"):
+                            stat = os.stat(os.path.join(root, name))
+                            entries.append((stat.st_mtime, name[:-5], stat.st_size))
+            entries.sort()
+            self._index = OrderedDict((key, size) for _, key, size in entries)
+            self._total = sum(self._index.values())
+        return self._index
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response, or None if missing or expired."""
+        path = self._path(key)
+        with self._lock:
+            index = self._load_index()
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._drop(key)
+                return None
+            if time.time() - entry.get("created", 0) > self.ttl:
+                self._remove(key)
+                return None
+            os.utime(path)
+            if key in index:
+                index.move_to_end(key)
+            return entry["response"]
+
+    def put(self, key: str, endpoint: str, response: Dict[str, Any]) -> None:
+        """Store a response and evict old entries beyond the size limit."""
+        path = self._path(key)
+        body = json.dumps({"created": time.time(), "endpoint": endpoint, "response": response})
+        with self._lock:
+            index = self._load_index()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(body)
+            os.replace(tmp, path)
+            self._drop(key)
+            index[key] = len(body)
+            self._total += len(body)
+            while self._total > self.max_bytes and len(index) > 1:
+                oldest = next(iter(index))
+                self._remove(oldest)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            for key in list(self._load_index()):
+                self._remove(key)
+
+    def _drop(self, key: str) -> None:
+        size = self._index.pop(key, None) if self._index is not None else None
+        if size is not None:
+            self._total -= size
+
+    def _remove(self, key: str) -> None:
+        self._drop(key)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+_cache: Optional[ResponseCache] = None
+_enabled = os.getenv("BRIA_CACHE", "1").lower() not in ("0", "false", "no")
+_cache_lock = threading.Lock()
+
+
+def configure(
+    enabled: Optional[bool] = None,
+    directory: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    ttl: Optional[float] = None
+) -> Optional[ResponseCache]:
+    """Override the environment settings; returns the active cache or None."""
+    global _cache, _enabled
+    with _cache_lock:
+        if enabled is not None:
+            _enabled = enabled
+        current = _cache or _default_cache()
+        _cache = ResponseCache(
+            directory or current.directory,
+            max_bytes if max_bytes is not None else current.max_bytes,
+            ttl if ttl is not None else current.ttl
+        )
+    return get_cache()
+
+
+def _default_cache() -> ResponseCache:
+    return ResponseCache(
+        os.getenv("BRIA_CACHE_DIR", ".bria_cache"),
+        int(float(os.getenv("BRIA_CACHE_MAX_MB", "256")) * 1024 * 1024),
+        float(os.getenv("BRIA_CACHE_TTL", str(24 * 3600)))
+    )
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """Return the process-wide cache, or None when caching is disabled."""
+    global _cache
+    if not _enabled:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _default_cache()
+    return _cache
+
+
+def lookup(endpoint: str, payload: Dict[str, Any], host: str = "") -> Optional[str]:
+    """
+    Return the cache key for a cacheable call, or None if it must not be cached.
+    """
+    if get_cache() is None or not is_cacheable(endpoint, payload):
+        return None
+    return cache_key(endpoint, payload, host)
+
+
+def fetch(endpoint: str, key: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Look up a response by key and record the hit or miss."""
+    cache = get_cache()
+    if key is None or cache is None:
+        return None
+    response = cache.get(key)
+    metrics.increment("cache_hits" if response is not None else "cache_misses", endpoint)
+    return response
+
+
+def store(endpoint: str, key: Optional[str], response: Dict[str, Any]) -> None:
+    """Store a successful response under its key."""
+    cache = get_cache()
+    if key is None or cache is None:
+        return
+    try:
+        cache.put(key, endpoint, response)
+        metrics.increment("cache_stores", endpoint)
+    except OSError:
+        metrics.increment("cache_errors", endpoint)
+
+
+__all__ = [
+    'ResponseCache',
+    'is_deterministic',
+    'is_repeatable',
+    'is_cacheable',
+    'cache_key',
+    'configure',
+    'get_cache',
+    'lookup',
+    'fetch',
+    'store'
+]
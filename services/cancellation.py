@@ -0,0 +1,109 @@
+"""
+Cooperative cancellation for Bria calls.
+
+A ``CancelToken`` is handed to a service function (``cancel=token``) or a
+workflow; cancelling it stops the work at the next safe point:
+
+- before a request is sent, or before a retry, nothing goes out;
+- once a request is on the wire it cannot be recalled, so its response is
+  dropped as soon as the headers arrive and the connection is released
+  without reading the body.
+
+Either way the caller gets ``Cancelled``. The transport counts calls
+stopped before being sent as ``cancelled_calls`` and calls that were sent
+(and billed) but whose result was thrown away as ``wasted_calls``.
+
+Tokens can be chained: a child token is cancelled with its parent, so a
+workflow can cancel its own stages without touching the caller's token.
+Children of a long-lived token (a session's or a job's) should be
+``detach``-ed once their work settles, so the parent does not keep every
+child it ever had.
+"""
+from typing import Callable, Dict, Optional
+import threading
+
+
+class Cancelled(Exception):
+    """Raised by a call whose cancellation token was cancelled."""
+
+    def __init__(self, reason: str = "cancelled", endpoint: str = ""):
+        self.reason = reason
+        self.endpoint = endpoint
+        super().__init__(f"{endpoint} call {reason}" if endpoint else f"Call {reason}")
+
+
+class CancelToken(threading.Event):
+    """
+    A cancellation flag shared by the caller and the work it started.
+
+    Being an ``Event``, it can be waited on and passed wherever the
+    transport accepts a ``cancel`` event.
+
+    Args:
+        parent: Token whose cancellation also cancels this one
+    """
+
+    def __init__(self, parent: Optional["CancelToken"] = None):
+        super().__init__()
+        self.reason: Optional[str] = None
+        self._callbacks: Dict[object, Callable[[], None]] = {}
+        self._callbacks_lock = threading.Lock()
+        self._detach: Callable[[], None] = _noop
+        if parent is not None:
+            self._detach = parent.on_cancel(lambda: self.cancel(parent.reason or "cancelled"))
+
+    @property
+    def cancelled(self) -> bool:
+        return self.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Cancel the token; only the first reason is kept."""
+        with self._callbacks_lock:
+            if self.is_set():
+                return
+            self.reason = reason
+            self.set()
+            callbacks, self._callbacks = self._callbacks, {}
+        for callback in callbacks.values():
+            callback()
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Call ``callback`` once the token is cancelled (now, if it already is).
+
+        Returns:
+            A function that unregisters ``callback``
+        """
+        with self._callbacks_lock:
+            if not self.is_set():
+                handle = object()
+                self._callbacks[handle] = callback
+                return lambda: self._unregister(handle)
+        callback()
+        return _noop
+
+    def _unregister(self, handle: object) -> None:
+        with self._callbacks_lock:
+            self._callbacks.pop(handle, None)
+
+    def detach(self) -> None:
+        """Stop following the parent token; call once the work using this token has settled."""
+        self._detach()
+        self._detach = _noop
+
+    def raise_if_cancelled(self, endpoint: str = "") -> None:
+        if self.is_set():
+            raise Cancelled(self.reason or "cancelled", endpoint)
+
+
+def _noop() -> None:
+    pass
+
+
+def check(cancel: Optional[threading.Event], endpoint: str = "") -> None:
+    """Raise ``Cancelled`` if ``cancel`` (a token or plain event) is set."""
+    if cancel is not None and cancel.is_set():
+        raise Cancelled(getattr(cancel, "reason", None) or "cancelled", endpoint)
+
+
+__all__ = ['Cancelled', 'CancelToken', 'check']
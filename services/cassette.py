@@ -0,0 +1,350 @@
+"""
+Record/replay cassettes for Bria API calls.
+
+In record mode every call made through the transport is stored in a SQLite
+cassette file together with how long it took, and every result image it
+returns is downloaded into the same file. In replay mode no API request is
+made: each call is answered from the cassette, optionally after the
+recorded delay, and result URLs are replaced by ``data:`` URIs holding the
+recorded images, so the app works without network access.
+
+Calls are matched by a fingerprint of the endpoint and payload (the same
+content hash the response cache uses; API keys are not part of it). A call
+recorded several times, like unseeded generation, replays its responses in
+order and then starts over. HTTP errors are recorded and replayed as well.
+
+Settings come from the environment:
+
+    BRIA_CASSETTE_MODE   "record" or "replay" (off by default)
+    BRIA_CASSETTE        cassette file (default "bria.cassette")
+    BRIA_CASSETTE_SPEED  "instant", "original", or a factor applied to the
+                         recorded durations in replay (default "instant")
+"""
+from typing import Dict, Any, List, Optional
+import base64
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+SPEEDS = {"instant": 0.0, "original": 1.0}
+
+# How long to keep polling for a sync=False result image while recording.
+IMAGE_WAIT = 180.0
+IMAGE_POLL_INTERVAL = 2.0
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode for a call that was never recorded."""
+
+    def __init__(self, endpoint: str, fingerprint: str):
+        self.endpoint = endpoint
+        self.fingerprint = fingerprint
+        super().__init__(f"No recorded response for {endpoint} (fingerprint {fingerprint[:12]})")
+
+
+class ReplayedHTTPError(Exception):
+    """An HTTP error response played back from a cassette."""
+
+    def __init__(self, status: int, message: str):
+        self.status = status
+        super().__init__(message)
+
+
+@dataclass
+class Interaction:
+    """One recorded call."""
+    endpoint: str
+    status: int
+    elapsed: float
+    response: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def result(self) -> Dict[str, Any]:
+        """Return the recorded response, or raise the recorded HTTP error."""
+        if self.error is not None:
+            raise ReplayedHTTPError(self.status, self.error)
+        return self.response
+
+
+def parse_speed(value: str) -> float:
+    """Parse ``BRIA_CASSETTE_SPEED``: "instant", "original" or a factor."""
+    value = value.strip().lower()
+    if value in SPEEDS:
+        return SPEEDS[value]
+    return max(0.0, float(value))
+
+
+def fingerprint(endpoint: str, payload: Dict[str, Any]) -> str:
+    """Match key for a call; independent of the API key and the API host."""
+    return cache.cache_key(endpoint, payload)
+
+
+def image_urls(response: Any) -> List[str]:
+    """Result image URLs in a response."""
+    from .jobs import result_urls
+    return [url for url in result_urls(response) if url.startswith(("http://", "https://"))]
+
+
+class Cassette:
+    """
+    A cassette file of recorded calls and images.
+
+    Args:
+        path: SQLite file holding the cassette
+        mode: ``RECORD`` or ``REPLAY``
+        speed: Replay delay as a fraction of the recorded duration (0 = instant)
+    """
+
+    def __init__(self, path: str, mode: str, speed: float = 0.0):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS interactions (
+                fingerprint TEXT NOT NULL, seq INTEGER NOT NULL, endpoint TEXT NOT NULL,
+                status INTEGER NOT NULL, elapsed REAL NOT NULL, body BLOB NOT NULL,
+                recorded_at REAL NOT NULL, PRIMARY KEY (fingerprint, seq)
+            );
+            CREATE TABLE IF NOT EXISTS images (
+                url TEXT PRIMARY KEY, digest TEXT NOT NULL, content_type TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY, data BLOB NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+        self._played: Dict[str, int] = defaultdict(int)
+        self._downloader: Optional[ThreadPoolExecutor] = None
+
+    # Recording
+
+    def record(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        elapsed: float,
+        response: Optional[Dict[str, Any]] = None,
+        status: int = 200,
+        error: Optional[str] = None
+    ) -> None:
+        """Store one call and start downloading the images it returned."""
+        key = fingerprint(endpoint, payload)
+        body = zlib.compress(json.dumps({"response": response, "error": error}).encode("utf-8"))
+        with self._lock:
+            (seq,) = self._conn.execute(
+                "SELECT COUNT(*) FROM interactions WHERE fingerprint = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT INTO interactions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, seq, endpoint, status, elapsed, body, time.time())
+            )
+            self._conn.commit()
+        for url in image_urls(response):
+            self._download_later(url)
+
+    def store_image(self, url: str, data: bytes, content_type: str = "image/png") -> None:
+        """Store the bytes served at ``url``; identical images are kept once."""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?)", (digest, data))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?)", (url, digest, content_type)
+            )
+            self._conn.commit()
+
+    def has_image(self, url: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM images WHERE url = ?", (url,)).fetchone() is not None
+
+    def _download_later(self, url: str) -> None:
+        if self._downloader is None:
+            with self._lock:
+                if self._downloader is None:
+                    self._downloader = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bria-cassette")
+        self._downloader.submit(self._download, url)
+
+    def _download(self, url: str) -> None:
+        # sync=False results only appear once rendering has finished.
+        from . import transport
+        deadline = time.monotonic() + IMAGE_WAIT
+        while not self.has_image(url):
+            try:
+                response = transport.get_session().get(url, timeout=(transport.get_config().connect_timeout, 30))
+                if response.status_code == 200 and response.content:
+                    self.store_image(url, response.content, response.headers.get("Content-Type", "image/png"))
+                    return
+            except Exception as e:
+                logger.debug("Cassette: download of %s failed (%s)", url, e)
+            if time.monotonic() >= deadline:
+                logger.warning("Cassette: gave up recording image %s", url)
+                return
+            time.sleep(IMAGE_POLL_INTERVAL)
+
+    def wait_for_images(self) -> None:
+        """Block until every pending image download has finished."""
+        if self._downloader is not None:
+            downloader, self._downloader = self._downloader, None
+            downloader.shutdown(wait=True)
+
+    # Replay
+
+    def lookup(self, endpoint: str, payload: Dict[str, Any]) -> Interaction:
+        """Return the next recorded interaction for this call, or raise ``CassetteMiss``."""
+        key = fingerprint(endpoint, payload)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, elapsed, body FROM interactions WHERE fingerprint = ? ORDER BY seq",
+                (key,)
+            ).fetchall()
+            if not rows:
+                raise CassetteMiss(endpoint, key)
+            status, elapsed, body = rows[self._played[key] % len(rows)]
+            self._played[key] += 1
+        stored = json.loads(zlib.decompress(body))
+        response = self._inline_images(stored["response"])
+        return Interaction(endpoint, status, elapsed, response, stored["error"])
+
+    def delay(self, interaction: Interaction) -> float:
+        """Seconds to wait before answering with ``interaction``."""
+        return interaction.elapsed * self.speed
+
+    def image(self, url: str) -> Optional[bytes]:
+        """Recorded bytes for ``url``, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM blobs JOIN images USING (digest) WHERE url = ?", (url,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _data_uri(self, url: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_type, data FROM blobs JOIN images USING (digest) WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        content_type, data = row
+        return f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+    def _inline_images(self, response: Any) -> Any:
+        # Swap recorded result URLs for data URIs so nothing is fetched.
+        if response is None:
+            return None
+        replacements = {url: self._data_uri(url) for url in image_urls(response)}
+        replacements = {url: uri for url, uri in replacements.items() if uri}
+
+        def swap(value: Any) -> Any:
+            if isinstance(value, str):
+                return replacements.get(value, value)
+            if isinstance(value, list):
+                return [swap(item) for item in value]
+            if isinstance(value, dict):
+                return {k: swap(v) for k, v in value.items()}
+            return value
+
+        return swap(copy.deepcopy(response)) if replacements else response
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of recorded calls and images, and the image bytes stored."""
+        with self._lock:
+            (calls,) = self._conn.execute("SELECT COUNT(*) FROM interactions").fetchone()
+            (images,) = self._conn.execute("SELECT COUNT(*) FROM images").fetchone()
+            (stored,) = self._conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM blobs").fetchone()
+        return {"path": self.path, "mode": self.mode, "calls": calls, "images": images, "image_bytes": stored}
+
+    def close(self) -> None:
+        self.wait_for_images()
+        with self._lock:
+            self._conn.close()
+
+
+def _from_environment() -> Optional[Cassette]:
+    mode = os.getenv("BRIA_CASSETTE_MODE", OFF).lower()
+    if mode == OFF:
+        return None
+    return Cassette(
+        os.getenv("BRIA_CASSETTE", "bria.cassette"),
+        mode,
+        parse_speed(os.getenv("BRIA_CASSETTE_SPEED", "instant"))
+    )
+
+
+_cassette: Optional[Cassette] = _from_environment()
+_lock = threading.Lock()
+
+
+def configure(mode: str = OFF, path: str = "bria.cassette", speed: float = 0.0) -> Optional[Cassette]:
+    """
+    Start recording to, or replaying from, a cassette; ``mode="off"`` stops.
+
+    Args:
+        mode: "record", "replay" or "off"
+        path: Cassette file
+        speed: Replay delay as a fraction of the recorded duration (0 = instant, 1 = original)
+
+    Returns:
+        The active cassette, or None when off
+    """
+    global _cassette
+    with _lock:
+        if _cassette is not None:
+            _cassette.close()
+        _cassette = None if mode == OFF else Cassette(path, mode, speed)
+    return _cassette
+
+
+def get_cassette() -> Optional[Cassette]:
+    """Return the active cassette, or None when recording and replay are off."""
+    return _cassette
+
+
+def recording() -> Optional[Cassette]:
+    """The active cassette if it is recording."""
+    cassette = _cassette
+    return cassette if cassette is not None and cassette.mode == RECORD else None
+
+
+def replaying() -> Optional[Cassette]:
+    """The active cassette if it is replaying."""
+    cassette = _cassette
+    return cassette if cassette is not None and cassette.mode == REPLAY else None
+
+
+__all__ = [
+    'CassetteMiss',
+    'ReplayedHTTPError',
+    'Interaction',
+    'Cassette',
+    'RECORD',
+    'REPLAY',
+    'parse_speed',
+    'fingerprint',
+    'image_urls',
+    'configure',
+    'get_cassette',
+    'recording',
+    'replaying'
+]
@@ -1,29 +1,19 @@
-from typing import Dict, Any, Optional
-import requests
-import base64
+from typing import Dict, Any, Optional, Tuple
+from . import transport
+from .breaker import CircuitOpenError
+from .cancellation import Cancelled, CancelToken
+from . import ingest
+from .image import ImageInput
 
-def erase_foreground(
+def _erase_foreground_request(
     api_key: str,
-    image_data: bytes = None,
-    image_url: str = None,
-    content_moderation: bool = False
-) -> Dict[str, Any]:
-    """
-    Erase the foreground from an image and generate the area behind it.
-    
-    Args:
-        api_key: Bria AI API key
-        image_data: Image data in bytes (optional if image_url provided)
-        image_url: URL of the image (optional if image_data provided)
-        content_moderation: Whether to enable content moderation
-    """
-    url = "https://engine.prod.bria-api.com/v1/erase_foreground"
-    
-    headers = {
-        'api_token': api_key,
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
+    image_data: Optional[ImageInput],
+    image_url: Optional[str],
+    content_moderation: bool
+) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """Build the URL, headers and payload for an erase-foreground call."""
+    url = transport.api_url("/v1/erase_foreground")
+    headers = transport.api_headers(api_key)
     
     # Prepare request data
     data = {
@@ -34,22 +24,37 @@ def erase_foreground(
     if image_url:
         data['image_url'] = image_url
     elif image_data:
-        data['file'] = base64.b64encode(image_data).decode('utf-8')
+        data['file'] = ingest.prepare_image(image_data, transport.endpoint_path(url))
     else:
         raise ValueError("Either image_data or image_url must be provided")
     
+    return url, headers, data
+
+def erase_foreground(
+    api_key: str,
+    image_data: ImageInput = None,
+    image_url: str = None,
+    content_moderation: bool = False,
+    cancel: Optional[CancelToken] = None
+) -> Dict[str, Any]:
+    """
+    Erase the foreground from an image and generate the area behind it.
+    
+    Args:
+        api_key: Bria AI API key
+        image_data: Image data in bytes or an ImageHandle (optional if image_url provided)
+        image_url: URL of the image (optional if image_data provided)
+        content_moderation: Whether to enable content moderation
+        cancel: Optional token that cancels the call (see ``services.cancellation``)
+    """
+    url, headers, data = _erase_foreground_request(
+        api_key, image_data, image_url, content_moderation
+    )
+    
     try:
-        print(f"Making request to: {url}")
-        print(f"Headers: {headers}")
-        print(f"Data: {data}")
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
-        
-        return response.json()
+        return transport.post_json(url, headers=headers, json=data, cancel=cancel)
+    except (CircuitOpenError, Cancelled):
+        raise
     except Exception as e:
         raise Exception(f"Erase foreground failed: {str(e)}")
 
@@ -0,0 +1,155 @@
+"""
+Fan-out for generation calls that want more results than one request allows.
+
+Bria returns at most ``MAX_RESULTS_PER_CALL`` images per generation request.
+``fan_out`` splits a larger ``num_results`` into parallel sub-requests of at
+most that many, and merges their results into a single response in
+sub-request order::
+
+    from services import fan_out, generate_hd_image
+
+    response = fan_out(generate_hd_image, 16, prompt="...", api_key=api_key, seed=42)
+
+Functions that take a ``seed`` get a distinct one per sub-request, derived
+from the caller's seed (or from a random one, reported in the response), so a
+fan-out can be repeated exactly. The sub-requests go through the transport
+like any other call, so the shared concurrency limit still caps how many are
+in flight.
+"""
+from typing import Dict, Any, Callable, List, Optional
+import hashlib
+import inspect
+import random
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from .cancellation import CancelToken
+from .jobs import result_urls
+
+MAX_RESULTS_PER_CALL = 4
+MAX_SEED = 2 ** 31 - 1
+
+
+def split_results(num_results: int, per_call: int = MAX_RESULTS_PER_CALL) -> List[int]:
+    """Split ``num_results`` into request sizes of at most ``per_call``, e.g. 10 -> [4, 4, 2]."""
+    num_results = max(1, num_results)
+    full, rest = divmod(num_results, per_call)
+    return [per_call] * full + ([rest] if rest else [])
+
+
+def derive_seeds(seed: int, calls: int) -> List[int]:
+    """
+    Seeds for the sub-requests of a fan-out.
+
+    The first sub-request keeps ``seed`` itself, so its results match a
+    plain call with that seed; the others get seeds hashed from ``seed`` and
+    their index, so fan-outs from neighbouring seeds do not overlap.
+    """
+    seeds = [seed]
+    for index in range(1, calls):
+        digest = hashlib.sha256(f"{seed}:{index}".encode("utf-8")).digest()
+        seeds.append(int.from_bytes(digest[:8], "big") % (MAX_SEED + 1))
+    return seeds
+
+
+def merge_results(responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine sub-request responses into one, keeping their order."""
+    urls: List[str] = []
+    rows: List[Any] = []
+    for response in responses:
+        urls.extend(result_urls(response))
+        if isinstance(response, dict):
+            rows.extend(response.get("result") or [])
+    merged: Dict[str, Any] = {"result_urls": urls}
+    if rows:
+        merged["result"] = rows
+    return merged
+
+
+def _takes_seed(fn: Callable) -> bool:
+    try:
+        return "seed" in inspect.signature(fn).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def fan_out(
+    fn: Callable[..., Dict[str, Any]],
+    num_results: int,
+    seed: Optional[int] = None,
+    cancel: Optional[CancelToken] = None,
+    max_workers: Optional[int] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Call a generation service for any number of results.
+
+    Args:
+        fn: Service function taking ``num_results``, e.g. ``generate_hd_image``
+        num_results: Total number of results wanted
+        seed: Base seed; without one, a random base seed is drawn when the
+            call has to be split (ignored if ``fn`` takes no seed)
+        cancel: Optional token that cancels every sub-request
+        max_workers: Sub-requests sent at once (default: all of them)
+        **kwargs: Other arguments for ``fn``
+
+    Returns:
+        The response of ``fn`` if one request suffices. Otherwise a merged
+        response with ``result_urls`` (and ``result`` rows) of all
+        sub-requests in order, plus ``seed``, the per-request ``seeds`` and
+        the seed of each result in ``result_seeds`` when ``fn`` takes a seed.
+    """
+    sizes = split_results(num_results)
+    seeded = _takes_seed(fn)
+    if len(sizes) == 1:
+        if seeded:
+            kwargs["seed"] = seed
+        return fn(num_results=sizes[0], cancel=cancel, **kwargs)
+
+    seeds: List[Optional[int]] = [None] * len(sizes)
+    if seeded:
+        if seed is None:
+            seed = random.randint(0, MAX_SEED)
+        seeds = derive_seeds(seed, len(sizes))
+
+    # A token of our own, so one failed sub-request stops its siblings only.
+    token = CancelToken(parent=cancel)
+
+    def call(size: int, call_seed: Optional[int]) -> Dict[str, Any]:
+        call_kwargs = dict(kwargs, num_results=size, cancel=token)
+        if seeded:
+            call_kwargs["seed"] = call_seed
+        return fn(**call_kwargs)
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(sizes), thread_name_prefix="fan-out") as pool:
+        futures = [pool.submit(call, size, call_seed) for size, call_seed in zip(sizes, seeds)]
+        try:
+            wait(futures, return_when=FIRST_EXCEPTION)
+            failed = next((future for future in futures if future.done() and future.exception()), None)
+            if failed is not None:
+                failed.result()
+            responses = [future.result() for future in futures]
+        except BaseException:
+            token.cancel("sibling request failed")
+            raise
+        finally:
+            token.detach()
+
+    merged = merge_results(responses)
+    if seeded:
+        merged["seed"] = seed
+        merged["seeds"] = seeds
+        merged["result_seeds"] = [
+            call_seed for response, call_seed in zip(responses, seeds)
+            for _ in result_urls(response)
+        ]
+    return merged
+
+
+__all__ = [
+    'MAX_RESULTS_PER_CALL',
+    'MAX_SEED',
+    'split_results',
+    'derive_seeds',
+    'merge_results',
+    'fan_out'
+]
@@ -1,74 +1,108 @@
-from typing import Dict, Any, Optional
-import requests
-import base64
+from typing import Dict, Any, Optional, Tuple
+from . import transport
+from .breaker import CircuitOpenError
+from .cancellation import Cancelled, CancelToken
+from . import ingest
+from .image import ImageHandle, ImageInput
+
+def _generative_fill_request(
+    api_key: str,
+    image_data: Optional[ImageInput],
+    mask_data: Optional[ImageInput],
+    prompt: str,
+    negative_prompt: Optional[str],
+    num_results: int,
+    sync: bool,
+    seed: Optional[int],
+    content_moderation: bool,
+    mask_type: str,
+    image_url: Optional[str],
+    mask_url: Optional[str]
+) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """Build the URL, headers and payload for a generative fill call."""
+    url = transport.api_url("/v1/gen_fill")
+    headers = transport.api_headers(api_key)
+    
+    if not (image_url or image_data):
+        raise ValueError("Either image_data or image_url must be provided")
+    if not (mask_url or mask_data):
+        raise ValueError("Either mask_data or mask_url must be provided")
+    
+    data = {}
+    if image_url and mask_url:
+        data.update({'image_url': image_url, 'mask_url': mask_url})
+    elif image_url or mask_url:
+        # The other half is remote and keeps its size, so send this one untouched
+        if image_url:
+            data.update({'image_url': image_url, 'mask_file': ImageHandle.of(mask_data)})
+        else:
+            data.update({'file': ImageHandle.of(image_data), 'mask_url': mask_url})
+    else:
+        # Downscale image and mask together so they stay aligned
+        image, mask = ingest.prepare_image_and_mask(
+            image_data, mask_data, transport.endpoint_path(url)
+        )
+        data.update({'file': image, 'mask_file': mask})
+    
+    # Prepare request data
+    data.update({
+        'mask_type': mask_type,
+        'prompt': prompt,
+        'num_results': num_results,
+        'sync': sync,
+        'content_moderation': content_moderation
+    })
+    
+    # Add optional parameters
+    if negative_prompt:
+        data['negative_prompt'] = negative_prompt
+    if seed is not None:
+        data['seed'] = seed
+    
+    return url, headers, data
 
 def generative_fill(
     api_key: str,
-    image_data: bytes,
-    mask_data: bytes,
+    image_data: Optional[ImageInput],
+    mask_data: Optional[ImageInput],
     prompt: str,
     negative_prompt: Optional[str] = None,
     num_results: int = 4,
     sync: bool = False,
     seed: Optional[int] = None,
     content_moderation: bool = False,
-    mask_type: str = "manual"
+    mask_type: str = "manual",
+    image_url: Optional[str] = None,
+    mask_url: Optional[str] = None,
+    cancel: Optional[CancelToken] = None
 ) -> Dict[str, Any]:
     """
     Generate content in a masked area of an image using a text prompt.
     
     Args:
         api_key: Bria AI API key
-        image_data: Image data in bytes
-        mask_data: Mask image data in bytes
+        image_data: Image data in bytes or an ImageHandle (may be None if image_url provided)
+        mask_data: Mask image data in bytes or an ImageHandle (may be None if mask_url provided)
         prompt: Description of what to generate in the masked area
         negative_prompt: Description of what to avoid (optional)
-        num_results: Number of variations to generate (1-4)
+        num_results: Number of variations to generate (1-4; use ``services.fan_out`` for more)
         sync: Whether to wait for results
         seed: Optional seed for reproducible results
         content_moderation: Whether to enable content moderation
         mask_type: Type of mask ('manual' or 'automatic')
+        image_url: URL of the image, sent instead of image_data
+        mask_url: URL of the mask, sent instead of mask_data
+        cancel: Optional token that cancels the call (see ``services.cancellation``)
     """
-    url = "https://engine.prod.bria-api.com/v1/gen_fill"
-    
-    headers = {
-        'api_token': api_key,
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
-    
-    # Convert image and mask to base64
-    image_base64 = base64.b64encode(image_data).decode('utf-8')
-    mask_base64 = base64.b64encode(mask_data).decode('utf-8')
-    
-    # Prepare request data
-    data = {
-        'file': image_base64,
-        'mask_file': mask_base64,
-        'mask_type': mask_type,
-        'prompt': prompt,
-        'num_results': num_results,
-        'sync': sync,
-        'content_moderation': content_moderation
-    }
-    
-    # Add optional parameters
-    if negative_prompt:
-        data['negative_prompt'] = negative_prompt
-    if seed is not None:
-        data['seed'] = seed
+    url, headers, data = _generative_fill_request(
+        api_key, image_data, mask_data, prompt, negative_prompt,
+        num_results, sync, seed, content_moderation, mask_type,
+        image_url, mask_url
+    )
     
     try:
-        print(f"Making request to: {url}")
-        print(f"Headers: {headers}")
-        print(f"Data: {data}")
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
-        
-        return response.json()
+        return transport.post_json(url, headers=headers, json=data, cancel=cancel)
+    except (CircuitOpenError, Cancelled):
+        raise
     except Exception as e:
         raise Exception(f"Generative fill failed: {str(e)}") 
\ No newline at end of file
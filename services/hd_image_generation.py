@@ -1,7 +1,63 @@
-from typing import Dict, Any, Optional, Union
-import requests
+from typing import Dict, Any, Optional, Union, Tuple
+from . import transport
+from .breaker import CircuitOpenError
+from .cancellation import Cancelled, CancelToken
 import json
 
+def _hd_image_request(
+    prompt: str,
+    api_key: str,
+    model_version: str,
+    num_results: int,
+    aspect_ratio: str,
+    sync: bool,
+    seed: Optional[int],
+    negative_prompt: str,
+    steps_num: Optional[int],
+    text_guidance_scale: Optional[float],
+    medium: Optional[str],
+    prompt_enhancement: bool,
+    enhance_image: bool,
+    content_moderation: bool,
+    ip_signal: bool
+) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """Build the URL, headers and payload for an HD text-to-image call."""
+    if not prompt:
+        raise ValueError("Prompt is required for image generation")
+    
+    # Build request data with only provided parameters
+    data = {
+        "prompt": prompt,
+        "num_results": max(1, min(num_results, 4)),
+        "sync": sync,
+        "negative_prompt": negative_prompt
+    }
+    
+    # Add optional parameters only if they have valid values
+    if aspect_ratio:
+        data["aspect_ratio"] = aspect_ratio
+    if seed is not None:
+        data["seed"] = seed
+    if steps_num is not None:
+        data["steps_num"] = max(20, min(steps_num, 50))
+    if text_guidance_scale is not None:
+        data["text_guidance_scale"] = max(1.0, min(text_guidance_scale, 10.0))
+    if medium:
+        data["medium"] = medium
+    if prompt_enhancement:
+        data["prompt_enhancement"] = prompt_enhancement
+    if enhance_image:
+        data["enhance_image"] = enhance_image
+    if content_moderation:
+        data["content_moderation"] = content_moderation
+    if ip_signal:
+        data["ip_signal"] = ip_signal
+    
+    url = transport.api_url(f"/v1/text-to-image/hd/{model_version}")
+    headers = transport.api_headers(api_key)
+    
+    return url, headers, data
+
 def generate_hd_image(
     prompt: str,
     api_key: str,
@@ -17,7 +73,8 @@ def generate_hd_image(
     prompt_enhancement: bool = False,
     enhance_image: bool = False,
     content_moderation: bool = False,
-    ip_signal: bool = False
+    ip_signal: bool = False,
+    cancel: Optional[CancelToken] = None
 ) -> Dict[str, Any]:
     """Generate HD image from prompt using Bria's text-to-image API.
     
@@ -25,7 +82,7 @@ def generate_hd_image(
         prompt: The prompt to generate images from
         api_key: API key for authentication
         model_version: Model version to use (default: "2.2")
-        num_results: Number of images to generate (1-4)
+        num_results: Number of images to generate (1-4; use ``services.fan_out`` for more)
         aspect_ratio: Image aspect ratio ("1:1", "2:3", "3:2", etc.)
         sync: Whether to wait for results or get URLs immediately
         seed: Optional seed for reproducible results
@@ -37,57 +94,19 @@ def generate_hd_image(
         enhance_image: Whether to enhance image quality
         content_moderation: Whether to enable content moderation
         ip_signal: Whether to flag potential IP content
+        cancel: Optional token that cancels the call (see ``services.cancellation``)
     """
     
-    if not prompt:
-        raise ValueError("Prompt is required for image generation")
-    
-    # Build request data with only provided parameters
-    data = {
-        "prompt": prompt,
-        "num_results": max(1, min(num_results, 4)),
-        "sync": sync,
-        "negative_prompt": negative_prompt
-    }
-    
-    # Add optional parameters only if they have valid values
-    if aspect_ratio:
-        data["aspect_ratio"] = aspect_ratio
-    if seed is not None:
-        data["seed"] = seed
-    if steps_num is not None:
-        data["steps_num"] = max(20, min(steps_num, 50))
-    if text_guidance_scale is not None:
-        data["text_guidance_scale"] = max(1.0, min(text_guidance_scale, 10.0))
-    if medium:
-        data["medium"] = medium
-    if prompt_enhancement:
-        data["prompt_enhancement"] = prompt_enhancement
-    if enhance_image:
-        data["enhance_image"] = enhance_image
-    if content_moderation:
-        data["content_moderation"] = content_moderation
-    if ip_signal:
-        data["ip_signal"] = ip_signal
-    
-    url = f"https://engine.prod.bria-api.com/v1/text-to-image/hd/{model_version}"
-    headers = {
-        'api_token': api_key,
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
+    url, headers, data = _hd_image_request(
+        prompt, api_key, model_version, num_results, aspect_ratio, sync, seed,
+        negative_prompt, steps_num, text_guidance_scale, medium,
+        prompt_enhancement, enhance_image, content_moderation, ip_signal
+    )
     
     try:
-        print(f"Making request to: {url}")
-        print(f"Headers: {headers}")
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
-        
-        return response.json()
+        return transport.post_json(url, headers=headers, json=data, cancel=cancel)
         
+    except (CircuitOpenError, Cancelled):
+        raise
     except Exception as e:
         raise Exception(f"HD image generation failed: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+Hedged requests for slow generation endpoints.
+
+A generation call that has not answered by its endpoint's observed p95
+latency is usually stuck on one slow backend replica. With hedging enabled,
+the transport then sends one duplicate of the call, returns whichever
+response arrives first and abandons the other. Only calls that are safe to
+repeat are hedged: deterministic endpoints and generation with a fixed seed.
+
+Duplicates cost credits, so hedges are capped at ``budget`` times the number
+of eligible calls. Settings come from the environment:
+
+    BRIA_HEDGE              "1" enables hedging (off by default)
+    BRIA_HEDGE_BUDGET       extra traffic allowed, as a fraction of calls (default 0.1)
+    BRIA_HEDGE_QUANTILE     latency quantile that triggers a hedge (default 0.95)
+    BRIA_HEDGE_MIN_SAMPLES  calls observed before hedging starts (default 20)
+
+Metrics per endpoint: ``hedges_sent``, ``hedge_wins``, ``hedges_over_budget``
+and the ``unhedged_latency_seconds`` histogram, which records how long the
+original request took on its own. An original request abandoned because its
+hedge won is recorded with the time until it was abandoned, a lower bound of
+its latency, and counted as ``unhedged_abandoned``; so comparing the
+histogram's p99 with ``latency_seconds`` understates, never overstates, what
+hedging saves.
+"""
+from typing import Dict, Any, Optional, Tuple
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from . import cache, metrics
+
+HEDGE_ENDPOINTS = (
+    '/v1/text-to-image/hd',
+    '/v1/gen_fill',
+)
+
+
+@dataclass
+class HedgeConfig:
+    """Tunables for request hedging."""
+    enabled: bool = os.getenv("BRIA_HEDGE", "0").lower() in ("1", "true", "yes")
+    budget: float = float(os.getenv("BRIA_HEDGE_BUDGET", "0.1"))
+    quantile: float = float(os.getenv("BRIA_HEDGE_QUANTILE", "0.95"))
+    min_samples: int = int(os.getenv("BRIA_HEDGE_MIN_SAMPLES", "20"))
+    endpoints: Tuple[str, ...] = field(default_factory=lambda: HEDGE_ENDPOINTS)
+
+
+_config = HedgeConfig()
+_calls: Dict[str, int] = defaultdict(int)
+_hedges: Dict[str, int] = defaultdict(int)
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def configure(**overrides) -> HedgeConfig:
+    """
+    Update the hedging settings and reset the budgets.
+
+    Args:
+        **overrides: Any ``HedgeConfig`` field, e.g. ``enabled=True``
+    """
+    global _config
+    with _lock:
+        _config = HedgeConfig(**{**_config.__dict__, **overrides})
+        _calls.clear()
+        _hedges.clear()
+    return _config
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Threads that run both halves of a hedged synchronous call."""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="bria-hedge")
+    return _executor
+
+
+def is_eligible(endpoint: str, payload: Dict[str, Any]) -> bool:
+    """Return True if hedging is on and this call is safe to hedge."""
+    config = _config
+    if not config.enabled or not endpoint.startswith(config.endpoints):
+        return False
+    return cache.is_repeatable(endpoint, payload)
+
+
+def hedge_delay(endpoint: str, payload: Dict[str, Any]) -> Optional[float]:
+    """
+    Return how long to wait before hedging this call, or None to never hedge it.
+
+    Eligible calls are counted towards the hedge budget. Eligible calls that
+    are not hedged (e.g. while ``min_samples`` are collected) should still be
+    passed to ``record_primary``, so the unhedged histogram covers every call.
+    """
+    config = _config
+    if not is_eligible(endpoint, payload):
+        return None
+    with _lock:
+        _calls[endpoint] += 1
+        if _calls[endpoint] <= config.min_samples:
+            return None
+    return metrics.quantile("latency_seconds", endpoint, config.quantile)
+
+
+def try_spend(endpoint: str) -> bool:
+    """Take one hedge from the endpoint's budget; False if it is exhausted."""
+    with _lock:
+        if _hedges[endpoint] + 1 > _config.budget * _calls[endpoint]:
+            allowed = False
+        else:
+            _hedges[endpoint] += 1
+            allowed = True
+    metrics.increment("hedges_sent" if allowed else "hedges_over_budget", endpoint)
+    return allowed
+
+
+def record_primary(endpoint: str, seconds: float, abandoned: bool = False) -> None:
+    """
+    Record how long the original (unhedged) request took.
+
+    Args:
+        endpoint: Endpoint path
+        seconds: Latency of the original request, or the time until it was
+            abandoned (a lower bound)
+        abandoned: Whether the request was abandoned before it finished
+    """
+    metrics.observe("unhedged_latency_seconds", endpoint, seconds)
+    if abandoned:
+        metrics.increment("unhedged_abandoned", endpoint)
+
+
+def record_win(endpoint: str) -> None:
+    """Record that the duplicate answered first."""
+    metrics.increment("hedge_wins", endpoint)
+
+
+__all__ = [
+    'HEDGE_ENDPOINTS',
+    'HedgeConfig',
+    'configure',
+    'get_executor',
+    'is_eligible',
+    'hedge_delay',
+    'try_spend',
+    'record_primary',
+    'record_win'
+]
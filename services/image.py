@@ -0,0 +1,65 @@
+"""
+Encode-once image handles shared by every service.
+
+An ``ImageHandle`` wraps the raw bytes of an image together with a content
+hash and a lazily computed base64 form. Both are memoized, so passing the
+same handle to packshot, shadow and lifestyle calls never copies or re-hashes
+the image. The transport streams the base64 form straight from the raw bytes
+(see ``services.streaming``); ``b64`` is only materialized when asked for.
+"""
+from typing import Union, Optional
+import base64
+import hashlib
+from functools import cached_property
+
+
+class ImageHandle:
+    """
+    Raw image bytes plus memoized digest and base64 encodings.
+
+    Args:
+        data: Image data in bytes
+        name: Optional file name, used only for display
+    """
+
+    def __init__(self, data: bytes, name: Optional[str] = None):
+        if isinstance(data, (bytearray, memoryview)):
+            data = bytes(data)
+        if not isinstance(data, bytes):
+            raise TypeError(f"Expected image bytes, got {type(data).__name__}")
+        self.data = data
+        self.name = name
+
+    @classmethod
+    def of(cls, image: Union[bytes, "ImageHandle"]) -> "ImageHandle":
+        """Return ``image`` unchanged if it is already a handle, else wrap it."""
+        if isinstance(image, cls):
+            return image
+        return cls(image)
+
+    @cached_property
+    def digest(self) -> str:
+        """SHA-256 hex digest of the raw bytes."""
+        return hashlib.sha256(self.data).hexdigest()
+
+    @cached_property
+    def b64(self) -> str:
+        """Base64 form of the raw bytes, as sent to the API."""
+        return base64.b64encode(self.data).decode('utf-8')
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ImageHandle) and other.digest == self.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+    def __repr__(self) -> str:
+        return f"ImageHandle({len(self.data)} bytes, sha256={self.digest[:12]})"
+
+
+ImageInput = Union[bytes, ImageHandle]
+
+__all__ = ['ImageHandle', 'ImageInput']
@@ -0,0 +1,213 @@
+"""
+Client-side image ingestion in front of the Bria endpoints.
+
+Camera originals are often far larger than anything an endpoint can use.
+``prepare_image`` downscales an image to the endpoint's effective maximum
+resolution and recompresses it (lossless PNG when the image has alpha,
+high-quality JPEG otherwise) before it is encoded and uploaded. Results are
+memoized by the source digest and size, so repeated calls reuse the same
+prepared bytes without keeping the originals alive.
+
+Set ``BRIA_INGEST=0`` to upload originals untouched.
+"""
+from typing import Dict, Optional, Tuple
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+from .image import ImageHandle, ImageInput
+
+logger = logging.getLogger(__name__)
+
+# Longest side, in pixels, that each endpoint makes use of.
+MAX_SIDE: Dict[str, int] = {
+    "/v1/product/packshot": 2000,
+    "/v1/product/shadow": 2000,
+    "/v1/product/lifestyle_shot_by_text": 2000,
+    "/v1/product/lifestyle_shot_by_image": 2000,
+    "/v1/gen_fill": 2048,
+    "/v1/erase_foreground": 2048,
+}
+
+JPEG_QUALITY = 92
+CACHE_SIZE = 16
+
+_enabled = os.getenv("BRIA_INGEST", "1").lower() not in ("0", "false", "no")
+
+# (source digest, max side, resample) -> prepared image, or None when the
+# source is sent as is. Only the outputs are kept, never the originals.
+_prepared: "OrderedDict[Tuple[str, int, int], Optional[ImageHandle]]" = OrderedDict()
+_prepared_lock = threading.Lock()
+# One lock per image being prepared, so concurrent stages sharing an upload
+# wait for a single downscale instead of each running their own.
+_preparing: Dict[Tuple[str, int, int], threading.Lock] = {}
+
+
+def set_enabled(enabled: bool) -> None:
+    """Turn pre-upload downscaling on or off for the whole process."""
+    global _enabled
+    _enabled = enabled
+
+
+def clear_cache() -> None:
+    """Forget all memoized prepared images."""
+    with _prepared_lock:
+        _prepared.clear()
+
+
+def max_side_for(endpoint: str, requested: Optional[int] = None) -> Optional[int]:
+    """
+    Return the effective maximum side for an endpoint.
+
+    Args:
+        endpoint: Endpoint path, e.g. "/v1/product/packshot"
+        requested: Output size asked for by the caller (e.g. ``max(shot_size)``);
+            never exceeds the endpoint limit
+    """
+    limit = MAX_SIDE.get(endpoint)
+    if requested:
+        return min(limit, requested) if limit else requested
+    return limit
+
+
+def _oriented_size(img: Image.Image) -> Tuple[int, int]:
+    # EXIF orientations 5-8 rotate by 90 degrees.
+    width, height = img.size
+    if img.getexif().get(0x0112) in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+
+def _has_alpha(img: Image.Image) -> bool:
+    return img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def _cached(key: Tuple[str, int, int]) -> Tuple[bool, Optional[ImageHandle]]:
+    with _prepared_lock:
+        if key not in _prepared:
+            return False, None
+        _prepared.move_to_end(key)
+        return True, _prepared[key]
+
+
+def _downscale(image: ImageHandle, max_side: int, resample: int) -> ImageHandle:
+    key = (image.digest, max_side, resample)
+    found, prepared = _cached(key)
+    if not found:
+        with _prepared_lock:
+            lock = _preparing.setdefault(key, threading.Lock())
+        with lock:
+            found, prepared = _cached(key)
+            if not found:
+                try:
+                    data = _encode(image, max_side, resample)
+                    prepared = None if data is None else ImageHandle(data, name=image.name)
+                    with _prepared_lock:
+                        _prepared[key] = prepared
+                        while len(_prepared) > CACHE_SIZE:
+                            _prepared.popitem(last=False)
+                finally:
+                    with _prepared_lock:
+                        _preparing.pop(key, None)
+    return image if prepared is None else prepared
+
+
+def _encode(image: ImageHandle, max_side: int, resample: int) -> Optional[bytes]:
+    # Returns None when the original should be sent unchanged.
+    with Image.open(io.BytesIO(image.data)) as src:
+        fmt = src.format
+        too_large = max(src.size) > max_side
+        if not too_large and fmt in ("JPEG", "PNG"):
+            return None
+
+        if too_large and fmt == "JPEG":
+            # Let the decoder skip detail by a power of two before resampling.
+            src.draft(src.mode, (max_side, max_side))
+        img = ImageOps.exif_transpose(src)
+        if too_large:
+            img.thumbnail((max_side, max_side), resample)
+
+        out = io.BytesIO()
+        if _has_alpha(img) or resample == Image.NEAREST:
+            img.save(out, format="PNG")
+        else:
+            img.convert("RGB").save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+
+    if not too_large and out.tell() >= len(image):
+        # Recompressing a small image did not help; send the original.
+        return None
+    return out.getvalue()
+
+
+def prepare_image(
+    image: ImageInput,
+    endpoint: str,
+    max_side: Optional[int] = None,
+    mask: bool = False
+) -> ImageHandle:
+    """
+    Downscale and recompress an image for upload to ``endpoint``.
+
+    Args:
+        image: Image data in bytes or an ImageHandle
+        endpoint: Endpoint path the image is sent to
+        max_side: Optional explicit limit; defaults to the endpoint limit
+        mask: Resize with nearest-neighbour and keep PNG so mask edges stay hard
+
+    Returns:
+        An ImageHandle for the bytes to upload (the input itself if no change was needed)
+    """
+    handle = ImageHandle.of(image)
+    limit = max_side or MAX_SIDE.get(endpoint)
+    if not _enabled or not limit:
+        return handle
+
+    resample = Image.NEAREST if mask else Image.LANCZOS
+    try:
+        prepared = _downscale(handle, limit, resample)
+    except (OSError, ValueError) as e:
+        logger.warning("Ingest %s: could not decode image, sending original (%s)", endpoint, e)
+        return handle
+
+    logger.info(
+        "Ingest %s: %d bytes -> %d bytes uploaded",
+        endpoint, len(handle), len(prepared)
+    )
+    return prepared
+
+
+def prepare_image_and_mask(
+    image: ImageInput,
+    mask: ImageInput,
+    endpoint: str,
+    max_side: Optional[int] = None
+) -> Tuple[ImageHandle, ImageHandle]:
+    """
+    Prepare an image and its mask so they stay aligned after downscaling.
+
+    The mask is only resized when it matched the original image size.
+    """
+    handle = ImageHandle.of(image)
+    mask_handle = ImageHandle.of(mask)
+    prepared = prepare_image(handle, endpoint, max_side)
+    if prepared is handle:
+        return handle, mask_handle
+
+    try:
+        with Image.open(io.BytesIO(handle.data)) as src, \
+                Image.open(io.BytesIO(mask_handle.data)) as mask_img, \
+                Image.open(io.BytesIO(prepared.data)) as dst:
+            if mask_img.size != _oriented_size(src):
+                return prepared, mask_handle
+            target_size = dst.size
+    except (OSError, ValueError):
+        return prepared, mask_handle
+
+    return prepared, prepare_image(mask_handle, endpoint, max(target_size), mask=True)
+
+
+__all__ = ['MAX_SIDE', 'set_enabled', 'clear_cache', 'max_side_for', 'prepare_image', 'prepare_image_and_mask']
@@ -0,0 +1,161 @@
+"""
+Structured per-request instrumentation for the service layer.
+
+Every Bria call made through the transport can produce a ``RequestTrace``
+recording the endpoint, payload size, encode time, time to first byte, total
+time, response size and status. Traces are emitted on the
+``services.requests`` logger with lazy ``%``-style formatting, and secrets
+are redacted before anything is logged.
+
+The amount of tracing is controlled by:
+
+    BRIA_TRACE         "off", "errors" (default), "info" or "debug"
+    BRIA_TRACE_SAMPLE  fraction of successful requests traced (default 1.0)
+
+Traces are always collected, because the metrics registry is fed from them;
+with tracing off nothing is formatted or logged.
+"""
+from typing import Dict, Any, Optional, Mapping
+import logging
+import os
+import random
+from dataclasses import dataclass, field
+
+from .image import ImageHandle
+
+logger = logging.getLogger("services.requests")
+
+OFF = 0
+ERRORS = 1
+INFO = 2
+DEBUG = 3
+
+LEVELS = {"off": OFF, "errors": ERRORS, "info": INFO, "debug": DEBUG}
+
+SECRET_HEADERS = frozenset({"api_token", "authorization", "x-api-key", "cookie"})
+
+_level = LEVELS.get(os.getenv("BRIA_TRACE", "errors").lower(), ERRORS)
+_sample_rate = float(os.getenv("BRIA_TRACE_SAMPLE", "1.0"))
+
+
+@dataclass
+class RequestTrace:
+    """Measurements for a single logical request (all retry attempts)."""
+    endpoint: str
+    payload_bytes: int = 0
+    encode_ms: float = 0.0
+    ttfb_ms: Optional[float] = None
+    total_ms: float = 0.0
+    response_bytes: int = 0
+    status: Optional[int] = None
+    attempts: int = 0
+    cache: Optional[str] = None
+    error: Optional[str] = None
+    sampled: bool = True
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def configure(level: Optional[str] = None, sample_rate: Optional[float] = None) -> None:
+    """
+    Change the trace level and sample rate at runtime.
+
+    Args:
+        level: "off", "errors", "info" or "debug"
+        sample_rate: Fraction (0-1) of successful requests to log
+    """
+    global _level, _sample_rate
+    if level is not None:
+        if level.lower() not in LEVELS:
+            raise ValueError(f"Unknown trace level: {level}")
+        _level = LEVELS[level.lower()]
+    if sample_rate is not None:
+        _sample_rate = max(0.0, min(sample_rate, 1.0))
+
+
+def enabled() -> bool:
+    """Return True if any tracing is active."""
+    return _level > OFF
+
+
+def start(endpoint: str) -> RequestTrace:
+    """Begin a trace for one logical request."""
+    sampled = _level >= INFO and (_sample_rate >= 1.0 or random.random() < _sample_rate)
+    return RequestTrace(endpoint=endpoint, sampled=sampled)
+
+
+def finish(trace: Optional[RequestTrace]) -> None:
+    """Emit a finished trace at the configured level."""
+    if trace is None or _level == OFF:
+        return
+    failed = trace.error is not None or (trace.status is not None and trace.status >= 400)
+    if failed:
+        logger.warning(
+            "%s failed status=%s attempts=%d total=%.1fms error=%s",
+            trace.endpoint, trace.status, trace.attempts, trace.total_ms, trace.error,
+            extra={"bria_trace": trace}
+        )
+    elif _level >= INFO and trace.sampled:
+        logger.info(
+            "%s status=%s cache=%s up=%dB encode=%.1fms ttfb=%sms total=%.1fms down=%dB attempts=%d",
+            trace.endpoint, trace.status, trace.cache or "-", trace.payload_bytes,
+            trace.encode_ms, _ms(trace.ttfb_ms), trace.total_ms, trace.response_bytes,
+            trace.attempts, extra={"bria_trace": trace}
+        )
+
+
+def debug_request(url: str, headers: Mapping[str, str], payload: Dict[str, Any]) -> None:
+    """Log a redacted request summary; the summary is only built if DEBUG is active."""
+    if _level >= DEBUG and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("POST %s headers=%s payload=%s", url, _Lazy(redact_headers, headers), _Lazy(summarize_payload, payload))
+
+
+def redact_headers(headers: Mapping[str, str]) -> Dict[str, str]:
+    """Return a copy of ``headers`` with secret values masked."""
+    return {
+        key: "***" if key.lower() in SECRET_HEADERS else value
+        for key, value in headers.items()
+    }
+
+
+def summarize_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace images and long strings with size placeholders."""
+    summary = {}
+    for key, value in payload.items():
+        if isinstance(value, ImageHandle):
+            summary[key] = f"<image {len(value)}B sha256={value.digest[:12]}>"
+        elif isinstance(value, str) and len(value) > 256:
+            summary[key] = f"<str {len(value)} chars>"
+        else:
+            summary[key] = value
+    return summary
+
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+class _Lazy:
+    """Defers an expensive repr until the log record is actually formatted."""
+
+    def __init__(self, fn, *args):
+        self._fn = fn
+        self._args = args
+
+    def __str__(self) -> str:
+        return str(self._fn(*self._args))
+
+
+__all__ = [
+    'RequestTrace',
+    'OFF',
+    'ERRORS',
+    'INFO',
+    'DEBUG',
+    'configure',
+    'enabled',
+    'start',
+    'finish',
+    'debug_request',
+    'redact_headers',
+    'summarize_payload'
+]
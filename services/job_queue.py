@@ -0,0 +1,344 @@
+"""
+Process-wide job queue for Bria calls, decoupled from the caller's thread.
+
+A Streamlit rerun throws away whatever the script thread was doing, so a
+long call made there can be lost after it has already been paid for.
+``JobQueue`` runs calls on a persistent pool of worker threads instead: the
+caller gets a job ID back at once and picks up the result on a later run.
+
+Jobs are dispatched by priority first (``INTERACTIVE`` before ``BATCH``)
+and, within a priority, fairly between users: the next job comes from the
+user with the fewest jobs running, ties going to the user served least
+recently, so one user's long batch cannot starve everybody else.
+
+A job submitted with a ``CancelToken`` (the same token its call was given)
+can be cancelled while it runs: the token stops the call at its next safe
+point. Callers that ``touch`` their user on every run get their jobs
+cancelled once they stop doing so for ``abandon_after`` seconds, e.g. when
+the browser tab is closed.
+"""
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+from . import metrics
+from .cancellation import Cancelled, CancelToken
+
+INTERACTIVE = 0
+BATCH = 10
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+@dataclass
+class Job:
+    """A queued call and, once it has run, its outcome."""
+    id: str
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...] = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    user: str = ""
+    priority: int = INTERACTIVE
+    label: str = ""
+    cancel: Optional[CancelToken] = None
+    status: str = QUEUED
+    result: Any = None
+    error: Optional[BaseException] = None
+    submitted_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+
+class JobQueue:
+    """
+    Run jobs on a fixed pool of worker threads.
+
+    Args:
+        workers: Worker threads, i.e. jobs running at once
+        max_per_user: Jobs one user may have running at once (None = no cap)
+        retain: Seconds a finished job is kept for its owner to collect
+        abandon_after: Seconds without a ``touch`` after which a user's jobs
+            are cancelled (None = never)
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_per_user: Optional[int] = None,
+        retain: float = 3600.0,
+        abandon_after: Optional[float] = None
+    ):
+        self.max_per_user = max_per_user
+        self.retain = retain
+        self.abandon_after = abandon_after
+        self._seen: Dict[str, float] = {}
+        self._jobs: Dict[str, Job] = {}
+        # priority -> user -> queued jobs, users in arrival order
+        self._queues: Dict[int, "OrderedDict[str, deque]"] = {}
+        self._running: Dict[str, int] = {}
+        self._last_served: Dict[str, int] = {}
+        self._ticks = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        # The reaper sleeps on its own event: sharing _cond with the idle
+        # workers would let it swallow the single wakeup submit() sends.
+        self._stopped = threading.Event()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"bria-queue-{index}", daemon=True)
+            for index in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+        if abandon_after is not None:
+            threading.Thread(target=self._watch, name="bria-queue-reaper", daemon=True).start()
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        args: Tuple[Any, ...] = (),
+        kwargs: Optional[Dict[str, Any]] = None,
+        user: str = "",
+        priority: int = INTERACTIVE,
+        label: str = "",
+        cancel: Optional[CancelToken] = None
+    ) -> str:
+        """
+        Queue ``fn(*args, **kwargs)``.
+
+        Args:
+            fn: Function to call on a worker thread
+            args: Positional arguments
+            kwargs: Keyword arguments
+            user: Owner of the job, for fair scheduling
+            priority: ``INTERACTIVE``, ``BATCH`` or any int (lower runs first)
+            label: Description shown to the user
+            cancel: Token the call was given, set when the job is cancelled
+
+        Returns:
+            The job ID
+        """
+        job = Job(
+            id=uuid.uuid4().hex, fn=fn, args=tuple(args), kwargs=dict(kwargs or {}),
+            user=user, priority=priority, label=label, cancel=cancel, submitted_at=time.time()
+        )
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Job queue is shut down")
+            self._prune(job.submitted_at)
+            self._jobs[job.id] = job
+            self._queues.setdefault(priority, OrderedDict()).setdefault(user, deque()).append(job)
+            self._cond.notify()
+        return job.id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job, or None if it is unknown or was forgotten."""
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[str]:
+        job = self.get(job_id)
+        return job.status if job else None
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Queued jobs ahead of this one: higher-priority jobs and its owner's earlier jobs (None once started)."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return None
+            ahead = sum(
+                len(queue)
+                for priority, users in self._queues.items() if priority < job.priority
+                for queue in users.values()
+            )
+            return ahead + list(self._queues[job.priority][job.user]).index(job)
+
+    def cancel(self, job_id: str, reason: str = "cancelled") -> bool:
+        """
+        Cancel a job.
+
+        A queued job is dropped. A running job is stopped through its
+        ``CancelToken``; without one it runs to completion.
+
+        Args:
+            job_id: Job to cancel
+            reason: Reason recorded on the job's token
+
+        Returns:
+            True if the job was queued, or running with a token
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            return self._cancel(job, reason)
+
+    def touch(self, user: str) -> None:
+        """Record that ``user`` is still around to collect their jobs."""
+        with self._cond:
+            self._seen[user] = time.time()
+
+    def forget(self, job_ids: List[str]) -> None:
+        """Drop finished jobs whose results have been collected."""
+        with self._cond:
+            for job_id in job_ids:
+                job = self._jobs.get(job_id)
+                if job is not None and job.done:
+                    del self._jobs[job_id]
+
+    def _cancel(self, job: Job, reason: str) -> bool:
+        if job.cancel is not None:
+            job.cancel.cancel(reason)
+        if job.status == QUEUED:
+            self._dequeue(job.priority, job.user, job)
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            metrics.increment("cancelled_jobs")
+            return True
+        return job.status == RUNNING and job.cancel is not None
+
+    def _reap(self, now: float) -> None:
+        # Cancel the jobs of users who stopped checking in.
+        if self.abandon_after is None:
+            return
+        stale = {user for user, seen in self._seen.items() if now - seen > self.abandon_after}
+        if not stale:
+            return
+        for job in list(self._jobs.values()):
+            if job.user in stale and not job.done:
+                self._cancel(job, "abandoned")
+        for user in stale:
+            del self._seen[user]
+
+    def _watch(self) -> None:
+        while True:
+            with self._cond:
+                self._reap(time.time())
+            if self._stopped.wait(self.abandon_after / 2):
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        """Queued jobs per priority, running jobs per user, and the number of workers."""
+        with self._cond:
+            return {
+                "workers": len(self._workers),
+                "queued": {
+                    priority: sum(len(queue) for queue in users.values())
+                    for priority, users in sorted(self._queues.items())
+                },
+                "running": {user: count for user, count in self._running.items() if count},
+            }
+
+    def shutdown(self) -> None:
+        """Stop the workers once their current jobs finish; queued jobs are cancelled."""
+        with self._cond:
+            self._closed = True
+            self._stopped.set()
+            queued = [job for users in self._queues.values() for queue in users.values() for job in queue]
+            for job in queued:
+                self._cancel(job, "shutdown")
+            self._cond.notify_all()
+
+    def _prune(self, now: float) -> None:
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and job.finished_at is not None and now - job.finished_at > self.retain
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _dequeue(self, priority: int, user: str, job: Optional[Job] = None) -> Job:
+        queue = self._queues[priority][user]
+        if job is None:
+            job = queue.popleft()
+        else:
+            queue.remove(job)
+        if not queue:
+            del self._queues[priority][user]
+        return job
+
+    def _next(self) -> Optional[Job]:
+        for priority in sorted(self._queues):
+            users = [
+                user for user, queue in self._queues[priority].items()
+                if queue and (self.max_per_user is None or self._running.get(user, 0) < self.max_per_user)
+            ]
+            if users:
+                user = min(users, key=lambda u: (self._running.get(u, 0), self._last_served.get(u, -1)))
+                self._last_served[user] = next(self._ticks)
+                return self._dequeue(priority, user)
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                job = None
+                while not self._closed:
+                    job = self._next()
+                    if job is not None and job.cancel is not None and job.cancel.cancelled:
+                        # Cancelled through its token alone; never start it.
+                        job.status = CANCELLED
+                        job.finished_at = time.time()
+                        metrics.increment("cancelled_jobs")
+                        job = None
+                        continue
+                    if job is not None:
+                        break
+                    self._cond.wait()
+                if job is None:
+                    return
+                job.status = RUNNING
+                job.started_at = time.time()
+                self._running[job.user] = self._running.get(job.user, 0) + 1
+
+            result, error = None, None
+            try:
+                result = job.fn(*job.args, **job.kwargs)
+            except BaseException as e:
+                error = e
+                # SystemExit and the like still stop this worker, but only
+                # after the job is settled below.
+                if not isinstance(e, Exception):
+                    raise
+            finally:
+                self._finish(job, result, error)
+
+    def _finish(self, job: Job, result: Any, error: Optional[BaseException]) -> None:
+        with self._cond:
+            job.result = result
+            job.error = error
+            if isinstance(error, Cancelled):
+                job.status = CANCELLED
+                metrics.increment("cancelled_jobs")
+            else:
+                job.status = FAILED if error is not None else DONE
+            job.finished_at = time.time()
+            self._running[job.user] -= 1
+            # A user at the per-user cap may have become eligible again.
+            self._cond.notify_all()
+
+
+__all__ = [
+    'JobQueue',
+    'Job',
+    'INTERACTIVE',
+    'BATCH',
+    'QUEUED',
+    'RUNNING',
+    'DONE',
+    'FAILED',
+    'CANCELLED'
+]
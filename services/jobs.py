@@ -0,0 +1,197 @@
+"""
+Background tracking of asynchronous (``sync=False``) Bria results.
+
+When a service is called with ``sync=False`` the API answers immediately with
+placeholder URLs that only start serving the image once rendering finishes.
+``JobTracker`` polls those URLs on a small worker pool with exponential
+backoff, so the caller is free to do other work and can pick up each result
+as soon as it is ready.
+"""
+from typing import Dict, Any, List, Optional, Iterable
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+
+from . import transport
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+
+@dataclass
+class PendingResult:
+    """Polling state for a single placeholder URL."""
+    url: str
+    label: str = ""
+    status: str = PENDING
+    attempts: int = 0
+    submitted_at: float = 0.0
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+
+def result_urls(response: Dict[str, Any]) -> List[str]:
+    """
+    Extract result URLs from any of the Bria response shapes.
+
+    Handles ``result_url``, ``result_urls`` and the ``result`` list returned by
+    the v1 endpoints (either ``{"urls": [...]}`` objects or ``[url, seed, name]``
+    rows).
+    """
+    if not isinstance(response, dict):
+        return []
+    if response.get("result_urls"):
+        return list(response["result_urls"])
+    if response.get("result_url"):
+        return [response["result_url"]]
+
+    urls = []
+    for item in response.get("result") or []:
+        if isinstance(item, dict):
+            urls.extend(item.get("urls") or [])
+        elif isinstance(item, (list, tuple)) and item and isinstance(item[0], str):
+            urls.append(item[0])
+        elif isinstance(item, str):
+            urls.append(item)
+    return urls
+
+
+class JobTracker:
+    """
+    Poll placeholder URLs in the background until they become available.
+
+    Args:
+        max_concurrency: Maximum number of probes in flight at once
+        initial_delay: Seconds before the first probe of a new URL
+        max_delay: Upper bound for the backoff between probes
+        timeout: Seconds after which a URL that never became ready is failed
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        initial_delay: float = 1.0,
+        max_delay: float = 15.0,
+        timeout: float = 300.0
+    ):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._results: Dict[str, PendingResult] = {}
+        self._schedule = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="bria-poll")
+        self._closed = False
+        self._scheduler = threading.Thread(target=self._run, name="bria-poll-scheduler", daemon=True)
+        self._scheduler.start()
+
+    def track(self, urls: Iterable[str], label: str = "") -> List[str]:
+        """
+        Start polling the given placeholder URLs.
+
+        URLs that are already tracked are left untouched.
+
+        Returns:
+            The tracked URLs, in submission order
+        """
+        now = time.time()
+        tracked = []
+        with self._cond:
+            for url in urls:
+                tracked.append(url)
+                if url in self._results:
+                    continue
+                self._results[url] = PendingResult(url=url, label=label, submitted_at=now)
+                self._push(url, now + self.initial_delay)
+            self._cond.notify()
+        return tracked
+
+    def get(self, url: str) -> Optional[PendingResult]:
+        """Return the polling state for a URL, or None if it is not tracked."""
+        with self._cond:
+            return self._results.get(url)
+
+    def status(self, url: str) -> Optional[str]:
+        """Return ``PENDING``, ``READY`` or ``FAILED`` for a tracked URL."""
+        result = self.get(url)
+        return result.status if result else None
+
+    def forget(self, urls: Iterable[str]) -> None:
+        """Stop tracking URLs whose results have been consumed."""
+        with self._cond:
+            for url in urls:
+                self._results.pop(url, None)
+
+    def shutdown(self) -> None:
+        """Stop the scheduler and the probe workers."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._executor.shutdown(wait=False)
+
+    def _push(self, url: str, due: float) -> None:
+        heapq.heappush(self._schedule, (due, next(self._counter), url))
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._schedule:
+                        delay = self._schedule[0][0] - time.time()
+                        if delay <= 0:
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+                _, _, url = heapq.heappop(self._schedule)
+                if url not in self._results:
+                    continue
+            self._executor.submit(self._probe, url)
+
+    def _probe(self, url: str) -> None:
+        ready = False
+        error = None
+        if url.startswith("data:"):
+            # Replayed from a cassette; the image is inside the URL.
+            ready = True
+        else:
+            try:
+                response = transport.get_session().head(
+                    url,
+                    allow_redirects=True,
+                    timeout=(transport.get_config().connect_timeout, 10)
+                )
+                length = response.headers.get("Content-Length")
+                ready = response.status_code == 200 and length != "0"
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+
+        now = time.time()
+        with self._cond:
+            result = self._results.get(url)
+            if result is None:
+                return
+            result.attempts += 1
+            if ready:
+                result.status = READY
+                result.finished_at = now
+            elif now - result.submitted_at >= self.timeout:
+                result.status = FAILED
+                result.finished_at = now
+                result.error = error or "Timed out waiting for result"
+            else:
+                delay = min(self.max_delay, self.initial_delay * (2 ** result.attempts))
+                self._push(url, now + delay)
+                self._cond.notify()
+
+
+__all__ = ['JobTracker', 'PendingResult', 'result_urls', 'PENDING', 'READY', 'FAILED']
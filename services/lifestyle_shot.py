@@ -1,10 +1,112 @@
-from typing import Dict, Any, Optional, List
-import requests
-import base64
+from typing import Dict, Any, Optional, List, Tuple
+from . import transport
+from .breaker import CircuitOpenError
+from .cancellation import Cancelled, CancelToken
+from . import ingest
+from .image import ImageHandle, ImageInput
+
+def _prepare_product_image(
+    image_data: ImageInput,
+    url: str,
+    placement_type: str,
+    shot_size: List[int],
+    original_quality: bool
+) -> ImageHandle:
+    """Downscale the product image to the largest size the shot can use."""
+    if original_quality:
+        return ImageHandle.of(image_data)
+    requested = None
+    if placement_type in ['automatic', 'manual_placement', 'custom_coordinates']:
+        requested = max(shot_size)
+    endpoint = transport.endpoint_path(url)
+    return ingest.prepare_image(image_data, endpoint, ingest.max_side_for(endpoint, requested))
+
+def _product_source(
+    image_data: Optional[ImageInput],
+    image_url: Optional[str],
+    url: str,
+    placement_type: str,
+    shot_size: List[int],
+    original_quality: bool
+) -> Dict[str, Any]:
+    """Payload fields for the product image: its URL, or the prepared file."""
+    if image_url:
+        return {'image_url': image_url}
+    if image_data:
+        return {'file': _prepare_product_image(image_data, url, placement_type, shot_size, original_quality)}
+    raise ValueError("Either image_data or image_url must be provided")
+
+def _lifestyle_text_request(
+    api_key: str,
+    image_data: Optional[ImageInput],
+    scene_description: str,
+    placement_type: str,
+    num_results: int,
+    sync: bool,
+    fast: bool,
+    optimize_description: bool,
+    original_quality: bool,
+    exclude_elements: Optional[str],
+    shot_size: List[int],
+    manual_placement_selection: List[str],
+    padding_values: List[int],
+    foreground_image_size: Optional[List[int]],
+    foreground_image_location: Optional[List[int]],
+    force_rmbg: bool,
+    content_moderation: bool,
+    sku: Optional[str],
+    image_url: Optional[str]
+) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """Build the URL, headers and payload for a text-driven lifestyle shot."""
+    url = transport.api_url("/v1/product/lifestyle_shot_by_text")
+    headers = transport.api_headers(api_key)
+    
+    # Pass the URL through, or downscale to the output size unless the
+    # original quality is required
+    data = _product_source(
+        image_data, image_url, url, placement_type, shot_size, original_quality
+    )
+    
+    # Prepare request data
+    data.update({
+        'scene_description': scene_description,
+        'placement_type': placement_type,
+        'num_results': num_results,
+        'sync': sync,
+        'fast': fast,
+        'optimize_description': optimize_description,
+        'original_quality': original_quality,
+        'force_rmbg': force_rmbg,
+        'content_moderation': content_moderation
+    })
+    
+    # Add optional parameters
+    if exclude_elements and not fast:
+        data['exclude_elements'] = exclude_elements
+    
+    if placement_type in ['automatic', 'manual_placement', 'custom_coordinates']:
+        data['shot_size'] = shot_size
+    
+    if placement_type == 'manual_placement':
+        data['manual_placement_selection'] = manual_placement_selection
+    
+    if placement_type == 'manual_padding':
+        data['padding_values'] = padding_values
+    
+    if placement_type == 'custom_coordinates':
+        if foreground_image_size:
+            data['foreground_image_size'] = foreground_image_size
+        if foreground_image_location:
+            data['foreground_image_location'] = foreground_image_location
+    
+    if sku:
+        data['sku'] = sku
+    
+    return url, headers, data
 
 def lifestyle_shot_by_text(
     api_key: str,
-    image_data: bytes,
+    image_data: Optional[ImageInput],
     scene_description: str,
     placement_type: str = "original",
     num_results: int = 4,
@@ -20,17 +122,19 @@ def lifestyle_shot_by_text(
     foreground_image_location: Optional[List[int]] = None,
     force_rmbg: bool = False,
     content_moderation: bool = False,
-    sku: Optional[str] = None
+    sku: Optional[str] = None,
+    image_url: Optional[str] = None,
+    cancel: Optional[CancelToken] = None
 ) -> Dict[str, Any]:
     """
     Generate a lifestyle shot using text description.
     
     Args:
         api_key: Bria AI API key
-        image_data: Image data in bytes
+        image_data: Image data in bytes or an ImageHandle (may be None if image_url provided)
         scene_description: Text description of the new scene
         placement_type: How to position the product ("original", "automatic", "manual_placement", "manual_padding", "custom_coordinates")
-        num_results: Number of results to generate
+        num_results: Number of results to generate (1-4; use ``services.fan_out`` for more)
         sync: Whether to wait for results
         fast: Whether to use fast mode
         optimize_description: Whether to optimize the scene description
@@ -44,36 +148,74 @@ def lifestyle_shot_by_text(
         force_rmbg: Whether to force background removal
         content_moderation: Whether to enable content moderation
         sku: Optional SKU identifier
+        image_url: URL of the product image, sent instead of image_data
+        cancel: Optional token that cancels the call (see ``services.cancellation``)
     """
-    url = "https://engine.prod.bria-api.com/v1/product/lifestyle_shot_by_text"
+    url, headers, data = _lifestyle_text_request(
+        api_key, image_data, scene_description, placement_type, num_results,
+        sync, fast, optimize_description, original_quality, exclude_elements,
+        shot_size, manual_placement_selection, padding_values,
+        foreground_image_size, foreground_image_location, force_rmbg,
+        content_moderation, sku, image_url
+    )
     
-    headers = {
-        'api_token': api_key,
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
+    try:
+        return transport.post_json(url, headers=headers, json=data, cancel=cancel)
+    except (CircuitOpenError, Cancelled):
+        raise
+    except Exception as e:
+        raise Exception(f"Lifestyle shot generation failed: {str(e)}")
+
+def _lifestyle_image_request(
+    api_key: str,
+    image_data: Optional[ImageInput],
+    reference_image: Optional[ImageInput],
+    placement_type: str,
+    num_results: int,
+    sync: bool,
+    original_quality: bool,
+    shot_size: List[int],
+    manual_placement_selection: List[str],
+    padding_values: List[int],
+    foreground_image_size: Optional[List[int]],
+    foreground_image_location: Optional[List[int]],
+    force_rmbg: bool,
+    content_moderation: bool,
+    sku: Optional[str],
+    enhance_ref_image: bool,
+    ref_image_influence: float,
+    image_url: Optional[str],
+    ref_image_url: Optional[str]
+) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """Build the URL, headers and payload for a reference-image lifestyle shot."""
+    url = transport.api_url("/v1/product/lifestyle_shot_by_image")
+    headers = transport.api_headers(api_key)
     
-    # Convert image to base64
-    image_base64 = base64.b64encode(image_data).decode('utf-8')
+    # Pass the URL through, or downscale to the output size unless the
+    # original quality is required
+    data = _product_source(
+        image_data, image_url, url, placement_type, shot_size, original_quality
+    )
+    if ref_image_url:
+        data['ref_image_url'] = ref_image_url
+    elif reference_image:
+        data['ref_image_file'] = ingest.prepare_image(reference_image, transport.endpoint_path(url))
+    else:
+        raise ValueError("Either reference_image or ref_image_url must be provided")
     
     # Prepare request data
-    data = {
-        'file': image_base64,
-        'scene_description': scene_description,
+    data.update({
         'placement_type': placement_type,
         'num_results': num_results,
         'sync': sync,
-        'fast': fast,
-        'optimize_description': optimize_description,
         'original_quality': original_quality,
         'force_rmbg': force_rmbg,
-        'content_moderation': content_moderation
-    }
+        'content_moderation': content_moderation,
+        'enhance_ref_image': enhance_ref_image,
+        'ref_image_influence': ref_image_influence
+    })
     
     # Add optional parameters
-    if exclude_elements and not fast:
-        data['exclude_elements'] = exclude_elements
-    
     if placement_type in ['automatic', 'manual_placement', 'custom_coordinates']:
         data['shot_size'] = shot_size
     
@@ -92,25 +234,12 @@ def lifestyle_shot_by_text(
     if sku:
         data['sku'] = sku
     
-    try:
-        print(f"Making request to: {url}")
-        print(f"Headers: {headers}")
-        print(f"Data: {data}")
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
-        
-        return response.json()
-    except Exception as e:
-        raise Exception(f"Lifestyle shot generation failed: {str(e)}")
+    return url, headers, data
 
 def lifestyle_shot_by_image(
     api_key: str,
-    image_data: bytes,
-    reference_image: bytes,
+    image_data: Optional[ImageInput],
+    reference_image: Optional[ImageInput],
     placement_type: str = "original",
     num_results: int = 4,
     sync: bool = False,
@@ -124,67 +253,30 @@ def lifestyle_shot_by_image(
     content_moderation: bool = False,
     sku: Optional[str] = None,
     enhance_ref_image: bool = True,
-    ref_image_influence: float = 1.0
+    ref_image_influence: float = 1.0,
+    image_url: Optional[str] = None,
+    ref_image_url: Optional[str] = None,
+    cancel: Optional[CancelToken] = None
 ) -> Dict[str, Any]:
     """
     Generate a lifestyle shot using a reference image.
+
+    ``image_url`` and ``ref_image_url`` may be given instead of
+    ``image_data`` and ``reference_image``; the API then fetches the images
+    itself. ``cancel`` is an optional token that cancels the call (see
+    ``services.cancellation``).
     """
-    url = "https://engine.prod.bria-api.com/v1/product/lifestyle_shot_by_image"
-    
-    headers = {
-        'api_token': api_key,
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
-    
-    # Convert images to base64
-    image_base64 = base64.b64encode(image_data).decode('utf-8')
-    reference_base64 = base64.b64encode(reference_image).decode('utf-8')
-    
-    # Prepare request data
-    data = {
-        'file': image_base64,
-        'ref_image_file': reference_base64,
-        'placement_type': placement_type,
-        'num_results': num_results,
-        'sync': sync,
-        'original_quality': original_quality,
-        'force_rmbg': force_rmbg,
-        'content_moderation': content_moderation,
-        'enhance_ref_image': enhance_ref_image,
-        'ref_image_influence': ref_image_influence
-    }
-    
-    # Add optional parameters
-    if placement_type in ['automatic', 'manual_placement', 'custom_coordinates']:
-        data['shot_size'] = shot_size
-    
-    if placement_type == 'manual_placement':
-        data['manual_placement_selection'] = manual_placement_selection
-    
-    if placement_type == 'manual_padding':
-        data['padding_values'] = padding_values
-    
-    if placement_type == 'custom_coordinates':
-        if foreground_image_size:
-            data['foreground_image_size'] = foreground_image_size
-        if foreground_image_location:
-            data['foreground_image_location'] = foreground_image_location
-    
-    if sku:
-        data['sku'] = sku
+    url, headers, data = _lifestyle_image_request(
+        api_key, image_data, reference_image, placement_type, num_results,
+        sync, original_quality, shot_size, manual_placement_selection,
+        padding_values, foreground_image_size, foreground_image_location,
+        force_rmbg, content_moderation, sku, enhance_ref_image,
+        ref_image_influence, image_url, ref_image_url
+    )
     
     try:
-        print(f"Making request to: {url}")
-        print(f"Headers: {headers}")
-        print(f"Data: {data}")
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
-        
-        return response.json()
+        return transport.post_json(url, headers=headers, json=data, cancel=cancel)
+    except (CircuitOpenError, Cancelled):
+        raise
     except Exception as e:
         raise Exception(f"Lifestyle shot generation failed: {str(e)}") 
\ No newline at end of file
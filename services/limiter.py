@@ -0,0 +1,439 @@
+"""
+Process-wide rate limiting for Bria API calls.
+
+Every HTTP attempt made by the transport (sync and async) first takes a slot
+from the limiter for its API key and endpoint. A slot needs a token from a
+token bucket (requests per second with a burst allowance) and a free place
+under the in-flight cap, which ``services.adaptive`` tunes at runtime from
+429/5xx and latency feedback. Callers waiting for the same key and endpoint are
+served strictly first-come, first-served, so one busy session cannot starve
+the others.
+
+The bucket state lives in memory by default. With the SQLite backend it is
+shared through a local database file by every process on the machine, e.g.
+several Streamlit workers using one ``BRIA_API_KEY``.
+
+Settings come from the environment:
+
+    BRIA_RATE_LIMIT       requests per second per key and endpoint (0 = unlimited)
+    BRIA_RATE_BURST       bucket capacity (defaults to the rate, at least 1)
+    BRIA_MAX_IN_FLIGHT    concurrent requests per key and endpoint (0 = unlimited)
+    BRIA_LIMITER_TIMEOUT  seconds a caller may queue before giving up
+    BRIA_LIMITER_BACKEND  "memory" (default) or "sqlite"
+    BRIA_LIMITER_DB       database file for the SQLite backend
+
+A caller waiting with a cancellation token (``services.cancellation``) leaves
+the queue with ``Cancelled`` within ``POLL_INTERVAL`` of the token being set.
+
+Queue depth, in-flight requests and wait time are exported per endpoint as
+``limiter_queue_depth``, ``limiter_in_flight`` and ``limiter_wait_seconds``.
+"""
+from typing import Dict, Any, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, replace
+
+from . import adaptive, cancellation, metrics
+
+# How often a queued caller re-checks when it cannot be woken up directly
+# (async callers, slots held by another process, or cancellation).
+POLL_INTERVAL = 0.05
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Rate and concurrency limit for one API key and endpoint."""
+    rate: float = float(os.getenv("BRIA_RATE_LIMIT", "5"))
+    burst: float = float(os.getenv("BRIA_RATE_BURST", "0"))
+    max_in_flight: int = int(os.getenv("BRIA_MAX_IN_FLIGHT", "8"))
+
+    @property
+    def capacity(self) -> float:
+        return self.burst or max(self.rate, 1.0)
+
+
+class MemoryBackend:
+    """Token buckets and in-flight counts held in this process."""
+
+    # Calls return at once; async callers need not move them off the loop.
+    blocking = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._in_flight: Dict[str, int] = defaultdict(int)
+
+    def try_acquire(self, key: str, limit: Limit) -> Tuple[Optional[Any], float]:
+        """Take a slot; return ``(lease, 0)`` or ``(None, seconds_to_wait)``."""
+        with self._lock:
+            if limit.max_in_flight and self._in_flight[key] >= limit.max_in_flight:
+                return None, POLL_INTERVAL
+            now = time.monotonic()
+            tokens = limit.capacity
+            if limit.rate:
+                tokens, updated = self._buckets.get(key, (limit.capacity, now))
+                tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+                if tokens < 1:
+                    self._buckets[key] = (tokens, now)
+                    return None, (1 - tokens) / limit.rate
+                self._buckets[key] = (tokens - 1, now)
+            self._in_flight[key] += 1
+            return key, 0.0
+
+    def release(self, key: str, lease: Any) -> None:
+        with self._lock:
+            self._in_flight[key] = max(0, self._in_flight[key] - 1)
+
+
+class SQLiteBackend:
+    """
+    Token buckets and in-flight leases shared between processes via SQLite.
+
+    Each slot is a row with an expiry, so slots held by a process that died
+    are reclaimed after ``lease_ttl`` seconds.
+
+    Args:
+        path: Database file
+        lease_ttl: Seconds after which an unreleased slot is considered lost
+    """
+
+    # Transactions may wait on other processes, so async callers run them
+    # in a worker thread.
+    blocking = True
+
+    def __init__(self, path: str, lease_ttl: float = 600.0):
+        self.path = path
+        self.lease_ttl = lease_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                id TEXT PRIMARY KEY, key TEXT NOT NULL, expires REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS leases_key ON leases (key);
+            """
+        )
+
+    def try_acquire(self, key: str, limit: Limit) -> Tuple[Optional[Any], float]:
+        """Take a slot; return ``(lease, 0)`` or ``(None, seconds_to_wait)``."""
+        with self._lock:
+            conn = self._conn
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+                if limit.max_in_flight:
+                    (held,) = conn.execute("SELECT COUNT(*) FROM leases WHERE key = ?", (key,)).fetchone()
+                    if held >= limit.max_in_flight:
+                        return None, POLL_INTERVAL
+                if limit.rate:
+                    row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                    tokens, updated = row if row else (limit.capacity, now)
+                    tokens = min(limit.capacity, tokens + max(0.0, now - updated) * limit.rate)
+                    if tokens < 1:
+                        return None, (1 - tokens) / limit.rate
+                    conn.execute(
+                        "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                        (key, tokens - 1, now)
+                    )
+                lease = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO leases (id, key, expires) VALUES (?, ?, ?)",
+                    (lease, key, now + self.lease_ttl)
+                )
+                return lease, 0.0
+            finally:
+                conn.execute("COMMIT")
+
+    def release(self, key: str, lease: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE id = ?", (lease,))
+
+
+class RateLimiter:
+    """
+    FIFO queue in front of a limiter backend, keyed by API key and endpoint.
+
+    The backend is called without holding the queue's lock, so a SQLite
+    transaction waiting on another process does not stall callers of other
+    keys; backends therefore do their own locking.
+
+    Args:
+        default: Limit used for endpoints without an override
+        endpoint_limits: Per-endpoint-path overrides
+        backend: ``MemoryBackend`` or ``SQLiteBackend``
+        timeout: Seconds a caller may wait for a slot before ``TimeoutError``
+    """
+
+    def __init__(
+        self,
+        default: Optional[Limit] = None,
+        endpoint_limits: Optional[Dict[str, Limit]] = None,
+        backend: Any = None,
+        timeout: Optional[float] = None
+    ):
+        self.default = default or Limit()
+        self.endpoint_limits = dict(endpoint_limits or {})
+        self.backend = backend or MemoryBackend()
+        self.timeout = timeout if timeout is not None else float(os.getenv("BRIA_LIMITER_TIMEOUT", "300"))
+        self._cond = threading.Condition()
+        # Bumped on every wakeup, so a caller that attempted outside the lock
+        # can tell whether it missed one before it goes to sleep.
+        self._generation = 0
+        self._queues: Dict[str, deque] = defaultdict(deque)
+        self._queued: Dict[str, int] = defaultdict(int)
+        self._in_flight: Dict[str, int] = defaultdict(int)
+
+    def limit_for(self, endpoint: str) -> Limit:
+        """Return the limit for ``endpoint`` with the adaptive in-flight cap applied."""
+        limit = self.endpoint_limits.get(endpoint, self.default)
+        in_flight = adaptive.current_limit(endpoint, limit.max_in_flight)
+        if in_flight != limit.max_in_flight:
+            limit = replace(limit, max_in_flight=in_flight)
+        return limit
+
+    def _enqueue(self, key: str, endpoint: str, ticket: object) -> None:
+        self._queues[key].append(ticket)
+        self._queued[endpoint] += 1
+        metrics.set_gauge("limiter_queue_depth", endpoint, self._queued[endpoint])
+
+    def _dequeue(self, key: str, endpoint: str, ticket: object) -> bool:
+        # False if the ticket already left, e.g. an async caller cancelled
+        # while its attempt was still running in a worker thread.
+        queue = self._queues.get(key)
+        if queue is None or ticket not in queue:
+            return False
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[key]
+        self._queued[endpoint] -= 1
+        metrics.set_gauge("limiter_queue_depth", endpoint, self._queued[endpoint])
+        self._notify()
+        return True
+
+    def _notify(self) -> None:
+        self._generation += 1
+        self._cond.notify_all()
+
+    def _attempt(self, key: str, endpoint: str, ticket: object) -> Tuple[Optional[Any], float]:
+        # Only the caller at the head of the queue may take a slot. Later
+        # callers join at the tail, so the head stays the head until it
+        # leaves, and the backend can be asked without holding _cond.
+        with self._cond:
+            queue = self._queues.get(key)
+            if not queue or queue[0] is not ticket:
+                return None, POLL_INTERVAL
+        paused = adaptive.pause_remaining(endpoint)
+        if paused:
+            return None, paused
+        lease, wait = self.backend.try_acquire(key, self.limit_for(endpoint))
+        if lease is None:
+            return None, wait
+        with self._cond:
+            if self._dequeue(key, endpoint, ticket):
+                self._in_flight[endpoint] += 1
+                metrics.set_gauge("limiter_in_flight", endpoint, self._in_flight[endpoint])
+                return lease, wait
+        # The caller left while the backend was being asked; give the slot back.
+        self.backend.release(key, lease)
+        return None, POLL_INTERVAL
+
+    def _check_deadline(self, endpoint: str, started: float) -> float:
+        remaining = self.timeout - (time.monotonic() - started)
+        if remaining <= 0:
+            metrics.increment("limiter_timeouts", endpoint)
+            raise TimeoutError(f"Rate limiter: no slot for {endpoint} within {self.timeout:g}s")
+        return remaining
+
+    def acquire(self, key: str, endpoint: str, cancel: Optional[threading.Event] = None) -> Any:
+        """Block until a slot is free and return its lease; raise ``Cancelled`` once ``cancel`` is set."""
+        started = time.monotonic()
+        ticket = object()
+        with self._cond:
+            self._enqueue(key, endpoint, ticket)
+        try:
+            while True:
+                cancellation.check(cancel, endpoint)
+                with self._cond:
+                    generation = self._generation
+                lease, wait = self._attempt(key, endpoint, ticket)
+                if lease is not None:
+                    break
+                remaining = self._check_deadline(endpoint, started)
+                if cancel is not None:
+                    wait = min(wait, POLL_INTERVAL)
+                with self._cond:
+                    if self._generation == generation:
+                        self._cond.wait(min(wait, remaining))
+        except BaseException:
+            with self._cond:
+                self._dequeue(key, endpoint, ticket)
+            raise
+        metrics.observe("limiter_wait_seconds", endpoint, time.monotonic() - started)
+        return lease
+
+    async def acquire_async(self, key: str, endpoint: str, cancel: Optional[threading.Event] = None) -> Any:
+        """Wait for a slot without blocking the event loop and return its lease."""
+        started = time.monotonic()
+        ticket = object()
+        with self._cond:
+            self._enqueue(key, endpoint, ticket)
+        try:
+            while True:
+                cancellation.check(cancel, endpoint)
+                if getattr(self.backend, "blocking", False):
+                    lease, wait = await asyncio.to_thread(self._attempt, key, endpoint, ticket)
+                else:
+                    lease, wait = self._attempt(key, endpoint, ticket)
+                if lease is not None:
+                    break
+                remaining = self._check_deadline(endpoint, started)
+                await asyncio.sleep(min(wait, POLL_INTERVAL, remaining))
+        except BaseException:
+            with self._cond:
+                self._dequeue(key, endpoint, ticket)
+            raise
+        metrics.observe("limiter_wait_seconds", endpoint, time.monotonic() - started)
+        return lease
+
+    def release(self, key: str, endpoint: str, lease: Any) -> None:
+        """Give a slot back and wake the next caller."""
+        self.backend.release(key, lease)
+        with self._cond:
+            self._in_flight[endpoint] -= 1
+            metrics.set_gauge("limiter_in_flight", endpoint, self._in_flight[endpoint])
+            self._notify()
+
+    async def release_async(self, key: str, endpoint: str, lease: Any) -> None:
+        """Async counterpart of :meth:`release`."""
+        if getattr(self.backend, "blocking", False):
+            await asyncio.to_thread(self.release, key, endpoint, lease)
+        else:
+            self.release(key, endpoint, lease)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return ``{endpoint: {"queued": n, "in_flight": n}}`` for this process."""
+        with self._cond:
+            endpoints = set(self._queued) | set(self._in_flight)
+            return {
+                endpoint: {"queued": self._queued[endpoint], "in_flight": self._in_flight[endpoint]}
+                for endpoint in endpoints
+            }
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def _default_backend() -> Any:
+    if os.getenv("BRIA_LIMITER_BACKEND", "memory").lower() == "sqlite":
+        return SQLiteBackend(os.getenv("BRIA_LIMITER_DB", ".bria_limiter.db"))
+    return MemoryBackend()
+
+
+def configure(
+    rate: Optional[float] = None,
+    burst: Optional[float] = None,
+    max_in_flight: Optional[int] = None,
+    endpoint_limits: Optional[Dict[str, Limit]] = None,
+    backend: Any = None,
+    timeout: Optional[float] = None
+) -> RateLimiter:
+    """
+    Replace the process-wide limiter.
+
+    Args:
+        rate: Requests per second per API key and endpoint (0 = unlimited)
+        burst: Bucket capacity
+        max_in_flight: Concurrent requests per API key and endpoint (0 = unlimited)
+        endpoint_limits: ``Limit`` overrides keyed by endpoint path
+        backend: ``MemoryBackend()`` or ``SQLiteBackend(path)``
+        timeout: Seconds a caller may queue before ``TimeoutError``
+
+    Returns:
+        The new limiter
+    """
+    global _limiter
+    base = Limit()
+    default = Limit(
+        rate=base.rate if rate is None else rate,
+        burst=base.burst if burst is None else burst,
+        max_in_flight=base.max_in_flight if max_in_flight is None else max_in_flight
+    )
+    with _limiter_lock:
+        _limiter = RateLimiter(
+            default=default,
+            endpoint_limits=endpoint_limits,
+            backend=backend or _default_backend(),
+            timeout=timeout
+        )
+    return _limiter
+
+
+def get_limiter() -> RateLimiter:
+    """Return the process-wide limiter, creating it on first use."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(backend=_default_backend())
+    return _limiter
+
+
+def key_id(api_key: Optional[str]) -> str:
+    """Stable, non-secret identifier for an API key."""
+    if not api_key:
+        return "anonymous"
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+@contextmanager
+def slot(api_key: Optional[str], endpoint: str, cancel: Optional[threading.Event] = None):
+    """
+    Hold a rate-limited slot for ``api_key`` and ``endpoint`` for the duration of the block.
+
+    Waiting for the slot ends with ``Cancelled`` once ``cancel`` is set.
+    """
+    limiter = get_limiter()
+    key = f"{key_id(api_key)}:{endpoint}"
+    lease = limiter.acquire(key, endpoint, cancel)
+    try:
+        yield
+    finally:
+        limiter.release(key, endpoint, lease)
+
+
+@asynccontextmanager
+async def aslot(api_key: Optional[str], endpoint: str, cancel: Optional[threading.Event] = None):
+    """Async counterpart of :func:`slot`."""
+    limiter = get_limiter()
+    key = f"{key_id(api_key)}:{endpoint}"
+    lease = await limiter.acquire_async(key, endpoint, cancel)
+    try:
+        yield
+    finally:
+        await limiter.release_async(key, endpoint, lease)
+
+
+__all__ = [
+    'Limit',
+    'MemoryBackend',
+    'SQLiteBackend',
+    'RateLimiter',
+    'configure',
+    'get_limiter',
+    'key_id',
+    'slot',
+    'aslot'
+]
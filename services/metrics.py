@@ -0,0 +1,302 @@
+"""
+Process-wide metrics registry for the service layer.
+
+Counters, gauges and latency histograms are keyed by a metric name and the
+Bria endpoint path they relate to, e.g.
+``increment("cache_hits", "/v1/product/packshot")``. The transport feeds
+every API call in through ``record_request``; the Settings tab renders
+``endpoint_summary()`` and the registry can be exported in the Prometheus
+text format with ``render_prometheus``, ``write_prometheus`` or
+``start_http_server``.
+"""
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import bisect
+import os
+import threading
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# Number of recent observations kept per histogram for percentiles.
+WINDOW_SIZE = 2048
+
+PROMETHEUS_PREFIX = "bria_"
+
+
+class Histogram:
+    """
+    Cumulative bucket counts plus a sliding window for percentiles.
+
+    Args:
+        buckets: Sorted upper bounds of the buckets
+        window: How many recent observations percentiles are computed from
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS, window: int = WINDOW_SIZE):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self._recent.append(value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the ``q`` quantile (0-1) of the recent window, or None if empty."""
+        if not self._recent:
+            return None
+        ordered = sorted(self._recent)
+        index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[index]
+
+
+_counters: Dict[Tuple[str, str], float] = defaultdict(float)
+_gauges: Dict[Tuple[str, str], float] = {}
+_histograms: Dict[Tuple[str, str], Histogram] = {}
+_lock = threading.Lock()
+
+
+def increment(name: str, endpoint: str = "", amount: float = 1) -> None:
+    """Add ``amount`` to the counter ``name`` for ``endpoint``."""
+    with _lock:
+        _counters[(name, endpoint)] += amount
+
+
+def get_counter(name: str, endpoint: str = "") -> float:
+    """Return the current value of a counter."""
+    with _lock:
+        return _counters.get((name, endpoint), 0)
+
+
+def counters() -> Dict[str, Dict[str, float]]:
+    """Return a snapshot of all counters as ``{name: {endpoint: value}}``."""
+    snapshot: Dict[str, Dict[str, float]] = defaultdict(dict)
+    with _lock:
+        for (name, endpoint), value in _counters.items():
+            snapshot[name][endpoint] = value
+    return dict(snapshot)
+
+
+def set_gauge(name: str, endpoint: str, value: float) -> None:
+    """Set the gauge ``name`` for ``endpoint`` to ``value``."""
+    with _lock:
+        _gauges[(name, endpoint)] = value
+
+
+def get_gauge(name: str, endpoint: str = "") -> Optional[float]:
+    """Return the current value of a gauge, or None if never set."""
+    with _lock:
+        return _gauges.get((name, endpoint))
+
+
+def observe(name: str, endpoint: str, value: float) -> None:
+    """Record ``value`` in the histogram ``name`` for ``endpoint``."""
+    with _lock:
+        histogram = _histograms.get((name, endpoint))
+        if histogram is None:
+            histogram = _histograms[(name, endpoint)] = Histogram()
+        histogram.observe(value)
+
+
+def quantile(name: str, endpoint: str, q: float) -> Optional[float]:
+    """Return the ``q`` quantile of a histogram, or None without observations."""
+    with _lock:
+        histogram = _histograms.get((name, endpoint))
+        return histogram.quantile(q) if histogram else None
+
+
+def record_request(
+    endpoint: str,
+    seconds: float,
+    status: Optional[int],
+    bytes_up: int = 0,
+    bytes_down: int = 0,
+    error: bool = False
+) -> None:
+    """
+    Record one API call made by the transport.
+
+    Args:
+        endpoint: Endpoint path
+        seconds: Wall time of the call including retries
+        status: Final HTTP status, or None if no response was received
+        bytes_up: Request body size
+        bytes_down: Response body size
+        error: Whether the call failed
+    """
+    with _lock:
+        _counters[("requests", endpoint)] += 1
+        if error:
+            _counters[("errors", endpoint)] += 1
+        if status is not None:
+            _counters[(f"status_{status}", endpoint)] += 1
+        _counters[("bytes_up", endpoint)] += bytes_up
+        _counters[("bytes_down", endpoint)] += bytes_down
+        histogram = _histograms.get(("latency_seconds", endpoint))
+        if histogram is None:
+            histogram = _histograms[("latency_seconds", endpoint)] = Histogram()
+        histogram.observe(seconds)
+
+
+def endpoint_summary() -> List[Dict[str, Any]]:
+    """Return one row of headline numbers per endpoint, busiest first."""
+    with _lock:
+        endpoints = {endpoint for (_, endpoint) in _counters if endpoint}
+        endpoints.update(endpoint for (_, endpoint) in _histograms)
+        rows = []
+        for endpoint in endpoints:
+            histogram = _histograms.get(("latency_seconds", endpoint))
+            unhedged = _histograms.get(("unhedged_latency_seconds", endpoint))
+            rows.append({
+                "endpoint": endpoint,
+                "calls": int(_counters.get(("requests", endpoint), 0)),
+                "errors": int(_counters.get(("errors", endpoint), 0)),
+                "cache_hits": int(_counters.get(("cache_hits", endpoint), 0)),
+                "coalesced": int(_counters.get(("coalesced_calls", endpoint), 0)),
+                "cancelled": int(_counters.get(("cancelled_calls", endpoint), 0)),
+                "wasted": int(_counters.get(("wasted_calls", endpoint), 0)),
+                "p50_s": histogram.quantile(0.50) if histogram else None,
+                "p95_s": histogram.quantile(0.95) if histogram else None,
+                "p99_s": histogram.quantile(0.99) if histogram else None,
+                "total_s": histogram.sum if histogram else 0.0,
+                "bytes_up": int(_counters.get(("bytes_up", endpoint), 0)),
+                "bytes_down": int(_counters.get(("bytes_down", endpoint), 0)),
+                "concurrency_limit": _gauges.get(("concurrency_limit", endpoint)),
+                "hedges": int(_counters.get(("hedges_sent", endpoint), 0)),
+                "hedge_wins": int(_counters.get(("hedge_wins", endpoint), 0)),
+                "unhedged_p99_s": unhedged.quantile(0.99) if unhedged else None,
+            })
+    rows.sort(key=lambda row: row["total_s"], reverse=True)
+    return rows
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(endpoint: str, **extra: str) -> str:
+    pairs = [("endpoint", endpoint)] if endpoint else []
+    pairs.extend(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in pairs) + "}"
+
+
+def render_prometheus() -> str:
+    """Render every metric in the Prometheus text exposition format."""
+    lines: List[str] = []
+    with _lock:
+        by_name: Dict[str, List[Tuple[str, float]]] = defaultdict(list)
+        responses: List[Tuple[str, str, float]] = []
+        for (name, endpoint), value in sorted(_counters.items()):
+            if name.startswith("status_"):
+                responses.append((endpoint, name[len("status_"):], value))
+            else:
+                by_name[name].append((endpoint, value))
+        for name, samples in by_name.items():
+            metric = f"{PROMETHEUS_PREFIX}{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f"{metric}{_labels(endpoint)} {value:g}" for endpoint, value in samples)
+        if responses:
+            # One metric for all HTTP statuses, labelled by status.
+            metric = f"{PROMETHEUS_PREFIX}responses_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(
+                f"{metric}{_labels(endpoint, status=status)} {value:g}" for endpoint, status, value in responses
+            )
+
+        by_name = defaultdict(list)
+        for (name, endpoint), value in sorted(_gauges.items()):
+            by_name[name].append((endpoint, value))
+        for name, samples in by_name.items():
+            metric = f"{PROMETHEUS_PREFIX}{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.extend(f"{metric}{_labels(endpoint)} {value:g}" for endpoint, value in samples)
+
+        typed = set()
+        for (name, endpoint), histogram in sorted(_histograms.items(), key=lambda item: item[0]):
+            metric = f"{PROMETHEUS_PREFIX}{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_labels(endpoint, le=f'{bound:g}')} {cumulative}")
+            lines.append(f"{metric}_bucket{_labels(endpoint, le='+Inf')} {histogram.count}")
+            lines.append(f"{metric}_sum{_labels(endpoint)} {histogram.sum:g}")
+            lines.append(f"{metric}_count{_labels(endpoint)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: Optional[str] = None) -> str:
+    """
+    Write the Prometheus text export to a file (e.g. for node_exporter's textfile collector).
+
+    Args:
+        path: Destination file; defaults to ``BRIA_METRICS_FILE`` or "bria_metrics.prom"
+
+    Returns:
+        The path written to
+    """
+    path = path or os.getenv("BRIA_METRICS_FILE", "bria_metrics.prom")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+    return path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve ``/metrics`` in the Prometheus text format on a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="bria-metrics", daemon=True).start()
+    return server
+
+
+def reset() -> None:
+    """Clear every metric."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+__all__ = [
+    'Histogram',
+    'increment',
+    'get_counter',
+    'counters',
+    'set_gauge',
+    'get_gauge',
+    'observe',
+    'quantile',
+    'record_request',
+    'endpoint_summary',
+    'render_prometheus',
+    'write_prometheus',
+    'start_http_server',
+    'reset'
+]
@@ -1,63 +1,78 @@
-from typing import Dict, Any
-import requests
-import base64
+from typing import Dict, Any, Optional, Tuple
+from . import transport
+from .breaker import CircuitOpenError
+from .cancellation import Cancelled, CancelToken
+from . import ingest
+from .image import ImageInput
+
+def _packshot_request(
+    api_key: str,
+    image_data: Optional[ImageInput],
+    background_color: str,
+    sku: str,
+    force_rmbg: bool,
+    content_moderation: bool,
+    image_url: Optional[str]
+) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """Build the URL, headers and payload for a packshot call."""
+    url = transport.api_url("/v1/product/packshot")
+    headers = transport.api_headers(api_key)
+    
+    # Prepare request data
+    data = {
+        'background_color': background_color,
+        'force_rmbg': force_rmbg,
+        'content_moderation': content_moderation
+    }
+    
+    # Add image data; uploads are downscaled to what the endpoint uses
+    if image_url:
+        data['image_url'] = image_url
+    elif image_data:
+        data['file'] = ingest.prepare_image(image_data, transport.endpoint_path(url))
+    else:
+        raise ValueError("Either image_data or image_url must be provided")
+    
+    # Add optional SKU if provided
+    if sku:
+        data['sku'] = sku
+    
+    return url, headers, data
 
 def create_packshot(
     api_key: str,
-    image_data: bytes,
+    image_data: ImageInput = None,
     background_color: str = "#FFFFFF",
     sku: str = None,
     force_rmbg: bool = False,
-    content_moderation: bool = False
+    content_moderation: bool = False,
+    image_url: str = None,
+    cancel: Optional[CancelToken] = None
 ) -> Dict[str, Any]:
     """
     Create a professional packshot from a product image.
     
     Args:
         api_key: Bria AI API key
-        image_data: Image data in bytes
+        image_data: Image data in bytes or an ImageHandle (optional if image_url provided)
         background_color: Background color in hex format or 'transparent'
         sku: Optional SKU identifier for the product
         force_rmbg: Whether to force background removal even if alpha channel exists
         content_moderation: Whether to enable content moderation
+        image_url: URL of the image (optional if image_data provided)
+        cancel: Optional token that cancels the call (see ``services.cancellation``)
     
     Returns:
         Dict containing the API response
     """
-    url = "https://engine.prod.bria-api.com/v1/product/packshot"
-    
-    headers = {
-        'api_token': api_key,
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
-    
-    # Convert image data to base64
-    image_base64 = base64.b64encode(image_data).decode('utf-8')
-    
-    # Prepare request data
-    data = {
-        'file': image_base64,
-        'background_color': background_color,
-        'force_rmbg': force_rmbg,
-        'content_moderation': content_moderation
-    }
-    
-    # Add optional SKU if provided
-    if sku:
-        data['sku'] = sku
+    url, headers, data = _packshot_request(
+        api_key, image_data, background_color, sku, force_rmbg, content_moderation,
+        image_url
+    )
     
     try:
-        print(f"Making request to: {url}")
-        print(f"Headers: {headers}")
-        print(f"Data keys: {list(data.keys())}")
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
-        
-        return response.json()
+        return transport.post_json(url, headers=headers, json=data, cancel=cancel)
+    except (CircuitOpenError, Cancelled):
+        raise
     except Exception as e:
         raise Exception(f"Packshot creation failed: {str(e)}") 
\ No newline at end of file
@@ -1,10 +1,32 @@
-from typing import Dict, Any, Optional
-import requests
+from typing import Dict, Any, Optional, Tuple
+from . import transport
+from .breaker import CircuitOpenError
+from .cancellation import Cancelled, CancelToken
 import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _prompt_enhancer_request(
+    api_key: str,
+    prompt: str,
+    kwargs: Dict[str, Any]
+) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """Build the URL, headers and payload for a prompt enhancement call."""
+    url = transport.api_url("/v1/prompt_enhancer")
+    headers = transport.api_headers(api_key)
+    
+    data = {
+        'prompt': prompt,
+        **kwargs
+    }
+    
+    return url, headers, data
 
 def enhance_prompt(
     api_key: str,
     prompt: str,
+    cancel: Optional[CancelToken] = None,
     **kwargs
 ) -> str:
     """
@@ -13,36 +35,25 @@ def enhance_prompt(
     Args:
         api_key: Bria AI API key
         prompt: Original prompt to enhance
+        cancel: Optional token that cancels the call (see ``services.cancellation``)
         **kwargs: Additional parameters for the API
     
     Returns:
-        Enhanced prompt string
+        Enhanced prompt string; the original prompt if the call fails
+
+    Raises:
+        CircuitOpenError: If the endpoint's circuit breaker is open
+        Cancelled: If ``cancel`` is set before the result arrives
     """
-    url = "https://engine.prod.bria-api.com/v1/prompt_enhancer"
-    
-    headers = {
-        'api_token': api_key,
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
-    
-    data = {
-        'prompt': prompt,
-        **kwargs
-    }
+    url, headers, data = _prompt_enhancer_request(
+        api_key, prompt, kwargs
+    )
     
     try:
-        print(f"Making request to: {url}")
-        print(f"Headers: {headers}")
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
-        
-        result = response.json()
+        result = transport.post_json(url, headers=headers, json=data, cancel=cancel)
         return result.get("prompt variations", prompt)  # Return original prompt if enhancement fails
+    except (CircuitOpenError, Cancelled):
+        raise
     except Exception as e:
-        print(f"Error enhancing prompt: {str(e)}")
+        logger.warning("Error enhancing prompt: %s", e)
         return prompt  # Return original prompt on error 
\ No newline at end of file
@@ -1,10 +1,65 @@
-from typing import Dict, Any, List, Optional
-import requests
-import base64
+from typing import Dict, Any, List, Optional, Tuple
+from . import transport
+from .breaker import CircuitOpenError
+from .cancellation import Cancelled, CancelToken
+from . import ingest
+from .image import ImageInput
+
+def _shadow_request(
+    api_key: str,
+    image_data: Optional[ImageInput],
+    image_url: Optional[str],
+    shadow_type: str,
+    background_color: Optional[str],
+    shadow_color: str,
+    shadow_offset: List[int],
+    shadow_intensity: int,
+    shadow_blur: Optional[int],
+    shadow_width: Optional[int],
+    shadow_height: Optional[int],
+    sku: Optional[str],
+    force_rmbg: bool,
+    content_moderation: bool
+) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """Build the URL, headers and payload for a shadow call."""
+    url = transport.api_url("/v1/product/shadow")
+    headers = transport.api_headers(api_key)
+    
+    # Prepare request data
+    data = {
+        'shadow_type': shadow_type,
+        'shadow_color': shadow_color,
+        'shadow_intensity': shadow_intensity,
+        'force_rmbg': force_rmbg,
+        'content_moderation': content_moderation,
+        'shadow_offset': shadow_offset
+    }
+    
+    # Add image data
+    if image_url:
+        data['image_url'] = image_url
+    elif image_data:
+        data['file'] = ingest.prepare_image(image_data, transport.endpoint_path(url))
+    else:
+        raise ValueError("Either image_data or image_url must be provided")
+    
+    # Add optional parameters
+    if background_color:
+        data['background_color'] = background_color
+    if shadow_blur is not None:
+        data['shadow_blur'] = shadow_blur
+    if shadow_width is not None:
+        data['shadow_width'] = shadow_width
+    if shadow_height is not None:
+        data['shadow_height'] = shadow_height
+    if sku:
+        data['sku'] = sku
+    
+    return url, headers, data
 
 def add_shadow(
     api_key: str,
-    image_data: bytes = None,
+    image_data: ImageInput = None,
     image_url: str = None,
     shadow_type: str = "regular",
     background_color: Optional[str] = None,
@@ -16,14 +71,15 @@ def add_shadow(
     shadow_height: Optional[int] = 70,
     sku: Optional[str] = None,
     force_rmbg: bool = False,
-    content_moderation: bool = False
+    content_moderation: bool = False,
+    cancel: Optional[CancelToken] = None
 ) -> Dict[str, Any]:
     """
     Add shadow to an image.
     
     Args:
         api_key: Bria AI API key
-        image_data: Image data in bytes (optional if image_url provided)
+        image_data: Image data in bytes or an ImageHandle (optional if image_url provided)
         image_url: URL of the image (optional if image_data provided)
         shadow_type: Type of shadow ("regular" or "float")
         background_color: Optional background color in hex format
@@ -36,59 +92,20 @@ def add_shadow(
         sku: Optional SKU identifier
         force_rmbg: Whether to force background removal
         content_moderation: Whether to enable content moderation
+        cancel: Optional token that cancels the call (see ``services.cancellation``)
     
     Returns:
         Dict containing the API response
     """
-    url = "https://engine.prod.bria-api.com/v1/product/shadow"
-    
-    headers = {
-        'api_token': api_key,
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
-    
-    # Prepare request data
-    data = {
-        'shadow_type': shadow_type,
-        'shadow_color': shadow_color,
-        'shadow_intensity': shadow_intensity,
-        'force_rmbg': force_rmbg,
-        'content_moderation': content_moderation,
-        'shadow_offset': shadow_offset
-    }
-    
-    # Add image data
-    if image_url:
-        data['image_url'] = image_url
-    elif image_data:
-        data['file'] = base64.b64encode(image_data).decode('utf-8')
-    else:
-        raise ValueError("Either image_data or image_url must be provided")
-    
-    # Add optional parameters
-    if background_color:
-        data['background_color'] = background_color
-    if shadow_blur is not None:
-        data['shadow_blur'] = shadow_blur
-    if shadow_width is not None:
-        data['shadow_width'] = shadow_width
-    if shadow_height is not None:
-        data['shadow_height'] = shadow_height
-    if sku:
-        data['sku'] = sku
+    url, headers, data = _shadow_request(
+        api_key, image_data, image_url, shadow_type, background_color,
+        shadow_color, shadow_offset, shadow_intensity, shadow_blur,
+        shadow_width, shadow_height, sku, force_rmbg, content_moderation
+    )
     
     try:
-        print(f"Making request to: {url}")
-        print(f"Headers: {headers}")
-        print(f"Data: {data}")
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
-        
-        return response.json()
+        return transport.post_json(url, headers=headers, json=data, cancel=cancel)
+    except (CircuitOpenError, Cancelled):
+        raise
     except Exception as e:
         raise Exception(f"Shadow addition failed: {str(e)}") 
\ No newline at end of file
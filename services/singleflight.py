@@ -0,0 +1,198 @@
+"""
+Single-flight coalescing of identical in-flight Bria calls.
+
+When several sessions press the same button on the same image and settings
+at once, only the first call goes to the API. Later callers with an
+identical request (same API key, endpoint and payload hash) wait on the same
+future and receive a copy of the shared response, or the same exception.
+
+Only calls whose result does not depend on who asked are coalesced: the
+deterministic endpoints, seeded generation and prompt enhancement. Unseeded
+generation requests are always sent, since each press should yield new
+images. Every coalesced call is counted as ``coalesced_calls`` for its
+endpoint. Set ``BRIA_COALESCE=0`` to disable coalescing.
+
+A caller whose cancellation token is set stops waiting for a shared flight
+at once. The flight itself is cancelled only when every caller has left
+it, so one caller giving up never costs the others their result.
+"""
+from typing import Dict, Any, Awaitable, Callable, Optional, Tuple
+import asyncio
+import copy
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, wait
+
+from . import cache, cancellation, metrics
+from .cancellation import CancelToken
+
+# Endpoints coalesced in addition to the cacheable ones.
+EXTRA_ENDPOINTS = ('/v1/prompt_enhancer',)
+
+# How often a follower waiting with a cancellation token checks it.
+POLL_INTERVAL = 0.05
+
+_enabled = os.getenv("BRIA_COALESCE", "1").lower() not in ("0", "false", "no")
+_in_flight: Dict[str, "_Flight"] = {}
+_lock = threading.Lock()
+
+
+class _Flight:
+    """An in-flight call and the callers waiting for it."""
+
+    def __init__(self):
+        self.future: Future = Future()
+        # Cancelled once every caller has cancelled.
+        self.cancel = CancelToken()
+        self.callers = 0
+
+
+def set_enabled(enabled: bool) -> None:
+    """Turn request coalescing on or off for the whole process."""
+    global _enabled
+    _enabled = enabled
+
+
+def flight_key(
+    endpoint: str,
+    api_key: Optional[str],
+    payload: Dict[str, Any],
+    cache_key: Optional[str] = None
+) -> Optional[str]:
+    """
+    Return the coalescing key for a call, or None if it must always be sent.
+
+    Args:
+        endpoint: Endpoint path
+        api_key: API key the call is billed to; calls are never shared across keys
+        payload: Request payload
+        cache_key: Response-cache key, if already computed for this call
+    """
+    if not _enabled:
+        return None
+    if not cache.is_deterministic(endpoint, payload) and not endpoint.startswith(EXTRA_ENDPOINTS):
+        return None
+    request_hash = cache_key or cache.cache_key(endpoint, payload)
+    return hashlib.sha256(f"{api_key or ''}\0{request_hash}".encode('utf-8')).hexdigest()
+
+
+def _join(key: str, cancel: Optional[threading.Event]) -> Tuple[_Flight, bool, Callable[[], None]]:
+    # Also returns the function that stops watching the caller's token.
+    with _lock:
+        flight = _in_flight.get(key)
+        # A flight everyone has left is about to fail; start a fresh one.
+        leader = flight is None or flight.cancel.cancelled
+        if leader:
+            flight = _in_flight[key] = _Flight()
+        flight.callers += 1
+    return flight, leader, _watch(flight, cancel)
+
+
+def _watch(flight: _Flight, cancel: Optional[threading.Event]) -> Callable[[], None]:
+    # Count the caller out of the flight once its token is cancelled.
+    if cancel is None or not hasattr(cancel, "on_cancel"):
+        return lambda: None
+
+    def leave() -> None:
+        with _lock:
+            flight.callers -= 1
+            last = flight.callers == 0
+        if last:
+            flight.cancel.cancel(cancel.reason or "cancelled")
+
+    return cancel.on_cancel(leave)
+
+
+def _settle(key: str, flight: _Flight, result: Any = None, error: Optional[BaseException] = None) -> None:
+    with _lock:
+        if _in_flight.get(key) is flight:
+            del _in_flight[key]
+    if error is not None:
+        flight.future.set_exception(error)
+    else:
+        flight.future.set_result(result)
+
+
+def _wait(flight: _Flight, endpoint: str, cancel: Optional[threading.Event]) -> Dict[str, Any]:
+    if cancel is None:
+        return flight.future.result()
+    while True:
+        cancellation.check(cancel, endpoint)
+        done, _ = wait([flight.future], timeout=POLL_INTERVAL)
+        if done:
+            return flight.future.result()
+
+
+def do(
+    key: str,
+    endpoint: str,
+    fn: Callable[[CancelToken], Dict[str, Any]],
+    cancel: Optional[threading.Event] = None
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Run ``fn`` unless an identical call is already in flight.
+
+    Args:
+        key: Coalescing key from ``flight_key``
+        endpoint: Endpoint path, for metrics
+        fn: Makes the call; receives the flight's token, which is cancelled
+            once every caller sharing the flight has cancelled
+        cancel: This caller's token
+
+    Returns:
+        The response and whether it was shared from another caller's call
+    """
+    flight, leader, unwatch = _join(key, cancel)
+    try:
+        if not leader:
+            metrics.increment("coalesced_calls", endpoint)
+            return copy.deepcopy(_wait(flight, endpoint, cancel)), True
+        try:
+            result = fn(flight.cancel)
+        except BaseException as e:
+            _settle(key, flight, error=e)
+            raise
+        # Followers get their own copies of a private one, so no caller can
+        # mutate another's response.
+        _settle(key, flight, copy.deepcopy(result))
+        return result, False
+    finally:
+        unwatch()
+
+
+async def do_async(
+    key: str,
+    endpoint: str,
+    fn: Callable[[CancelToken], Awaitable[Dict[str, Any]]],
+    cancel: Optional[threading.Event] = None
+) -> Tuple[Dict[str, Any], bool]:
+    """Async counterpart of :func:`do`; sync and async callers share flights."""
+    flight, leader, unwatch = _join(key, cancel)
+    try:
+        if not leader:
+            metrics.increment("coalesced_calls", endpoint)
+            waiter = asyncio.wrap_future(flight.future)
+            while True:
+                cancellation.check(cancel, endpoint)
+                done, _ = await asyncio.wait({waiter}, timeout=POLL_INTERVAL if cancel is not None else None)
+                if done:
+                    return copy.deepcopy(waiter.result()), True
+        try:
+            result = await fn(flight.cancel)
+        except BaseException as e:
+            _settle(key, flight, error=e)
+            raise
+        _settle(key, flight, copy.deepcopy(result))
+        return result, False
+    finally:
+        unwatch()
+
+
+def in_flight() -> int:
+    """Number of distinct coalescable calls currently in flight."""
+    with _lock:
+        return len(_in_flight)
+
+
+__all__ = ['set_enabled', 'flight_key', 'do', 'do_async', 'in_flight']
@@ -0,0 +1,643 @@
+"""
+Shared HTTP transport for the Bria service wrappers.
+
+Every module in ``services`` posts through the pooled session kept here, so
+repeated calls reuse warm keep-alive connections to the Bria API instead of
+paying a new TCP+TLS handshake per request.
+"""
+from typing import Dict, Any, Optional, Iterable, Tuple
+import base64
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from . import adaptive, breaker, cache, cancellation, cassette, hedging, instrumentation, limiter, metrics, singleflight
+from .cancellation import CancelToken
+from .streaming import JSONStreamBody
+
+DEFAULT_BASE_URL = "https://engine.prod.bria-api.com"
+
+# Connection pool size per endpoint path. The generation endpoints are slow,
+# so they keep more sockets open for concurrent callers.
+DEFAULT_POOL_SIZES = {
+    "/v1/text-to-image/hd": 8,
+    "/v1/product/lifestyle_shot_by_text": 8,
+    "/v1/product/lifestyle_shot_by_image": 8,
+    "/v1/gen_fill": 8,
+    "/v1/product/packshot": 4,
+    "/v1/product/shadow": 4,
+    "/v1/erase_foreground": 4,
+    "/v1/prompt_enhancer": 2,
+}
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+@dataclass
+class TransportConfig:
+    """Tunables for the shared transport."""
+    base_url: str = os.getenv("BRIA_API_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+    connect_timeout: float = float(os.getenv("BRIA_CONNECT_TIMEOUT", "5"))
+    read_timeout: float = float(os.getenv("BRIA_READ_TIMEOUT", "120"))
+    max_retries: int = int(os.getenv("BRIA_MAX_RETRIES", "3"))
+    backoff_base: float = float(os.getenv("BRIA_BACKOFF_BASE", "0.5"))
+    backoff_max: float = float(os.getenv("BRIA_BACKOFF_MAX", "20"))
+    default_pool_size: int = int(os.getenv("BRIA_POOL_SIZE", "4"))
+    pool_sizes: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_POOL_SIZES))
+
+
+_config = TransportConfig()
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def configure(**overrides) -> TransportConfig:
+    """
+    Update transport settings and drop the current session.
+
+    Args:
+        **overrides: Any ``TransportConfig`` field, e.g. ``read_timeout=60``
+
+    Returns:
+        The active configuration
+    """
+    global _config, _session
+    with _session_lock:
+        values = {**_config.__dict__, **overrides}
+        values['base_url'] = values['base_url'].rstrip("/")
+        _config = TransportConfig(**values)
+        if _session is not None:
+            _session.close()
+            _session = None
+    return _config
+
+
+def get_config() -> TransportConfig:
+    """Return the active transport configuration."""
+    return _config
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session(_config)
+    return _session
+
+
+def _build_session(config: TransportConfig) -> requests.Session:
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=config.default_pool_size))
+    session.mount("http://", HTTPAdapter(pool_maxsize=config.default_pool_size))
+    # requests picks the longest matching prefix, so each endpoint gets its
+    # own adapter and therefore its own pool.
+    for path, size in config.pool_sizes.items():
+        session.mount(config.base_url + path, HTTPAdapter(pool_connections=1, pool_maxsize=size))
+    return session
+
+
+def api_url(path: str) -> str:
+    """
+    Return the full URL of a Bria endpoint.
+
+    The host comes from ``BRIA_API_BASE_URL`` (or ``configure(base_url=...)``),
+    so the services can be pointed at a local stand-in such as
+    ``tools/mock_bria.py``.
+    """
+    return _config.base_url + path
+
+
+def cache_host() -> str:
+    """Host to namespace cached responses by; empty for the production API."""
+    base_url = _config.base_url
+    return "" if base_url == DEFAULT_BASE_URL else base_url
+
+
+def api_headers(api_key: str) -> Dict[str, str]:
+    """Standard JSON headers for an authenticated Bria API call."""
+    return {
+        'api_token': api_key,
+        'Accept': 'application/json',
+        'Content-Type': 'application/json'
+    }
+
+
+def endpoint_path(url: str) -> str:
+    """Return the endpoint path of a Bria URL, used as the key for per-endpoint state."""
+    return urlparse(url).path
+
+
+def backoff_delay(attempt: int, config: Optional[TransportConfig] = None) -> float:
+    """Full-jitter exponential backoff for the given retry attempt."""
+    config = config or _config
+    ceiling = min(config.backoff_max, config.backoff_base * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def retry_delay(attempt: int, retry_after: Optional[float], config: Optional[TransportConfig] = None) -> float:
+    """Backoff before the next attempt, never shorter than the server's Retry-After."""
+    delay = backoff_delay(attempt, config)
+    if retry_after:
+        delay = max(delay, min(retry_after, adaptive.MAX_RETRY_AFTER))
+    return delay
+
+
+def record_response(
+    endpoint: str,
+    status_code: int,
+    retry_after_header: Optional[str],
+    seconds: float
+) -> Optional[float]:
+    """Feed one response to ``services.adaptive``; return its ``Retry-After`` in seconds."""
+    retry_after = adaptive.parse_retry_after(retry_after_header)
+    adaptive.record(endpoint, status_code, seconds, retry_after)
+    return retry_after
+
+
+def should_retry(status_code: int, attempt: int, config: Optional[TransportConfig] = None) -> bool:
+    """Whether a response with ``status_code`` on attempt ``attempt`` (from 0) is retried."""
+    config = config or _config
+    return status_code in RETRY_STATUSES and attempt < config.max_retries
+
+
+def may_resend(
+    endpoint: str,
+    json: Dict[str, Any],
+    reached_server: bool,
+    attempt: int,
+    config: Optional[TransportConfig] = None
+) -> bool:
+    """
+    Whether a request that failed without a response is retried.
+
+    Args:
+        endpoint: Endpoint path
+        json: Request payload
+        reached_server: False only if the connection was never established;
+            otherwise the server may have received, and billed, the request
+        attempt: Attempt that failed, from 0
+        config: Transport settings (default: the active ones)
+    """
+    config = config or _config
+    if attempt >= config.max_retries:
+        return False
+    return not reached_server or cache.is_repeatable(endpoint, json)
+
+
+def _reached_server(error: requests.exceptions.ConnectionError) -> bool:
+    # requests raises ConnectionError for resets after the body was sent too;
+    # only a failed connect (wrapped in MaxRetryError) proves nothing was sent.
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return False
+    cause = error.args[0] if error.args else None
+    return not isinstance(getattr(cause, 'reason', cause), NewConnectionError)
+
+
+def post(
+    url: str,
+    headers: Dict[str, str],
+    json: Dict[str, Any],
+    timeout: Optional[float] = None,
+    trace: Optional[instrumentation.RequestTrace] = None,
+    cancel: Optional[threading.Event] = None
+) -> requests.Response:
+    """
+    POST a JSON payload through the shared session.
+
+    Each attempt waits for a slot from the process-wide rate limiter.
+    429/5xx responses and failed connects are retried with jittered
+    exponential backoff, honoring any ``Retry-After`` header; connections
+    lost after the request may have been sent are retried only for calls
+    that are safe to repeat (see ``may_resend``). The final response is returned unchecked (with its
+    body already read), so callers keep using ``raise_for_status()``.
+
+    Args:
+        url: Endpoint URL
+        headers: Request headers
+        json: Request payload; ``ImageHandle`` values are sent as base64
+        timeout: Optional read timeout overriding the configured one
+        trace: Optional trace to fill with size and timing measurements
+        cancel: Optional event or ``CancelToken``; once set, no further attempts
+            are made, and a response that arrives anyway is closed unread
+    """
+    config = _config
+    session = get_session()
+    read_timeout = timeout if timeout is not None else config.read_timeout
+    # Images are base64-encoded chunk by chunk as the body is sent; each
+    # retry re-iterates the same body.
+    body = JSONStreamBody(json)
+    if trace is not None:
+        trace.payload_bytes = len(body)
+        instrumentation.debug_request(url, headers, json)
+
+    endpoint = endpoint_path(url)
+    attempt = 0
+    try:
+        while True:
+            cancellation.check(cancel, endpoint)
+            # Every attempt, retries included, counts against the rate limit.
+            with limiter.slot(headers.get('api_token'), endpoint, cancel):
+                # Cancelled while queued for the slot: nothing has been sent yet.
+                cancellation.check(cancel, endpoint)
+                sent_at = time.perf_counter()
+                try:
+                    # stream=True returns as soon as the headers arrive, which
+                    # gives the time to first byte; the body is read right after.
+                    response = session.post(
+                        url,
+                        headers=headers,
+                        data=body,
+                        timeout=(config.connect_timeout, read_timeout),
+                        stream=True
+                    )
+                except requests.exceptions.ConnectionError as e:
+                    if not may_resend(endpoint, json, _reached_server(e), attempt, config):
+                        raise
+                    retry_after = None
+                else:
+                    if trace is not None:
+                        trace.ttfb_ms = (time.perf_counter() - sent_at) * 1000
+                    if cancel is not None and cancel.is_set():
+                        # Already billed; skip the body and free the connection.
+                        if trace is not None:
+                            trace.status = response.status_code
+                        response.close()
+                        cancellation.check(cancel, endpoint)
+                    response.content
+                    retry_after = record_response(
+                        endpoint, response.status_code, response.headers.get('Retry-After'),
+                        time.perf_counter() - sent_at
+                    )
+                    if not should_retry(response.status_code, attempt, config):
+                        if trace is not None:
+                            trace.status = response.status_code
+                            trace.response_bytes = len(response.content)
+                        return response
+                    response.close()
+
+            delay = retry_delay(attempt, retry_after, config)
+            if cancel is not None:
+                # Wake up as soon as the call is cancelled, not after the backoff.
+                cancel.wait(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
+    finally:
+        if trace is not None:
+            trace.attempts = attempt + 1
+            trace.encode_ms = body.encode_seconds * 1000
+
+
+def merge_trace(trace: instrumentation.RequestTrace, winner: instrumentation.RequestTrace, attempts: int) -> None:
+    """Copy the measurements of a hedged call's winning leg into the call's trace."""
+    for name in ('payload_bytes', 'encode_ms', 'ttfb_ms', 'status', 'response_bytes'):
+        setattr(trace, name, getattr(winner, name))
+    trace.attempts = attempts
+
+
+def _hedged_post(
+    url: str,
+    headers: Dict[str, str],
+    json: Dict[str, Any],
+    timeout: Optional[float],
+    trace: instrumentation.RequestTrace,
+    delay: float,
+    cancel: Optional[CancelToken] = None
+) -> requests.Response:
+    # Send the call, and a duplicate if it is still running after ``delay``;
+    # return the first good response. A request cannot be interrupted once it
+    # is on the wire, so the loser only stops retrying and its result is dropped.
+    # Both legs share a token chained to the caller's, so cancelling the call
+    # stops both.
+    endpoint = endpoint_path(url)
+    executor = hedging.get_executor()
+    legs = CancelToken(parent=cancel)
+    traces = [instrumentation.RequestTrace(endpoint=endpoint) for _ in range(2)]
+    started = time.perf_counter()
+
+    def run(index: int) -> requests.Response:
+        try:
+            response = post(url, headers, json, timeout=timeout, trace=traces[index], cancel=legs)
+        except cancellation.Cancelled:
+            if index == 0:
+                # Dropped for the hedge: its latency was at least this long.
+                hedging.record_primary(endpoint, time.perf_counter() - started, abandoned=True)
+            raise
+        if index == 0:
+            hedging.record_primary(endpoint, time.perf_counter() - started)
+        return response
+
+    futures = [executor.submit(run, 0)]
+    try:
+        done, _ = wait(futures, timeout=delay)
+        if not done and not legs.cancelled and hedging.try_spend(endpoint):
+            futures.append(executor.submit(run, 1))
+
+        winner = None
+        pending = set(futures)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next(
+                (
+                    future for future in done
+                    if future.exception() is None and breaker.outcome(future.result().status_code) is not False
+                ),
+                None
+            )
+        # If every request failed, report the original one's outcome.
+        winner = winner or futures[0]
+    finally:
+        legs.cancel("hedge settled")
+        legs.detach()
+
+    index = futures.index(winner)
+    if index:
+        hedging.record_win(endpoint)
+    trace.extra['hedged'] = len(futures) > 1
+    merge_trace(trace, traces[index], sum(t.attempts for t in traces))
+    return winner.result()
+
+
+def _call_api(
+    url: str,
+    headers: Dict[str, str],
+    json: Dict[str, Any],
+    timeout: Optional[float],
+    trace: instrumentation.RequestTrace,
+    endpoint: str,
+    key: Optional[str],
+    cancel: Optional[CancelToken] = None
+) -> Dict[str, Any]:
+    # One real API call behind the circuit breaker; the result is cached.
+    probe = breaker.before_call(endpoint)
+    healthy = None
+    try:
+        delay = hedging.hedge_delay(endpoint, json)
+        if delay is None:
+            sent_at = time.perf_counter()
+            response = post(url, headers, json, timeout=timeout, trace=trace, cancel=cancel)
+            if hedging.is_eligible(endpoint, json):
+                hedging.record_primary(endpoint, time.perf_counter() - sent_at)
+        else:
+            response = _hedged_post(url, headers, json, timeout, trace, delay, cancel)
+        healthy = breaker.outcome(response.status_code)
+    except requests.exceptions.RequestException:
+        healthy = False
+        raise
+    finally:
+        breaker.record(endpoint, healthy, probe)
+    response.raise_for_status()
+    result = response.json()
+    cache.store(endpoint, key, result)
+    return result
+
+
+def _fetch_json(
+    url: str,
+    headers: Dict[str, str],
+    json: Dict[str, Any],
+    timeout: Optional[float],
+    trace: instrumentation.RequestTrace,
+    endpoint: str,
+    cancel: Optional[CancelToken] = None
+) -> Dict[str, Any]:
+    # Cache, then an identical call already in flight, then the API.
+    key, cached = fetch_cached(endpoint, json, trace)
+    if cached is not None:
+        return cached
+
+    flight = singleflight.flight_key(endpoint, headers.get('api_token'), json, key)
+    if flight is None:
+        return _call_api(url, headers, json, timeout, trace, endpoint, key, cancel)
+
+    # Other callers may join this flight, so it runs with the flight's token,
+    # which is cancelled only once every caller sharing it has cancelled.
+    def call(flight_cancel: CancelToken) -> Dict[str, Any]:
+        return _call_api(url, headers, json, timeout, trace, endpoint, key, flight_cancel)
+
+    result, shared = singleflight.do(flight, endpoint, call, cancel)
+    if shared:
+        trace.cache = "shared"
+    return result
+
+
+def fetch_cached(
+    endpoint: str,
+    json: Dict[str, Any],
+    trace: instrumentation.RequestTrace
+) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Look a call up in the response cache (blocking: the cache lives on disk).
+
+    Returns:
+        The cache key (None if the call is not cacheable) and the cached
+        response, if any
+    """
+    key = cache.lookup(endpoint, json, cache_host())
+    cached = cache.fetch(endpoint, key)
+    if cached is not None:
+        trace.cache = "hit"
+    return key, cached
+
+
+def replay(
+    endpoint: str,
+    json: Dict[str, Any],
+    trace: instrumentation.RequestTrace
+) -> Optional[Tuple[Dict[str, Any], float]]:
+    """
+    Answer a call from the active replay cassette (blocking: it is SQLite).
+
+    Returns:
+        None without a replaying cassette, else the recorded response and
+        the seconds to wait before returning it
+
+    Raises:
+        CassetteMiss: If the call was never recorded
+    """
+    player = cassette.replaying()
+    if player is None:
+        return None
+    trace.cache = "replay"
+    interaction = player.lookup(endpoint, json)
+    trace.status = interaction.status
+    return interaction.result(), player.delay(interaction)
+
+
+def record_call(
+    endpoint: str,
+    json: Dict[str, Any],
+    seconds: float,
+    result: Optional[Dict[str, Any]] = None,
+    error: Optional[Exception] = None
+) -> None:
+    """Store a call's response, or its HTTP error, in the recording cassette if there is one."""
+    recorder = cassette.recording()
+    if recorder is None:
+        return
+    if error is not None:
+        recorder.record(endpoint, json, seconds, status=error.response.status_code, error=str(error))
+    else:
+        recorder.record(endpoint, json, seconds, result)
+
+
+def count_cancelled(endpoint: str, trace: instrumentation.RequestTrace) -> None:
+    """Count a cancelled call as ``wasted_calls`` if it was billed, else ``cancelled_calls``."""
+    trace.extra['cancelled'] = True
+    billed = trace.status is not None and trace.cache not in ("hit", "shared", "replay")
+    metrics.increment("wasted_calls" if billed else "cancelled_calls", endpoint)
+
+
+def post_json(
+    url: str,
+    headers: Dict[str, str],
+    json: Dict[str, Any],
+    timeout: Optional[float] = None,
+    cancel: Optional[CancelToken] = None
+) -> Dict[str, Any]:
+    """
+    POST a JSON payload and return the decoded JSON response.
+
+    Deterministic calls are served from, and stored in, the response cache,
+    and identical calls already in flight are joined rather than repeated.
+    Slow seeded generation calls may be hedged (see ``services.hedging``).
+    HTTP errors are raised as ``requests.HTTPError``, and calls to an
+    endpoint whose circuit breaker is open raise ``CircuitOpenError``.
+    With a cassette active, calls are recorded or replayed
+    (see ``services.cassette``). Once ``cancel`` is set the call raises
+    ``Cancelled`` (see ``services.cancellation``).
+    """
+    endpoint = endpoint_path(url)
+    trace = instrumentation.start(endpoint)
+    started = time.perf_counter()
+    try:
+        cancellation.check(cancel, endpoint)
+        replayed = replay(endpoint, json, trace)
+        if replayed is not None:
+            result, delay = replayed
+            time.sleep(delay)
+            return result
+
+        try:
+            result = _fetch_json(url, headers, json, timeout, trace, endpoint, cancel)
+        except requests.exceptions.HTTPError as e:
+            record_call(endpoint, json, time.perf_counter() - started, error=e)
+            raise
+        record_call(endpoint, json, time.perf_counter() - started, result)
+        cancellation.check(cancel, endpoint)
+        return result
+    except cancellation.Cancelled:
+        count_cancelled(endpoint, trace)
+        raise
+    except Exception as e:
+        trace.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        finish_call(endpoint, trace, started)
+
+
+def finish_call(endpoint: str, trace: instrumentation.RequestTrace, started: float) -> None:
+    """Close a call's trace and record it in the metrics if a request was sent."""
+    elapsed = time.perf_counter() - started
+    trace.total_ms = elapsed * 1000
+    if trace.attempts:
+        metrics.record_request(
+            endpoint, elapsed, trace.status, trace.payload_bytes,
+            trace.response_bytes, error=trace.error is not None
+        )
+    instrumentation.finish(trace)
+
+
+def download(url: str, timeout: Optional[float] = None) -> bytes:
+    """
+    Fetch a result image.
+
+    ``data:`` URIs (results replayed from a cassette) are decoded locally,
+    recorded images are served from the active cassette, and images fetched
+    while recording are stored in it.
+
+    Args:
+        url: Result URL
+        timeout: Optional read timeout overriding the configured one
+
+    Returns:
+        The image bytes
+    """
+    if url.startswith("data:"):
+        return base64.b64decode(url.partition(",")[2])
+    player = cassette.replaying()
+    if player is not None:
+        data = player.image(url)
+        if data is not None:
+            return data
+
+    config = _config
+    response = get_session().get(
+        url, timeout=(config.connect_timeout, timeout if timeout is not None else config.read_timeout)
+    )
+    response.raise_for_status()
+    recorder = cassette.recording()
+    if recorder is not None:
+        recorder.store_image(url, response.content, response.headers.get("Content-Type", "image/png"))
+    return response.content
+
+
+def warm_up(paths: Optional[Iterable[str]] = None) -> None:
+    """
+    Open a pooled connection to each endpoint ahead of the first real call.
+
+    Args:
+        paths: Endpoint paths to warm (defaults to every configured endpoint)
+    """
+    session = get_session()
+    config = _config
+    for path in paths or config.pool_sizes:
+        try:
+            session.head(config.base_url + path, timeout=(config.connect_timeout, config.connect_timeout))
+        except requests.exceptions.RequestException:
+            pass
+
+
+def warm_up_in_background(paths: Optional[Iterable[str]] = None) -> threading.Thread:
+    """Run ``warm_up`` on a daemon thread so startup is not delayed."""
+    thread = threading.Thread(target=warm_up, args=(paths,), name="bria-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+__all__ = [
+    'TransportConfig',
+    'configure',
+    'get_config',
+    'get_session',
+    'api_url',
+    'cache_host',
+    'api_headers',
+    'endpoint_path',
+    'backoff_delay',
+    'retry_delay',
+    'record_response',
+    'should_retry',
+    'may_resend',
+    'post',
+    'merge_trace',
+    'fetch_cached',
+    'replay',
+    'record_call',
+    'count_cancelled',
+    'post_json',
+    'finish_call',
+    'download',
+    'warm_up',
+    'warm_up_in_background'
+]
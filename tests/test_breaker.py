@@ -0,0 +1,100 @@
+"""Tests for services.breaker."""
+import time
+
+import pytest
+import requests
+
+from benchmarks.harness import mock_api
+from services import breaker, transport
+from services.breaker import CLOSED, HALF_OPEN, OPEN, BreakerConfig, CircuitBreaker, CircuitOpenError
+from tools.mock_bria import MockConfig
+
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    settings = dict(enabled=True, failure_rate=0.5, min_calls=2, window=60, cooldown=0.05, probes=2)
+    return CircuitBreaker("/v1/test", BreakerConfig(**{**settings, **overrides}))
+
+
+def trip(circuit: CircuitBreaker) -> None:
+    for _ in range(circuit.config.min_calls):
+        assert circuit.before_call() is False
+        circuit.record(False)
+
+
+def test_full_cycle():
+    circuit = make_breaker()
+    trip(circuit)
+    assert circuit.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        circuit.before_call()
+
+    time.sleep(0.06)
+    assert circuit.before_call() is True
+    assert circuit.state == HALF_OPEN
+    assert circuit.before_call() is True
+    # Both probes are out; nobody else gets through until they settle.
+    with pytest.raises(CircuitOpenError):
+        circuit.before_call()
+    circuit.record(True, probe=True)
+    assert circuit.state == HALF_OPEN
+    circuit.record(True, probe=True)
+    assert circuit.state == CLOSED
+    assert circuit.before_call() is False
+
+
+def test_failed_probe_reopens():
+    circuit = make_breaker()
+    trip(circuit)
+    time.sleep(0.06)
+    assert circuit.before_call() is True
+    circuit.record(False, probe=True)
+    assert circuit.state == OPEN
+
+
+def test_stays_closed_below_failure_rate():
+    circuit = make_breaker(min_calls=4)
+    for success in (True, True, False, True, True):
+        circuit.before_call()
+        circuit.record(success)
+    assert circuit.state == CLOSED
+
+
+@pytest.mark.parametrize("status_code, expected", [
+    (200, True),
+    (204, True),
+    (400, None),
+    (404, None),
+    (429, None),
+    (500, False),
+    (503, False),
+])
+def test_outcome(status_code, expected):
+    assert breaker.outcome(status_code) is expected
+
+
+def test_client_errors_neither_trip_nor_dilute():
+    circuit = make_breaker(min_calls=4)
+    for _ in range(10):
+        circuit.before_call()
+        circuit.record(breaker.outcome(429))
+    assert circuit.state == CLOSED
+    # Throttled calls say nothing about health, so they must not hide these.
+    for status_code in (503, 200, 500, 502):
+        circuit.before_call()
+        circuit.record(breaker.outcome(status_code))
+    assert circuit.state == OPEN
+
+
+def test_throttled_calls_do_not_open_the_circuit():
+    previous = transport.get_config().max_retries
+    with mock_api(MockConfig(latency={"*": "fixed:0"}, throttle_rate={"*": 1.0}, retry_after=0)) as base:
+        breaker.configure(enabled=True, min_calls=2, failure_rate=0.5)
+        transport.configure(max_retries=0)
+        try:
+            for _ in range(3):
+                with pytest.raises(requests.HTTPError):
+                    transport.post_json(f"{base}/v1/prompt_enhancer", transport.api_headers("key"), {"prompt": "a cup"})
+            assert breaker.status("/v1/prompt_enhancer")["state"] == CLOSED
+        finally:
+            transport.configure(max_retries=previous)
+            breaker.configure(enabled=False)
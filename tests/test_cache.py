@@ -0,0 +1,77 @@
+"""Tests for services.cache."""
+import time
+
+import pytest
+import requests
+
+from benchmarks.harness import mock_api
+from services import cache, generate_hd_image
+from services.cache import ResponseCache, cache_key, lookup
+from tools.mock_bria import MockConfig
+
+HD = "/v1/text-to-image/hd/2.2"
+
+
+def upstream_calls(base: str, path: str) -> int:
+    return sum(requests.get(f"{base}/__stats").json().get(path, {}).values())
+
+
+@pytest.fixture
+def enabled_cache(tmp_path):
+    yield cache.configure(enabled=True, directory=str(tmp_path))
+    cache.configure(enabled=False)
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    store = ResponseCache(str(tmp_path), max_bytes=1 << 20, ttl=0.05)
+    store.put("a" * 64, "/v1/product/packshot", {"result_url": "u"})
+    assert store.get("a" * 64) == {"result_url": "u"}
+    time.sleep(0.1)
+    assert store.get("a" * 64) is None
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    keys = [str(i) * 64 for i in range(3)]
+    store = ResponseCache(str(tmp_path), max_bytes=1 << 20, ttl=60)
+    store.put(keys[0], "/e", {"n": 0})
+    # Room for two entries of this size, not three.
+    store.max_bytes = store._total * 2 + 10
+    store.put(keys[1], "/e", {"n": 1})
+    # Reading the oldest entry makes the second one the least recently used.
+    assert store.get(keys[0]) == {"n": 0}
+    store.put(keys[2], "/e", {"n": 2})
+    assert store.get(keys[1]) is None
+    assert store.get(keys[0]) == {"n": 0}
+    assert store.get(keys[2]) == {"n": 2}
+
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    ResponseCache(str(tmp_path), 1 << 20, 60).put("b" * 64, "/e", {"n": 1})
+    assert ResponseCache(str(tmp_path), 1 << 20, 60).get("b" * 64) == {"n": 1}
+
+
+def test_key_ignores_field_order_but_not_values():
+    assert cache_key(HD, {"prompt": "a", "seed": 1}) == cache_key(HD, {"seed": 1, "prompt": "a"})
+    assert cache_key(HD, {"prompt": "a", "seed": 1}) != cache_key(HD, {"prompt": "a", "seed": 2})
+    assert cache_key(HD, {"prompt": "a", "seed": 1}) != cache_key(HD, {"prompt": "a", "seed": 1}, host="mock")
+
+
+def test_only_deterministic_calls_are_cached(enabled_cache):
+    assert lookup(HD, {"prompt": "a", "seed": 1}) is not None
+    assert lookup("/v1/product/packshot", {"file": b"image"}) is not None
+    assert lookup(HD, {"prompt": "a"}) is None
+    assert lookup(HD, {"prompt": "a", "seed": 1, "sync": False}) is None
+
+
+def test_unseeded_calls_bypass_the_cache(tmp_path):
+    with mock_api(MockConfig(latency={"*": "fixed:0"}, seed=0)) as base:
+        cache.configure(enabled=True, directory=str(tmp_path))
+        try:
+            generate_hd_image("a cup", "key", seed=7)
+            generate_hd_image("a cup", "key", seed=7)
+            assert upstream_calls(base, HD) == 1
+            generate_hd_image("a cup", "key")
+            generate_hd_image("a cup", "key")
+            assert upstream_calls(base, HD) == 3
+        finally:
+            cache.configure(enabled=False)
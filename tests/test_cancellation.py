@@ -0,0 +1,86 @@
+"""Tests for services.cancellation."""
+import threading
+
+import pytest
+
+from services.cancellation import Cancelled, CancelToken, check
+
+
+def test_cancel_keeps_first_reason():
+    token = CancelToken()
+    token.cancel("superseded")
+    token.cancel("shutdown")
+    assert token.cancelled
+    assert token.reason == "superseded"
+
+
+def test_child_follows_parent():
+    parent = CancelToken()
+    child = CancelToken(parent=parent)
+    grandchild = CancelToken(parent=child)
+    parent.cancel("interrupted")
+    assert child.cancelled and grandchild.cancelled
+    assert grandchild.reason == "interrupted"
+
+
+def test_cancelling_child_leaves_parent_alone():
+    parent = CancelToken()
+    child = CancelToken(parent=parent)
+    sibling = CancelToken(parent=parent)
+    child.cancel("stage failed")
+    assert child.cancelled
+    assert not parent.cancelled
+    assert not sibling.cancelled
+
+
+def test_child_of_cancelled_parent_starts_cancelled():
+    parent = CancelToken()
+    parent.cancel("shutdown")
+    assert CancelToken(parent=parent).reason == "shutdown"
+
+
+def test_on_cancel_runs_once():
+    token = CancelToken()
+    calls = []
+    token.on_cancel(lambda: calls.append("early"))
+    token.cancel()
+    token.cancel()
+    token.on_cancel(lambda: calls.append("late"))
+    assert calls == ["early", "late"]
+
+
+def test_check():
+    check(None)
+    check(threading.Event())
+    token = CancelToken()
+    token.cancel("abandoned")
+    with pytest.raises(Cancelled) as info:
+        check(token, "/v1/product/packshot")
+    assert info.value.reason == "abandoned"
+    assert info.value.endpoint == "/v1/product/packshot"
+
+    event = threading.Event()
+    event.set()
+    with pytest.raises(Cancelled, match="cancelled"):
+        check(event)
+
+
+def test_on_cancel_returns_unsubscribe():
+    token = CancelToken()
+    calls = []
+    remove = token.on_cancel(lambda: calls.append("removed"))
+    token.on_cancel(lambda: calls.append("kept"))
+    remove()
+    remove()
+    token.cancel()
+    assert calls == ["kept"]
+
+
+def test_detached_child_is_released_by_parent():
+    parent = CancelToken()
+    children = [CancelToken(parent=parent) for _ in range(3)]
+    for child in children:
+        child.detach()
+    assert parent._callbacks == {}
+    parent.cancel("shutdown")
+    assert not any(child.cancelled for child in children)
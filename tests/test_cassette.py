@@ -0,0 +1,63 @@
+"""Tests for services.cassette."""
+import pytest
+
+from benchmarks.harness import mock_api, sample_image
+from services import cassette, create_packshot, generate_hd_image, transport
+from services.cassette import RECORD, REPLAY, Cassette, image_urls
+from services.jobs import result_urls
+from tools.mock_bria import MockConfig
+
+
+@pytest.fixture
+def tape(tmp_path):
+    yield str(tmp_path / "test.cassette")
+    cassette.configure()
+
+
+def without_urls(value):
+    # Result images come back as data: URIs in replay; compare everything else.
+    if isinstance(value, dict):
+        return {key: without_urls(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [without_urls(item) for item in value]
+    if isinstance(value, str) and value.startswith(("http://", "https://", "data:")):
+        return "<image>"
+    return value
+
+
+def test_record_then_replay_round_trip(tape):
+    image = sample_image(64)
+    with mock_api(MockConfig(latency={"*": "fixed:0"}, seed=0)):
+        cassette.configure(RECORD, tape)
+        hd = generate_hd_image("a cup", "key", seed=3)
+        packshot = create_packshot("key", image)
+        unseeded = [generate_hd_image("a mug", "key") for _ in range(2)]
+        with pytest.raises(Exception, match="401"):
+            create_packshot("", image)
+        originals = {url: transport.download(url) for url in image_urls(hd) + image_urls(packshot)}
+        # Closing the cassette waits for the result images to be stored.
+        cassette.configure()
+
+    stats = Cassette(tape, REPLAY).stats()
+    assert stats["calls"] == 5
+    assert stats["images"] == 4
+
+    # The mock server is gone: everything below is answered from the cassette.
+    cassette.configure(REPLAY, tape)
+    for recorded, replayed in ((hd, generate_hd_image("a cup", "key", seed=3)),
+                               (packshot, create_packshot("another-key", image))):
+        assert without_urls(replayed) == without_urls(recorded)
+        replayed_urls = result_urls(replayed)
+        assert len(replayed_urls) == len(image_urls(recorded))
+        for url, inlined in zip(image_urls(recorded), replayed_urls):
+            assert inlined.startswith("data:image/png;base64,")
+            assert transport.download(inlined) == originals[url]
+
+    # Calls recorded several times replay in order, then start over.
+    replays = [without_urls(generate_hd_image("a mug", "key")) for _ in range(3)]
+    assert replays == [without_urls(unseeded[0]), without_urls(unseeded[1]), without_urls(unseeded[0])]
+
+    with pytest.raises(Exception, match="401"):
+        create_packshot("", image)
+    with pytest.raises(Exception, match="No recorded response"):
+        generate_hd_image("never recorded", "key", seed=1)
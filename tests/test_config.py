@@ -0,0 +1,103 @@
+"""Tests for workflows.config and the batch manifest parsing built on it."""
+import pytest
+
+from workflows.batch import BatchItem, check_ids, item_settings, load_items, run_batch, safe_id
+from workflows.config import DEFAULT_CONFIG, default_config, parse_value
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("yes", True), ("On", True), ("1", True),
+    ("no", False), ("0", False), ("", False),
+])
+def test_parse_bool(text, expected):
+    assert parse_value("create_packshot", text) is expected
+
+
+def test_parse_typed_defaults():
+    assert parse_value("num_results", "8") == 8
+    assert parse_value("background_color", "#F5F5F5") == "#F5F5F5"
+    assert parse_value("unknown_setting", "as is") == "as is"
+
+
+def test_parse_runtime_settings():
+    assert parse_value("stage_timeout", "2.5") == 2.5
+    assert parse_value("max_workers", "3") == 3
+    assert isinstance(parse_value("max_workers", "3"), int)
+
+
+@pytest.mark.parametrize("key, text, message", [
+    ("create_packshot", "maybe", "Invalid boolean for create_packshot"),
+    ("num_results", "many", "Invalid int for num_results"),
+    ("max_workers", "2.5", "Invalid int for max_workers"),
+    ("stage_timeout", "soon", "Invalid float for stage_timeout"),
+    ("max_workers", "0", "max_workers must be positive"),
+    ("stage_timeout", "-1", "stage_timeout must be positive"),
+])
+def test_parse_rejects_bad_values(key, text, message):
+    with pytest.raises(ValueError, match=message):
+        parse_value(key, text)
+
+
+def test_default_config_is_a_copy():
+    config = default_config(add_shadow=True)
+    assert config["add_shadow"] is True
+    assert DEFAULT_CONFIG["add_shadow"] is False
+
+
+@pytest.mark.parametrize("raw, cleaned", [
+    ("SKU-123", "SKU-123"),
+    ("../x", "_x"),
+    ("a/b", "a_b"),
+    ("..", "item"),
+    ("mug 12oz", "mug_12oz"),
+])
+def test_safe_id(raw, cleaned):
+    assert safe_id(raw) == cleaned
+
+
+def test_load_items_from_csv(tmp_path):
+    manifest = tmp_path / "catalog.csv"
+    manifest.write_text(
+        "sku,prompt,num_results,max_workers\n"
+        "../mug,a mug,8,2\n"
+        "lamp,a lamp,,\n",
+        encoding="utf-8"
+    )
+    items = load_items(str(manifest))
+    assert [item.id for item in items] == ["_mug", "lamp"]
+    assert items[0].config == {"num_results": 8, "max_workers": 2}
+    assert items[1].config == {}
+
+
+def test_load_items_rejects_duplicate_ids(tmp_path):
+    manifest = tmp_path / "catalog.jsonl"
+    manifest.write_text('{"sku": "a/b", "prompt": "x"}\n{"sku": "a_b", "prompt": "y"}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="Duplicate item id 'a_b'"):
+        load_items(str(manifest))
+
+
+def test_check_ids_rejects_unsafe_ids():
+    with pytest.raises(ValueError, match="not a safe folder name"):
+        check_ids([BatchItem(id="../x", prompt="p")])
+
+
+def test_item_settings_forward_sku_and_item_overrides():
+    item = BatchItem(id="mug", sku="SKU-1", config={"num_results": 2})
+    settings = item_settings(item, default_config(num_results=1))
+    assert settings["sku"] == "SKU-1"
+    assert settings["num_results"] == 2
+
+
+def test_lifestyle_scene_falls_back_to_prompt():
+    config = default_config(lifestyle_shot=True)
+    assert item_settings(BatchItem(id="mug", prompt="on a kitchen table"), config)["scene_description"] == \
+        "on a kitchen table"
+    explicit = BatchItem(id="mug", prompt="a mug", config={"scene_description": "on a beach"})
+    assert item_settings(explicit, config)["scene_description"] == "on a beach"
+
+
+def test_lifestyle_without_scene_is_rejected_before_any_request(tmp_path):
+    items = [BatchItem(id="ok", prompt="p"), BatchItem(id="mug", image="mug.png")]
+    with pytest.raises(ValueError, match="'mug' needs a scene description"):
+        run_batch("key", items, default_config(lifestyle_shot=True), str(tmp_path))
+    assert not (tmp_path / "summary.json").exists()
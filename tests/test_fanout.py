@@ -0,0 +1,83 @@
+"""Tests for services.fanout."""
+import threading
+
+import pytest
+
+from services import Cancelled
+from services.fanout import MAX_SEED, derive_seeds, fan_out, merge_results, split_results
+
+
+def fake_generate(num_results, seed=None, cancel=None, **kwargs):
+    return {"result_urls": [f"https://img/{seed}/{index}" for index in range(num_results)], "seed": seed}
+
+
+@pytest.mark.parametrize("num_results, sizes", [
+    (0, [1]),
+    (1, [1]),
+    (4, [4]),
+    (5, [4, 1]),
+    (10, [4, 4, 2]),
+    (32, [4] * 8),
+])
+def test_split_results(num_results, sizes):
+    assert split_results(num_results) == sizes
+
+
+def test_split_results_custom_size():
+    assert split_results(7, per_call=3) == [3, 3, 1]
+
+
+def test_derive_seeds_keeps_base_seed_first():
+    seeds = derive_seeds(42, 4)
+    assert seeds[0] == 42
+    assert len(set(seeds)) == 4
+    assert all(0 <= seed <= MAX_SEED for seed in seeds)
+
+
+def test_derive_seeds_is_deterministic():
+    assert derive_seeds(7, 3) == derive_seeds(7, 3)
+    assert derive_seeds(7, 3)[1:] != derive_seeds(8, 3)[1:]
+
+
+def test_merge_results_keeps_order_and_rows():
+    merged = merge_results([
+        {"result_urls": ["a", "b"], "result": [{"urls": ["a"]}, {"urls": ["b"]}]},
+        {"result_url": "c"},
+    ])
+    assert merged["result_urls"] == ["a", "b", "c"]
+    assert merged["result"] == [{"urls": ["a"]}, {"urls": ["b"]}]
+
+
+def test_merge_results_without_rows():
+    assert merge_results([{"result_urls": ["a"]}]) == {"result_urls": ["a"]}
+
+
+def test_fan_out_single_call_passes_through():
+    assert fan_out(fake_generate, 3, seed=5) == fake_generate(3, seed=5)
+
+
+def test_fan_out_merges_sub_requests():
+    response = fan_out(fake_generate, 10, seed=5)
+    seeds = derive_seeds(5, 3)
+    assert response["seed"] == 5
+    assert response["seeds"] == seeds
+    assert len(response["result_urls"]) == 10
+    assert response["result_seeds"] == [seeds[0]] * 4 + [seeds[1]] * 4 + [seeds[2]] * 2
+    assert response["result_urls"][4] == f"https://img/{seeds[1]}/0"
+
+
+def test_fan_out_failure_cancels_siblings():
+    started = threading.Barrier(2)
+    cancelled = []
+
+    def flaky(num_results, seed=None, cancel=None):
+        started.wait(timeout=5)
+        if num_results == 1:
+            raise RuntimeError("boom")
+        cancel.wait(timeout=5)
+        cancelled.append(cancel.cancelled)
+        raise Cancelled(cancel.reason)
+
+    with pytest.raises(RuntimeError, match="boom"):
+        fan_out(flaky, 5, seed=1)
+    assert cancelled == [True]
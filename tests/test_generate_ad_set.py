@@ -0,0 +1,88 @@
+"""Tests for the stage runner of workflows.generate_ad_set."""
+import threading
+
+from services.cancellation import Cancelled, CancelToken
+from workflows.generate_ad_set import (
+    CANCELLED, DONE, SKIPPED, TIMED_OUT, Stage, build_stages, iter_stages, run_stages
+)
+
+
+def test_dependencies_run_in_order():
+    order = []
+    stages = [
+        Stage("shadow", lambda inputs: order.append(("shadow", sorted(inputs))) or {}, ("base",)),
+        Stage("base", lambda inputs: order.append(("base", sorted(inputs))) or {"result_url": "u"}),
+    ]
+    results, errors = run_stages(stages)
+    assert errors == {}
+    assert order == [("base", []), ("shadow", ["base"])]
+
+
+def test_failed_dependency_skips_dependents():
+    def fail(inputs):
+        raise RuntimeError("boom")
+
+    outcomes = {r.name: r for r in iter_stages([Stage("base", fail), Stage("shadow", lambda i: {}, ("base",))])}
+    assert outcomes["shadow"].status == SKIPPED
+
+
+def test_timed_out_stage_is_cancelled():
+    token = CancelToken()
+    stopped = threading.Event()
+
+    def slow(inputs):
+        token.wait(5)
+        stopped.set()
+        raise Cancelled(token.reason)
+
+    fast = Stage("fast", lambda inputs: {"ok": True}, cancel=CancelToken())
+    outcomes = {r.name: r for r in iter_stages([Stage("slow", slow, timeout=0.1, cancel=token), fast])}
+    assert outcomes["slow"].status == TIMED_OUT
+    assert outcomes["fast"].status == DONE
+    assert stopped.wait(1)
+    assert token.reason == "timed out"
+    assert not fast.cancel.cancelled
+
+
+def test_stage_tokens_are_children_of_the_ad_set_token():
+    parent = CancelToken()
+    stages = build_stages("key", b"image", None, {"create_packshot": True, "add_shadow": True}, parent)
+    assert [stage.name for stage in stages] == ["packshot", "shadow"]
+    assert stages[0].cancel is not stages[1].cancel
+    stages[0].cancel.cancel("timed out")
+    assert not parent.cancelled and not stages[1].cancel.cancelled
+    parent.cancel("interrupted")
+    assert stages[1].cancel.reason == "interrupted"
+
+
+def test_cancelled_token_stops_remaining_stages():
+    token = CancelToken()
+    token.cancel("interrupted")
+    outcomes = list(iter_stages([Stage("base", lambda inputs: {})], cancel=token))
+    assert [r.status for r in outcomes] == [CANCELLED]
+
+
+def test_stage_tokens_are_detached_once_the_run_is_over():
+    parent = CancelToken()
+    stages = [Stage("base", lambda inputs: {}, cancel=CancelToken(parent=parent))]
+    run_stages(stages, cancel=parent)
+    assert parent._callbacks == {}
+
+
+def test_sku_is_sent_with_product_stages(monkeypatch):
+    import workflows.generate_ad_set as ad_set
+    calls = {}
+
+    def fake(name):
+        def call(**kwargs):
+            calls[name] = kwargs.get("sku")
+            return {"result_url": "u"}
+        return call
+
+    for name in ("create_packshot", "add_shadow", "lifestyle_shot_by_text"):
+        monkeypatch.setattr(ad_set, name, fake(name))
+    config = {"create_packshot": True, "add_shadow": True, "lifestyle_shot": True,
+              "scene_description": "on a beach", "sku": "SKU-1"}
+    results, errors = run_stages(build_stages("key", b"image", None, config))
+    assert errors == {}
+    assert calls == {"create_packshot": "SKU-1", "add_shadow": "SKU-1", "lifestyle_shot_by_text": "SKU-1"}
@@ -0,0 +1,67 @@
+"""Tests for services.hedging."""
+import time
+
+import pytest
+import requests
+
+from benchmarks.harness import mock_api
+from services import generate_hd_image, hedging, metrics
+from tools.mock_bria import MockConfig
+
+HD = "/v1/text-to-image/hd/2.2"
+
+
+def upstream_calls(base: str, path: str) -> int:
+    return sum(requests.get(f"{base}/__stats").json().get(path, {}).values())
+
+
+@pytest.fixture
+def hedge():
+    metrics.reset()
+    yield hedging.configure
+    hedging.configure(enabled=False, budget=0.1, min_samples=20)
+    metrics.reset()
+
+
+def test_only_repeatable_calls_are_eligible(hedge):
+    hedge(enabled=True)
+    assert hedging.is_eligible(HD, {"prompt": "p", "seed": 1})
+    assert not hedging.is_eligible(HD, {"prompt": "p"})
+    assert not hedging.is_eligible(HD, {"prompt": "p", "seed": 1, "sync": False})
+    assert not hedging.is_eligible("/v1/product/lifestyle_shot_by_text", {"seed": 1})
+    hedge(enabled=False)
+    assert not hedging.is_eligible(HD, {"prompt": "p", "seed": 1})
+
+
+def test_no_hedging_before_min_samples(hedge):
+    hedge(enabled=True, min_samples=3)
+    metrics.observe("latency_seconds", HD, 1.0)
+    delays = [hedging.hedge_delay(HD, {"prompt": "p", "seed": 1}) for _ in range(4)]
+    assert delays == [None, None, None, 1.0]
+
+
+def test_budget_caps_hedges(hedge):
+    hedge(enabled=True, min_samples=0, budget=0.1)
+    metrics.observe("latency_seconds", HD, 1.0)
+    allowed = []
+    for _ in range(30):
+        hedging.hedge_delay(HD, {"prompt": "p", "seed": 1})
+        allowed.append(hedging.try_spend(HD))
+    assert sum(allowed) == 3
+    assert allowed.index(True) == 9
+    assert metrics.get_counter("hedges_sent", HD) == 3
+    assert metrics.get_counter("hedges_over_budget", HD) == 27
+
+
+def test_budget_caps_duplicate_requests(hedge):
+    with mock_api(MockConfig(latency={"*": "fixed:0.2"}, seed=0)) as base:
+        hedge(enabled=True, min_samples=0, budget=0.25, quantile=0.5)
+        # Every call is slower than the observed median, so each one wants a hedge.
+        for _ in range(50):
+            metrics.observe("latency_seconds", HD, 0.01)
+        for seed in range(8):
+            generate_hd_image("a cup", "key", seed=seed)
+        assert metrics.get_counter("hedges_sent", HD) == 2
+        # The mock counts a request when it answers; let the abandoned legs finish.
+        time.sleep(0.3)
+        assert upstream_calls(base, HD) == 10
@@ -0,0 +1,168 @@
+"""Tests for services.job_queue."""
+import threading
+import time
+
+import pytest
+
+from services.cancellation import Cancelled, CancelToken
+from services.job_queue import BATCH, CANCELLED, DONE, FAILED, INTERACTIVE, QUEUED, RUNNING, JobQueue
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(workers=1)
+    yield queue
+    queue.shutdown()
+
+
+def blocked(queue, user="blocker"):
+    """Occupy the single worker until the returned event is set."""
+    release = threading.Event()
+    job_id = queue.submit(release.wait, args=(5,), user=user)
+    wait_for(lambda: queue.status(job_id) == RUNNING)
+    return release
+
+
+def test_users_take_turns(queue):
+    order = []
+    release = blocked(queue, user="a")
+    ids = [queue.submit(order.append, args=(f"a{n}",), user="a") for n in range(3)]
+    ids.append(queue.submit(order.append, args=("b0",), user="b"))
+    release.set()
+    wait_for(lambda: all(queue.status(job_id) == DONE for job_id in ids))
+    assert order == ["b0", "a0", "a1", "a2"]
+
+
+def test_interactive_before_batch(queue):
+    order = []
+    release = blocked(queue)
+    batch = queue.submit(order.append, args=("batch",), user="u", priority=BATCH)
+    interactive = queue.submit(order.append, args=("interactive",), user="u", priority=INTERACTIVE)
+    assert queue.position(batch) == 1
+    assert queue.position(interactive) == 0
+    release.set()
+    wait_for(lambda: queue.status(batch) == DONE)
+    assert order == ["interactive", "batch"]
+
+
+def test_max_per_user():
+    queue = JobQueue(workers=2, max_per_user=1)
+    try:
+        release = threading.Event()
+        first = queue.submit(release.wait, args=(5,), user="a")
+        second = queue.submit(release.wait, args=(5,), user="a")
+        other = queue.submit(lambda: "ok", user="b")
+        wait_for(lambda: queue.status(other) == DONE)
+        assert queue.status(first) == RUNNING
+        assert queue.status(second) == QUEUED
+        release.set()
+        wait_for(lambda: queue.status(second) == DONE)
+    finally:
+        queue.shutdown()
+
+
+def test_cancel_queued_job(queue):
+    ran = []
+    release = blocked(queue)
+    token = CancelToken()
+    job_id = queue.submit(ran.append, args=("x",), user="u", cancel=token)
+    assert queue.cancel(job_id, reason="superseded")
+    release.set()
+    job = queue.get(job_id)
+    assert job.status == CANCELLED
+    assert job.finished_at is not None
+    assert token.reason == "superseded"
+    time.sleep(0.05)
+    assert ran == []
+
+
+def test_cancel_running_job(queue):
+    token = CancelToken()
+
+    def work(cancel):
+        cancel.wait(5)
+        raise Cancelled(cancel.reason)
+
+    job_id = queue.submit(work, kwargs={"cancel": token}, user="u", cancel=token)
+    wait_for(lambda: queue.status(job_id) == RUNNING)
+    assert queue.cancel(job_id)
+    wait_for(lambda: queue.get(job_id).done)
+    assert queue.status(job_id) == CANCELLED
+
+
+def test_token_cancelled_job_never_starts(queue):
+    ran = []
+    release = blocked(queue)
+    token = CancelToken()
+    job_id = queue.submit(ran.append, args=("x",), user="u", cancel=token)
+    token.cancel()
+    release.set()
+    wait_for(lambda: queue.get(job_id).done)
+    assert queue.status(job_id) == CANCELLED
+    assert ran == []
+
+
+def test_failure_is_recorded(queue):
+    def fail():
+        raise ValueError("bad input")
+
+    job_id = queue.submit(fail, user="u")
+    wait_for(lambda: queue.get(job_id).done)
+    job = queue.get(job_id)
+    assert job.status == FAILED
+    assert isinstance(job.error, ValueError)
+    assert queue.stats()["running"] == {}
+
+
+def test_shutdown_cancels_queued_jobs():
+    queue = JobQueue(workers=1)
+    release = blocked(queue)
+    token = CancelToken()
+    job_id = queue.submit(lambda: None, user="u", cancel=token)
+    queue.shutdown()
+    release.set()
+    job = queue.get(job_id)
+    assert job.status == CANCELLED
+    assert job.finished_at is not None
+    assert token.reason == "shutdown"
+    with pytest.raises(RuntimeError):
+        queue.submit(lambda: None)
+
+
+def test_abandoned_jobs_are_cancelled():
+    queue = JobQueue(workers=1, abandon_after=0.1)
+    try:
+        release = blocked(queue, user="gone")
+        token = CancelToken()
+        job_id = queue.submit(lambda: None, user="gone", cancel=token)
+        queue.touch("gone")
+        wait_for(lambda: queue.status(job_id) == CANCELLED)
+        assert token.reason == "abandoned"
+        release.set()
+    finally:
+        queue.shutdown()
+
+
+
+def test_reaper_does_not_take_worker_wakeups():
+    # submit() wakes a single waiter on the queue's condition. The reaper
+    # used to wait there too and could take that wakeup, leaving the job
+    # queued with every worker idle; only the workers may wait on it.
+    queue = JobQueue(workers=2, abandon_after=60)
+    try:
+        wait_for(lambda: len(queue._cond._waiters) == 2)
+        time.sleep(0.05)
+        assert len(queue._cond._waiters) == 2
+        for _ in range(10):
+            job_id = queue.submit(lambda: "ok", user="u")
+            wait_for(lambda: queue.status(job_id) == DONE, timeout=1)
+    finally:
+        queue.shutdown()
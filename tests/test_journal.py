@@ -0,0 +1,95 @@
+"""Tests for workflows.journal."""
+import pytest
+
+from workflows.generate_ad_set import Stage, run_stages
+from workflows.journal import DONE, FAILED, IN_FLIGHT, Journal, config_hash, input_hash
+
+IMAGE = b"\x89PNG product"
+CONFIG = {"create_packshot": True, "add_shadow": True}
+
+
+class Service:
+    """Counts calls per stage and fails the stages listed in ``failing``."""
+
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    def stages(self):
+        return [Stage(name, self.runner(name)) for name in ("packshot", "shadow")]
+
+    def runner(self, name):
+        def run(inputs):
+            self.calls.append(name)
+            if name in self.failing:
+                raise RuntimeError(f"{name} failed")
+            return {"result_url": f"https://img/{name}"}
+        return run
+
+
+def run(journal, service, config=CONFIG):
+    return run_stages(journal.wrap(service.stages(), IMAGE, "prompt", config))
+
+
+def test_resume_requests_only_unfinished_stages(tmp_path):
+    path = str(tmp_path / "journal.sqlite")
+
+    first = Service(failing={"shadow"})
+    journal = Journal(path)
+    results, errors = run(journal, first)
+    journal.close()
+    assert set(results) == {"packshot"}
+    assert "shadow failed" in errors["shadow"]
+
+    second = Service()
+    journal = Journal(path)
+    results, errors = run(journal, second)
+    assert second.calls == ["shadow"]
+    assert errors == {}
+    assert results["packshot"] == {"result_url": "https://img/packshot"}
+    assert journal.reused == 1
+    assert journal.counts()[DONE] == 2
+    journal.close()
+
+
+def test_stages_left_in_flight_are_sent_again(tmp_path):
+    path = str(tmp_path / "journal.sqlite")
+    crashed = Journal(path)
+    inputs_key, config_key = input_hash(IMAGE, "prompt"), config_hash(CONFIG)
+    crashed.start(inputs_key, "packshot", config_key)
+    assert crashed.get(inputs_key, "packshot", config_key).state == IN_FLIGHT
+    crashed.close()
+
+    service = Service()
+    journal = Journal(path)
+    run(journal, service)
+    assert sorted(service.calls) == ["packshot", "shadow"]
+    journal.close()
+
+
+def test_failed_stage_is_recorded(tmp_path):
+    journal = Journal(str(tmp_path / "journal.sqlite"))
+    run(journal, Service(failing={"packshot"}))
+    entry = journal.get(input_hash(IMAGE, "prompt"), "packshot", config_hash(CONFIG))
+    assert entry.state == FAILED
+    assert "packshot failed" in entry.error
+    journal.close()
+
+
+def test_other_settings_or_inputs_are_not_reused(tmp_path):
+    journal = Journal(str(tmp_path / "journal.sqlite"))
+    run(journal, Service())
+    service = Service()
+    run(journal, service, dict(CONFIG, background_color="#000000"))
+    assert sorted(service.calls) == ["packshot", "shadow"]
+    journal.close()
+
+
+@pytest.mark.parametrize("runtime", [{"stage_timeout": 5.0}, {"max_workers": 2}])
+def test_config_hash_ignores_runtime_settings(runtime):
+    assert config_hash(dict(CONFIG, **runtime)) == config_hash(CONFIG)
+
+
+def test_input_hash_covers_image_and_prompt():
+    assert input_hash(IMAGE, "a") != input_hash(IMAGE, "b")
+    assert input_hash(IMAGE, "a") != input_hash(IMAGE + b"!", "a")
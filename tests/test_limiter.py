@@ -0,0 +1,117 @@
+"""Tests for services.limiter and its backends."""
+import threading
+import time
+
+import pytest
+
+from services.cancellation import Cancelled, CancelToken
+from services.limiter import Limit, MemoryBackend, RateLimiter, SQLiteBackend
+
+ENDPOINT = "/v1/tests/limiter"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    def make():
+        if request.param == "memory":
+            return MemoryBackend()
+        return SQLiteBackend(str(tmp_path / "limiter.db"))
+    return make
+
+
+def test_in_flight_cap(make_backend):
+    backend = make_backend()
+    limit = Limit(rate=0, max_in_flight=2)
+    first, _ = backend.try_acquire("k", limit)
+    second, _ = backend.try_acquire("k", limit)
+    third, wait = backend.try_acquire("k", limit)
+    assert first is not None and second is not None
+    assert third is None and wait > 0
+    assert backend.try_acquire("other", limit)[0] is not None
+    backend.release("k", first)
+    assert backend.try_acquire("k", limit)[0] is not None
+
+
+def test_token_bucket(make_backend):
+    backend = make_backend()
+    limit = Limit(rate=10, burst=2, max_in_flight=0)
+    assert backend.try_acquire("k", limit)[0] is not None
+    assert backend.try_acquire("k", limit)[0] is not None
+    lease, wait = backend.try_acquire("k", limit)
+    assert lease is None
+    assert 0 < wait <= 0.1
+    time.sleep(wait + 0.01)
+    assert backend.try_acquire("k", limit)[0] is not None
+
+
+def test_sqlite_backends_share_state(tmp_path):
+    path = str(tmp_path / "limiter.db")
+    one, two = SQLiteBackend(path), SQLiteBackend(path)
+    limit = Limit(rate=0, max_in_flight=1)
+    lease, _ = one.try_acquire("k", limit)
+    assert lease is not None
+    assert two.try_acquire("k", limit)[0] is None
+    one.release("k", lease)
+    assert two.try_acquire("k", limit)[0] is not None
+
+
+def test_sqlite_reclaims_expired_leases(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "limiter.db"), lease_ttl=0.05)
+    limit = Limit(rate=0, max_in_flight=1)
+    assert backend.try_acquire("k", limit)[0] is not None
+    assert backend.try_acquire("k", limit)[0] is None
+    time.sleep(0.1)
+    assert backend.try_acquire("k", limit)[0] is not None
+
+
+def test_waiters_are_served_in_order(make_backend):
+    limiter = RateLimiter(default=Limit(rate=0, max_in_flight=1), backend=make_backend(), timeout=5)
+    lease = limiter.acquire("k", ENDPOINT)
+    order = []
+
+    def wait(name):
+        held = limiter.acquire("k", ENDPOINT)
+        order.append(name)
+        limiter.release("k", ENDPOINT, held)
+
+    threads = []
+    for name in ("a", "b", "c"):
+        thread = threading.Thread(target=wait, args=(name,))
+        thread.start()
+        threads.append(thread)
+        # Let each caller join the queue before the next one.
+        while limiter.stats()[ENDPOINT]["queued"] < len(threads):
+            time.sleep(0.005)
+    limiter.release("k", ENDPOINT, lease)
+    for thread in threads:
+        thread.join(5)
+    assert order == ["a", "b", "c"]
+    assert limiter.stats()[ENDPOINT] == {"queued": 0, "in_flight": 0}
+
+
+def test_timeout(make_backend):
+    limiter = RateLimiter(default=Limit(rate=0, max_in_flight=1), backend=make_backend(), timeout=0.1)
+    limiter.acquire("k", ENDPOINT)
+    with pytest.raises(TimeoutError):
+        limiter.acquire("k", ENDPOINT)
+    assert limiter.stats()[ENDPOINT]["queued"] == 0
+
+
+def test_cancel_leaves_the_queue(make_backend):
+    limiter = RateLimiter(default=Limit(rate=0, max_in_flight=1), backend=make_backend(), timeout=5)
+    limiter.acquire("k", ENDPOINT)
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel, args=("superseded",)).start()
+    started = time.monotonic()
+    with pytest.raises(Cancelled, match="superseded"):
+        limiter.acquire("k", ENDPOINT, cancel=token)
+    assert time.monotonic() - started < 1
+    assert limiter.stats()[ENDPOINT]["queued"] == 0
+
+
+def test_keys_do_not_block_each_other(make_backend):
+    limiter = RateLimiter(default=Limit(rate=0, max_in_flight=1), backend=make_backend(), timeout=0.5)
+    limiter.acquire("k1", ENDPOINT)
+    lease = limiter.acquire("k2", ENDPOINT)
+    assert lease is not None
+    assert limiter.stats()[ENDPOINT]["in_flight"] == 2
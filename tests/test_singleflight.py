@@ -0,0 +1,82 @@
+"""Tests for services.singleflight."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from benchmarks.harness import mock_api, sample_image
+from services import Cancelled, CancelToken, create_packshot, singleflight
+from tools.mock_bria import MockConfig
+
+PACKSHOT = "/v1/product/packshot"
+
+
+def upstream_calls(base: str, path: str) -> int:
+    return sum(requests.get(f"{base}/__stats").json().get(path, {}).values())
+
+
+def test_concurrent_identical_calls_make_one_request():
+    image = sample_image(64)
+    with mock_api(MockConfig(latency={"*": "fixed:0.3"}, seed=0)) as base:
+        singleflight.set_enabled(True)
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(lambda _: create_packshot("key", image), range(8)))
+        finally:
+            singleflight.set_enabled(False)
+        assert upstream_calls(base, PACKSHOT) == 1
+    assert all(result == results[0] for result in results)
+    # Every caller gets its own copy.
+    assert len({id(result) for result in results}) == 8
+    assert singleflight.in_flight() == 0
+
+
+def test_calls_with_different_keys_are_not_shared():
+    singleflight.set_enabled(True)
+    try:
+        payload = {"file": b"image"}
+        assert singleflight.flight_key(PACKSHOT, "a", payload) != singleflight.flight_key(PACKSHOT, "b", payload)
+        assert singleflight.flight_key("/v1/text-to-image/hd/2.2", "a", {"prompt": "p"}) is None
+        assert singleflight.flight_key("/v1/prompt_enhancer", "a", {"prompt": "p"}) is not None
+    finally:
+        singleflight.set_enabled(False)
+
+
+def test_followers_share_the_leaders_error():
+    release = threading.Event()
+
+    def fail(token):
+        release.wait(1)
+        raise RuntimeError("upstream down")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(singleflight.do, "error-key", PACKSHOT, fail) for _ in range(3)]
+        time.sleep(0.1)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="upstream down"):
+                future.result()
+
+
+def test_flight_is_cancelled_only_when_every_caller_left():
+    started = threading.Event()
+    tokens = [CancelToken(), CancelToken()]
+
+    def call(token):
+        started.set()
+        token.wait(0.5)
+        token.raise_if_cancelled()
+        return {"ok": True}
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(singleflight.do, "cancel-key", PACKSHOT, call, tokens[0])
+        started.wait(1)
+        follower = pool.submit(singleflight.do, "cancel-key", PACKSHOT, call, tokens[1])
+        time.sleep(0.1)
+        tokens[1].cancel("closed tab")
+        with pytest.raises(Cancelled):
+            follower.result()
+        assert leader.result() == ({"ok": True}, False)
+    assert tokens[0]._callbacks == {} and tokens[1]._callbacks == {}
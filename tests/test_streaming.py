@@ -0,0 +1,57 @@
+"""Tests for services.streaming."""
+import asyncio
+import json
+import os
+
+import pytest
+
+from services.image import ImageHandle
+from services.streaming import JSONStreamBody
+
+
+def expected(payload):
+    return json.dumps(payload, default=lambda value: value.b64).encode('utf-8')
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 4, 5, 30, 31, 32, 33])
+@pytest.mark.parametrize("chunk_size", [3, 6, 30])
+def test_body_matches_json_dumps(size, chunk_size):
+    payload = {"file": ImageHandle(os.urandom(size)), "sync": True, "prompt": "a \"quoted\" café"}
+    body = JSONStreamBody(payload, chunk_size=chunk_size)
+    data = b"".join(body)
+    assert data == expected(payload)
+    assert len(body) == len(data)
+
+
+def test_images_at_any_depth():
+    payload = {
+        "ref_images": [ImageHandle(b"first"), {"mask": ImageHandle(b"second!")}],
+        "num_results": 4,
+    }
+    body = JSONStreamBody(payload, chunk_size=3)
+    assert b"".join(body) == expected(payload)
+    assert len(body) == len(body.to_bytes())
+
+
+def test_body_can_be_sent_again():
+    body = JSONStreamBody({"file": ImageHandle(os.urandom(100))}, chunk_size=9)
+    assert b"".join(body) == b"".join(body)
+
+
+def test_async_chunks_match():
+    body = JSONStreamBody({"file": ImageHandle(os.urandom(50))}, chunk_size=12)
+
+    async def collect():
+        return [chunk async for chunk in body.aiter_chunks()]
+
+    assert b"".join(asyncio.run(collect())) == body.to_bytes()
+
+
+def test_chunk_size_must_be_a_multiple_of_three():
+    with pytest.raises(ValueError):
+        JSONStreamBody({}, chunk_size=4)
+
+
+def test_rejects_unserializable_values():
+    with pytest.raises(TypeError):
+        JSONStreamBody({"file": object()})
@@ -0,0 +1,48 @@
+"""Tests for the retry policy of services.transport."""
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from services import transport
+from services.transport import TransportConfig, _reached_server, may_resend
+
+CONFIG = TransportConfig(max_retries=2)
+
+
+def test_failed_connect_never_reached_server():
+    refused = MaxRetryError(None, "/v1/prompt_enhancer", NewConnectionError(None, "Connection refused"))
+    assert not _reached_server(requests.exceptions.ConnectionError(refused))
+    assert not _reached_server(requests.exceptions.ConnectTimeout("connect timed out"))
+
+
+def test_reset_after_sending_may_have_reached_server():
+    reset = ProtocolError("Connection aborted.", ConnectionResetError(104, "Connection reset by peer"))
+    assert _reached_server(requests.exceptions.ConnectionError(reset))
+
+
+@pytest.mark.parametrize("endpoint, json, reached_server, expected", [
+    ("/v1/text-to-image/hd/2.2", {"prompt": "a cup"}, False, True),
+    ("/v1/text-to-image/hd/2.2", {"prompt": "a cup"}, True, False),
+    ("/v1/text-to-image/hd/2.2", {"prompt": "a cup", "seed": 1}, True, True),
+    ("/v1/text-to-image/hd/2.2", {"prompt": "a cup", "seed": 1, "sync": False}, True, False),
+    ("/v1/product/packshot", {"file": "abc"}, True, True),
+])
+def test_may_resend(endpoint, json, reached_server, expected):
+    assert may_resend(endpoint, json, reached_server, 0, CONFIG) is expected
+
+
+def test_may_resend_stops_at_max_retries():
+    assert not may_resend("/v1/product/packshot", {}, False, 2, CONFIG)
+
+
+def test_reset_is_not_retried_for_unseeded_generation(monkeypatch):
+    calls = []
+
+    def reset(*args, **kwargs):
+        calls.append(1)
+        raise requests.exceptions.ConnectionError(ProtocolError("Connection aborted."))
+
+    monkeypatch.setattr(transport.get_session(), "post", reset)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        transport.post("http://localhost/v1/text-to-image/hd/2.2", {}, {"prompt": "a cup"})
+    assert len(calls) == 1
@@ -0,0 +1,420 @@
+"""
+Local stand-in for the Bria API, for offline development and load testing.
+
+Implements every endpoint the ``services`` package calls, with configurable
+latency, injected errors and 429s, sync and async (placeholder URL) modes,
+and generated placeholder images served from the same process. Point the
+app or any script at it with ``BRIA_API_BASE_URL``::
+
+    python -m tools.mock_bria --port 8765 --latency-scale 0.1
+    BRIA_API_BASE_URL=http://127.0.0.1:8765 streamlit run app.py
+
+Latency specs are ``fixed:S``, ``uniform:LOW,HIGH``, ``lognormal:MEDIAN,SIGMA``
+or ``normal:MEAN,STDDEV`` (seconds) and can be set per endpoint, e.g.
+``--latency /v1/gen_fill=lognormal:6,0.5``. Error and throttle rates accept
+either a plain fraction or ``PATH=FRACTION``.
+
+``GET /__stats`` returns request counts per endpoint and status.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+import argparse
+import colorsys
+import hashlib
+import io
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image, ImageDraw, ImageOps
+
+# Default latency per endpoint prefix, roughly matching production.
+DEFAULT_LATENCY = {
+    "/v1/text-to-image/hd": "lognormal:6.0,0.35",
+    "/v1/product/packshot": "lognormal:3.0,0.3",
+    "/v1/product/shadow": "lognormal:3.0,0.3",
+    "/v1/product/lifestyle_shot_by_text": "lognormal:8.0,0.35",
+    "/v1/product/lifestyle_shot_by_image": "lognormal:8.0,0.35",
+    "/v1/gen_fill": "lognormal:5.0,0.35",
+    "/v1/erase_foreground": "lognormal:2.5,0.3",
+    "/v1/prompt_enhancer": "lognormal:1.0,0.3",
+}
+
+# Endpoints that return several images.
+MULTI_RESULT = ("/v1/text-to-image/hd", "/v1/product/lifestyle_shot", "/v1/gen_fill")
+
+# Payload fields each endpoint rejects the call without; "a|b" accepts either.
+REQUIRED_FIELDS = {
+    "/v1/text-to-image/hd": ("prompt",),
+    "/v1/product/packshot": ("file|image_url",),
+    "/v1/product/shadow": ("file|image_url",),
+    "/v1/product/lifestyle_shot_by_text": ("file|image_url", "scene_description"),
+    "/v1/product/lifestyle_shot_by_image": ("file|image_url", "ref_image_file|ref_image_url"),
+    "/v1/gen_fill": ("file|image_url", "mask_file|mask_url", "prompt"),
+    "/v1/erase_foreground": ("file|image_url",),
+    "/v1/prompt_enhancer": ("prompt",),
+}
+
+ASPECT_RATIOS = {
+    "1:1": (1, 1), "2:3": (2, 3), "3:2": (3, 2), "3:4": (3, 4),
+    "4:3": (4, 3), "4:5": (4, 5), "5:4": (5, 4), "9:16": (9, 16), "16:9": (16, 9),
+}
+
+# Images kept for download before the oldest are dropped.
+MAX_IMAGES = 4096
+
+
+def parse_latency(spec: str) -> Tuple[str, Tuple[float, ...]]:
+    """Parse a latency spec such as ``lognormal:2.0,0.4``."""
+    kind, _, args = spec.partition(":")
+    values = tuple(float(value) for value in args.split(",") if value)
+    expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "normal": 2}
+    if kind not in expected or len(values) != expected[kind]:
+        raise ValueError(f"Invalid latency spec: {spec!r}")
+    return kind, values
+
+
+def sample_latency(spec: Tuple[str, Tuple[float, ...]], rng: random.Random) -> float:
+    kind, values = spec
+    if kind == "fixed":
+        return values[0]
+    if kind == "uniform":
+        return rng.uniform(*values)
+    if kind == "lognormal":
+        median, sigma = values
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+    return max(0.0, rng.gauss(*values))
+
+
+@dataclass
+class MockConfig:
+    """Behaviour of the mock server."""
+    latency: Dict[str, str] = field(default_factory=lambda: dict(DEFAULT_LATENCY))
+    latency_scale: float = 1.0
+    error_rate: Dict[str, float] = field(default_factory=dict)
+    throttle_rate: Dict[str, float] = field(default_factory=dict)
+    retry_after: float = 1.0
+    async_delay: float = 5.0
+    image_size: int = 512
+    require_key: bool = True
+    seed: Optional[int] = None
+
+    def rate(self, rates: Dict[str, float], path: str) -> float:
+        return _match(rates, path, rates.get("*", 0.0))
+
+    def latency_for(self, path: str) -> Tuple[str, Tuple[float, ...]]:
+        return parse_latency(_match(self.latency, path, self.latency.get("*", "fixed:0")))
+
+
+def _match(table: Dict[str, Any], path: str, default: Any) -> Any:
+    # Longest matching prefix wins, so versioned paths pick up their base entry.
+    matches = [prefix for prefix in table if prefix != "*" and path.startswith(prefix)]
+    return table[max(matches, key=len)] if matches else default
+
+
+@lru_cache(maxsize=256)
+def render_image(label: str, key: str, width: int, height: int) -> bytes:
+    """Render a deterministic gradient placeholder image as PNG."""
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    hue = digest[0] / 255
+    dark = tuple(int(c * 255) for c in colorsys.hsv_to_rgb(hue, 0.6, 0.35))
+    light = tuple(int(c * 255) for c in colorsys.hsv_to_rgb((hue + 0.15) % 1, 0.35, 0.95))
+    gradient = Image.linear_gradient("L").rotate(digest[1] % 360).resize((width, height))
+    img = ImageOps.colorize(gradient, dark, light)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([8, 8, width - 9, height - 9], outline=light, width=3)
+    draw.text((20, 20), f"MOCK {label}", fill=(255, 255, 255))
+    draw.text((20, 36), key[:16], fill=(255, 255, 255))
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+class MockState:
+    """Images issued so far and request statistics."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.images: "OrderedDict[str, Tuple[float, str, str, int, int]]" = OrderedDict()
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def add_image(self, ready_at: float, label: str, key: str, width: int, height: int) -> str:
+        image_id = uuid.uuid4().hex
+        with self.lock:
+            self.images[image_id] = (ready_at, label, key, width, height)
+            while len(self.images) > MAX_IMAGES:
+                self.images.popitem(last=False)
+        return image_id
+
+    def count(self, path: str, status: int) -> None:
+        with self.lock:
+            self.stats[path][str(status)] += 1
+
+    def random(self) -> float:
+        with self.lock:
+            return self.rng.random()
+
+    def latency(self, path: str) -> float:
+        spec = self.config.latency_for(path)
+        with self.lock:
+            return sample_latency(spec, self.rng) * self.config.latency_scale
+
+
+def _output_size(payload: Dict[str, Any], base: int) -> Tuple[int, int]:
+    if payload.get("shot_size"):
+        width, height = payload["shot_size"][:2]
+        scale = base / max(width, height)
+        return max(1, int(width * scale)), max(1, int(height * scale))
+    ratio_w, ratio_h = ASPECT_RATIOS.get(payload.get("aspect_ratio", "1:1"), (1, 1))
+    if ratio_w >= ratio_h:
+        return base, int(base * ratio_h / ratio_w)
+    return int(base * ratio_w / ratio_h), base
+
+
+def _request_key(path: str, payload: Dict[str, Any]) -> str:
+    # Same seed and inputs give the same image, like the real deterministic endpoints.
+    material = json.dumps({"path": path, "payload": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def build_response(
+    state: MockState,
+    path: str,
+    payload: Dict[str, Any],
+    base_url: str
+) -> Dict[str, Any]:
+    """Build the JSON body for a successful call."""
+    if path.startswith("/v1/prompt_enhancer"):
+        prompt = payload.get("prompt", "")
+        return {"prompt variations": f"{prompt}, highly detailed, soft studio lighting, 85mm photograph"}
+
+    sync = payload.get("sync", True) is not False
+    ready_at = time.time() + (0 if sync else state.config.async_delay * state.config.latency_scale)
+    width, height = _output_size(payload, state.config.image_size)
+    label = path.rsplit("/", 1)[-1] if not path.startswith("/v1/text-to-image") else "hd"
+    key = _request_key(path, payload)
+    count = max(1, min(int(payload.get("num_results", 1)), 4)) if path.startswith(MULTI_RESULT) else 1
+
+    urls, rows = [], []
+    for index in range(count):
+        image_id = state.add_image(ready_at, label, f"{key}:{index}", width, height)
+        url = f"{base_url}/images/{image_id}.png"
+        urls.append(url)
+        rows.append({"urls": [url], "seed": payload.get("seed", index), "uuid": image_id})
+
+    if path.startswith(MULTI_RESULT):
+        return {"result_urls": urls, "result": rows}
+    return {"result_url": urls[0]}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "MockBria/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _base_url(self) -> str:
+        return f"http://{self.headers.get('Host') or '%s:%d' % self.server.server_address[:2]}"
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        config = self.state.config
+
+        if not path.startswith(tuple(REQUIRED_FIELDS)):
+            self.state.count(path, 404)
+            self._send_json(404, {"error": f"Unknown endpoint {path}"})
+            return
+        if config.require_key and not self.headers.get("api_token"):
+            self.state.count(path, 401)
+            self._send_json(401, {"error": "Missing api_token header"})
+            return
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self.state.count(path, 400)
+            self._send_json(400, {"error": "Body is not valid JSON"})
+            return
+        required = _match(REQUIRED_FIELDS, path, ())
+        missing = [
+            name for name in required
+            if not any(payload.get(option) for option in name.split("|"))
+        ]
+        if missing:
+            self.state.count(path, 400)
+            self._send_json(400, {"error": f"Missing required fields: {', '.join(missing)}"})
+            return
+
+        if self.state.random() < config.rate(config.throttle_rate, path):
+            self.state.count(path, 429)
+            self._send_json(429, {"error": "Too many requests"}, {"Retry-After": f"{config.retry_after:g}"})
+            return
+        time.sleep(self.state.latency(path))
+        if self.state.random() < config.rate(config.error_rate, path):
+            status = (500, 502, 503)[int(self.state.random() * 3)]
+            self.state.count(path, status)
+            self._send_json(status, {"error": "Injected failure"})
+            return
+
+        response = build_response(self.state, path, payload, self._base_url())
+        self.state.count(path, 200)
+        self._send_json(200, response)
+
+    def _image(self, head: bool) -> None:
+        image_id = self.path.split("?")[0].rsplit("/", 1)[-1].split(".")[0]
+        with self.state.lock:
+            entry = self.state.images.get(image_id)
+        if entry is None or entry[0] > time.time():
+            # Placeholders of async calls 404 until the image is "rendered".
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        _, label, key, width, height = entry
+        data = render_image(label, key, width, height)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.startswith("/images/"):
+            self._image(head=False)
+        elif self.path.startswith("/__stats"):
+            with self.state.lock:
+                stats = {path: dict(codes) for path, codes in self.state.stats.items()}
+            self._send_json(200, stats)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_HEAD(self):
+        if self.path.startswith("/images/"):
+            self._image(head=True)
+        else:
+            # Connection warm-up probes.
+            self.send_response(405)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: MockConfig, verbose: bool = False):
+        super().__init__(address, MockHandler)
+        self.state = MockState(config)
+        self.verbose = verbose
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_in_thread(
+    config: Optional[MockConfig] = None,
+    host: str = "127.0.0.1",
+    port: int = 0
+) -> MockServer:
+    """
+    Start a mock server on a daemon thread; ``port`` 0 picks a free port.
+
+    Returns:
+        The running server; use ``server.base_url`` and ``server.shutdown()``
+    """
+    server = MockServer((host, port), config or MockConfig())
+    threading.Thread(target=server.serve_forever, name="mock-bria", daemon=True).start()
+    return server
+
+
+def _rates(values: List[str]) -> Dict[str, float]:
+    rates = {}
+    for value in values or []:
+        path, _, rate = value.rpartition("=")
+        rates[path or "*"] = float(rate)
+    return rates
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Bria API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", action="append", default=[],
+                        help="Latency spec, optionally PATH=SPEC (repeatable)")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiply every sampled latency (e.g. 0.01 for load tests)")
+    parser.add_argument("--error-rate", action="append", default=[],
+                        help="Fraction of 5xx responses, optionally PATH=FRACTION (repeatable)")
+    parser.add_argument("--throttle-rate", action="append", default=[],
+                        help="Fraction of 429 responses, optionally PATH=FRACTION (repeatable)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with 429s")
+    parser.add_argument("--async-delay", type=float, default=5.0,
+                        help="Seconds before sync=False placeholder images become available")
+    parser.add_argument("--image-size", type=int, default=512, help="Longest side of generated images")
+    parser.add_argument("--no-auth", action="store_true", help="Accept requests without api_token")
+    parser.add_argument("--seed", type=int, help="Seed for latency and failure sampling")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+
+    latency = dict(DEFAULT_LATENCY)
+    overrides = {}
+    for value in args.latency:
+        path, _, spec = value.rpartition("=")
+        parse_latency(spec)
+        overrides[path or "*"] = spec
+    if "*" in overrides:
+        # A global spec replaces the per-endpoint defaults.
+        latency = {}
+    latency.update(overrides)
+
+    config = MockConfig(
+        latency=latency,
+        latency_scale=args.latency_scale,
+        error_rate=_rates(args.error_rate),
+        throttle_rate=_rates(args.throttle_rate),
+        retry_after=args.retry_after,
+        async_delay=args.async_delay,
+        image_size=args.image_size,
+        require_key=not args.no_auth,
+        seed=args.seed
+    )
+    server = MockServer((args.host, args.port), config, verbose=args.verbose)
+    print(f"Mock Bria API listening on {server.base_url}")
+    print(f"Use it with: BRIA_API_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
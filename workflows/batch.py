@@ -0,0 +1,487 @@
+"""
+Headless batch runner: generate ad sets for a whole catalog.
+
+    python -m workflows.batch products/ --packshot --shadow --output out/
+    python -m workflows.batch catalog.csv --workers 8 --set background_color=#F5F5F5
+    python -m workflows.batch catalog.jsonl --lifestyle --download
+
+The input is either a directory of product images (the file name is the
+SKU) or a manifest. CSV manifests have ``image``, ``sku``, ``prompt`` and
+``config`` columns, where ``config`` holds a JSON object and any other
+column named after a setting (e.g. ``background_color``) overrides it for
+that row. JSONL manifests have one object per line with the same keys.
+Rows without an image generate their base image from ``prompt``.
+
+Items are processed by a pool of workers, each running ``generate_ad_set``
+with the settings of ``workflows.config`` merged with the command-line and
+row overrides, and the row's SKU. Lifestyle shots use the row's prompt when
+no ``scene_description`` is set; a batch with items that have neither is
+rejected before any request is made. Every item gets a folder holding its responses (and, with
+``--download``, its result images); ``summary.json`` reports the outcome of
+each item and the totals. Streamlit is never imported.
+
+Stages are journaled (``workflows.journal``) in ``journal.sqlite`` of the
+output folder, so rerunning an interrupted batch with the same output folder
+only requests the stages that failed or never finished. Interrupting a batch
+(Ctrl+C) cancels the requests still in flight instead of waiting for them.
+"""
+from typing import Dict, Any, Callable, List, Optional, Sequence
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+from services import transport, CancelToken
+from services.jobs import result_urls
+
+from .config import DEFAULT_CONFIG, RUNTIME_SETTINGS, default_config, parse_value
+from .generate_ad_set import generate_ad_set
+from .journal import Journal
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+OK = "ok"
+PARTIAL = "partial"
+FAILED = "failed"
+
+
+@dataclass
+class BatchItem:
+    """
+    One catalog entry to produce an ad set for.
+
+    Args:
+        id: Unique name, used as the item's output folder (letters, digits,
+            ``.``, ``_`` and ``-`` only; see ``safe_id``)
+        image: Path of the product image (None to generate it from ``prompt``)
+        sku: Product SKU
+        prompt: Prompt for HD generation
+        config: Settings overriding the batch defaults for this item
+    """
+    id: str
+    image: Optional[str] = None
+    sku: Optional[str] = None
+    prompt: Optional[str] = None
+    config: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one item."""
+    item: BatchItem
+    status: str
+    responses: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+    files: List[str] = field(default_factory=list)
+
+
+def safe_id(value: str) -> str:
+    """
+    Turn a SKU or file name into an item id that is safe as a folder name.
+
+    Path separators and other characters outside letters, digits, ``.``,
+    ``_`` and ``-`` become ``_``; leading dots are dropped, so ids such as
+    ``../x`` cannot leave the output folder.
+    """
+    cleaned = re.sub(r"[^A-Za-z0-9._-]+", "_", str(value)).lstrip(".")
+    return cleaned or "item"
+
+
+def check_ids(items: Sequence[BatchItem]) -> None:
+    """Raise ValueError unless every item id is a safe, unique folder name."""
+    seen = set()
+    for item in items:
+        if item.id != safe_id(item.id):
+            raise ValueError(f"Item id {item.id!r} is not a safe folder name (try {safe_id(item.id)!r})")
+        if item.id in seen:
+            raise ValueError(f"Duplicate item id {item.id!r}")
+        seen.add(item.id)
+
+
+def item_settings(item: BatchItem, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merge the batch settings with an item's own, as ``generate_ad_set`` gets them.
+
+    Args:
+        item: Catalog entry
+        config: Batch settings; the item's own settings take precedence
+
+    Returns:
+        The item's settings, with its SKU and, for lifestyle shots without a
+        scene description, its prompt as the scene
+
+    Raises:
+        ValueError: If a lifestyle shot has no scene description and no prompt
+    """
+    settings = dict(config)
+    settings.update(item.config)
+    if item.sku:
+        settings["sku"] = item.sku
+    if settings.get("lifestyle_shot") and not settings.get("scene_description"):
+        if not item.prompt:
+            raise ValueError(
+                f"Item {item.id!r} needs a scene description for its lifestyle shot: "
+                f"set scene_description (--set or a manifest column) or give it a prompt"
+            )
+        settings["scene_description"] = item.prompt
+    return settings
+
+
+def check_settings(items: Sequence[BatchItem], config: Dict[str, Any]) -> None:
+    """Raise ValueError, naming the first bad item, unless every item's settings are usable."""
+    for item in items:
+        item_settings(item, config)
+
+
+def _row_item(row: Dict[str, Any], index: int, base_dir: str) -> BatchItem:
+    row = {key.strip(): value for key, value in row.items() if key}
+    config = row.pop("config", None) or {}
+    if isinstance(config, str):
+        config = json.loads(config)
+    for key, value in row.items():
+        if (key in DEFAULT_CONFIG or key in RUNTIME_SETTINGS) and value not in (None, ""):
+            config[key] = parse_value(key, value) if isinstance(value, str) else value
+
+    image = row.get("image") or None
+    if image and not os.path.isabs(image):
+        image = os.path.join(base_dir, image)
+    sku = row.get("sku") or None
+    prompt = row.get("prompt") or None
+    if not (image or prompt):
+        raise ValueError(f"Row {index + 1} has neither an image nor a prompt")
+
+    name = sku or (os.path.splitext(os.path.basename(image))[0] if image else f"item-{index + 1}")
+    return BatchItem(id=safe_id(name), image=image, sku=sku, prompt=prompt, config=config)
+
+
+def load_items(source: str) -> List[BatchItem]:
+    """
+    Read the catalog from a directory of images or a CSV/JSONL manifest.
+
+    Args:
+        source: Directory, ``.csv`` or ``.jsonl`` file
+
+    Returns:
+        Items in manifest order
+
+    Raises:
+        ValueError: If the manifest is malformed or two items end up with the
+            same id (ids are the SKU or file name, made safe by ``safe_id``)
+    """
+    if os.path.isdir(source):
+        names = sorted(
+            name for name in os.listdir(source)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        items = [
+            BatchItem(id=safe_id(os.path.splitext(name)[0]), image=os.path.join(source, name),
+                      sku=os.path.splitext(name)[0])
+            for name in names
+        ]
+    else:
+        base_dir = os.path.dirname(os.path.abspath(source))
+        extension = os.path.splitext(source)[1].lower()
+        with open(source, newline="", encoding="utf-8") as f:
+            if extension == ".csv":
+                rows = list(csv.DictReader(f))
+            elif extension in (".jsonl", ".ndjson"):
+                rows = [json.loads(line) for line in f if line.strip()]
+            else:
+                raise ValueError(f"Unsupported manifest type: {source} (expected .csv or .jsonl)")
+        items = [_row_item(row, index, base_dir) for index, row in enumerate(rows)]
+
+    check_ids(items)
+    return items
+
+
+def _extension(data: bytes) -> str:
+    if data.startswith(b"\xff\xd8"):
+        return ".jpg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    return ".png"
+
+
+def _save(item_dir: str, result: BatchResult, download: bool) -> None:
+    os.makedirs(item_dir, exist_ok=True)
+    if download:
+        for stage, response in result.responses.items():
+            for index, url in enumerate(result_urls(response)):
+                try:
+                    data = transport.download(url)
+                except Exception as e:
+                    result.errors[f"{stage}.download"] = str(e)
+                    continue
+                path = os.path.join(item_dir, f"{stage}_{index + 1}{_extension(data)}")
+                with open(path, "wb") as f:
+                    f.write(data)
+                result.files.append(path)
+
+    with open(os.path.join(item_dir, "ad_set.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "id": result.item.id,
+            "sku": result.item.sku,
+            "image": result.item.image,
+            "prompt": result.item.prompt,
+            "status": result.status,
+            "elapsed": round(result.elapsed, 3),
+            "responses": result.responses,
+            "errors": result.errors,
+            "files": result.files
+        }, f, indent=2)
+
+
+def process_item(
+    api_key: str,
+    item: BatchItem,
+    config: Dict[str, Any],
+    output_dir: str,
+    download: bool = False,
+    journal: Optional[Journal] = None,
+    cancel: Optional[CancelToken] = None
+) -> BatchResult:
+    """
+    Generate and save the ad set for one item.
+
+    Args:
+        api_key: Bria AI API key
+        item: Catalog entry
+        config: Batch settings; the item's own settings take precedence
+        output_dir: Folder that receives the item's folder
+        download: Whether to save the result images as well
+        journal: Journal that finished stages are reused from
+        cancel: Token that cancels the item's stages
+
+    Returns:
+        The item's outcome; failures are reported, not raised
+    """
+    started = time.monotonic()
+    try:
+        settings = item_settings(item, config)
+        image = None
+        if item.image:
+            with open(item.image, "rb") as f:
+                image = f.read()
+        responses = generate_ad_set(
+            api_key, image=image, prompt=item.prompt, config=settings, journal=journal, cancel=cancel
+        )
+        errors = responses.pop("errors", {})
+        if not errors:
+            status = OK
+        else:
+            status = PARTIAL if responses else FAILED
+        result = BatchResult(item, status, responses, errors)
+    except Exception as e:
+        result = BatchResult(item, FAILED, errors={"item": str(e)})
+    result.elapsed = time.monotonic() - started
+
+    try:
+        _save(os.path.join(output_dir, item.id), result, download)
+    except OSError as e:
+        result.status = FAILED
+        result.errors["save"] = str(e)
+    return result
+
+
+def run_batch(
+    api_key: str,
+    items: Sequence[BatchItem],
+    config: Optional[Dict[str, Any]] = None,
+    output_dir: str = "batch_output",
+    workers: int = 4,
+    download: bool = False,
+    on_result: Optional[Callable[[BatchResult], None]] = None,
+    journal: Optional[Journal] = None,
+    cancel: Optional[CancelToken] = None
+) -> Dict[str, Any]:
+    """
+    Produce ad sets for many items with a bounded number of workers.
+
+    Each worker runs one item's stages (which are concurrent themselves); the
+    transport's limiter still caps the requests in flight across all of them.
+
+    Args:
+        api_key: Bria AI API key
+        items: Catalog entries
+        config: Batch settings (defaults to ``workflows.config.DEFAULT_CONFIG``)
+        output_dir: Folder for the per-item results and ``summary.json``
+        workers: Items processed at once
+        download: Whether to save the result images
+        on_result: Called with each item's outcome as it finishes
+        journal: Journal that makes the batch resumable
+        cancel: Token that stops the batch; it is cancelled on ``KeyboardInterrupt``
+
+    Returns:
+        The summary written to ``summary.json``
+
+    Raises:
+        ValueError: If an item id is unsafe as a folder name or not unique, or
+            an item's settings are incomplete (see ``item_settings``)
+    """
+    check_ids(items)
+    config = config if config is not None else default_config()
+    check_settings(items, config)
+    os.makedirs(output_dir, exist_ok=True)
+    started = time.monotonic()
+    outcomes: Dict[str, BatchResult] = {}
+
+    cancel = cancel if cancel is not None else CancelToken()
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch")
+    try:
+        futures = [
+            pool.submit(process_item, api_key, item, config, output_dir, download, journal, cancel)
+            for item in items
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            outcomes[result.item.id] = result
+            if on_result is not None:
+                on_result(result)
+    except KeyboardInterrupt:
+        # Drop the responses still on the wire rather than wait for them.
+        cancel.cancel("interrupted")
+        raise
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.monotonic() - started
+    ordered = [outcomes[item.id] for item in items]
+    totals = {status: 0 for status in (OK, PARTIAL, FAILED)}
+    for result in ordered:
+        totals[result.status] += 1
+    summary = {
+        "items": len(ordered),
+        "totals": totals,
+        "elapsed": round(elapsed, 3),
+        "items_per_minute": round(60 * len(ordered) / elapsed, 2) if elapsed else None,
+        "workers": workers,
+        "config": config,
+        "results": [
+            {
+                "id": result.item.id,
+                "sku": result.item.sku,
+                "status": result.status,
+                "elapsed": round(result.elapsed, 3),
+                "stages": sorted(result.responses),
+                "errors": result.errors
+            }
+            for result in ordered
+        ]
+    }
+    if journal is not None:
+        summary["journal"] = {
+            "path": journal.path,
+            "stages_reused": journal.reused,
+            "states": journal.counts()
+        }
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def _setting(value: str):
+    key, sep, text = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected KEY=VALUE, got {value!r}")
+    try:
+        return key, parse_value(key, text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate ad sets for a catalog of products")
+    parser.add_argument("source", help="Directory of product images, or a .csv/.jsonl manifest")
+    parser.add_argument("--output", default="batch_output", help="Folder for results and summary.json")
+    parser.add_argument("--workers", type=int, default=4, help="Items processed at once")
+    parser.add_argument("--packshot", action="store_true", help="Create a packshot for every item")
+    parser.add_argument("--shadow", action="store_true", help="Add a shadow for every item")
+    parser.add_argument("--lifestyle", action="store_true", help="Create a lifestyle shot for every item")
+    parser.add_argument("--set", action="append", type=_setting, default=[], metavar="KEY=VALUE",
+                        help="Override a setting, e.g. scene_description='on a beach' (repeatable)")
+    parser.add_argument("--download", action="store_true", help="Save the result images next to the responses")
+    parser.add_argument("--journal", help="Journal file for resuming (default: OUTPUT/journal.sqlite)")
+    parser.add_argument("--no-journal", action="store_true", help="Request every stage, even ones done before")
+    parser.add_argument("--api-key", help="Bria API key (default: BRIA_API_KEY)")
+    args = parser.parse_args(argv)
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    api_key = args.api_key or os.getenv("BRIA_API_KEY")
+    if not api_key:
+        parser.error("No API key: pass --api-key or set BRIA_API_KEY")
+
+    config = default_config(**dict(args.set))
+    config["create_packshot"] = config["create_packshot"] or args.packshot
+    config["add_shadow"] = config["add_shadow"] or args.shadow
+    config["lifestyle_shot"] = config["lifestyle_shot"] or args.lifestyle
+
+    try:
+        items = load_items(args.source)
+        check_settings(items, config)
+    except ValueError as e:
+        parser.error(str(e))
+    if not items:
+        print(f"No items found in {args.source}")
+        return 1
+
+    done = []
+
+    def report(result: BatchResult) -> None:
+        done.append(result)
+        line = f"[{len(done)}/{len(items)}] {result.item.id}: {result.status} ({result.elapsed:.1f}s)"
+        if result.errors:
+            line += " - " + "; ".join(f"{stage}: {error}" for stage, error in result.errors.items())
+        print(line, flush=True)
+
+    journal = None
+    if not args.no_journal:
+        os.makedirs(args.output, exist_ok=True)
+        journal = Journal(args.journal or os.path.join(args.output, "journal.sqlite"))
+    try:
+        summary = run_batch(api_key, items, config, args.output, args.workers, args.download, report, journal)
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun with the same --output to resume", flush=True)
+        return 130
+    finally:
+        if journal is not None:
+            journal.close()
+    totals = summary["totals"]
+    print(
+        f"\n{summary['items']} items in {summary['elapsed']:.1f}s: "
+        f"{totals[OK]} ok, {totals[PARTIAL]} partial, {totals[FAILED]} failed"
+    )
+    if journal is not None:
+        print(f"{summary['journal']['stages_reused']} stages reused from {journal.path}")
+    print(f"Summary written to {os.path.join(args.output, 'summary.json')}")
+    return 1 if totals[FAILED] else 0
+
+
+__all__ = [
+    'BatchItem',
+    'BatchResult',
+    'OK',
+    'PARTIAL',
+    'FAILED',
+    'safe_id',
+    'check_ids',
+    'item_settings',
+    'check_settings',
+    'load_items',
+    'process_item',
+    'run_batch',
+    'main'
+]
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
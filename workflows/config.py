@@ -0,0 +1,90 @@
+"""
+Default ad-set settings, shared by the sidebar and headless callers.
+
+Kept free of Streamlit so batch jobs can build the same configuration the
+app's sidebar produces without importing the UI.
+"""
+from typing import Dict, Any
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "create_packshot": False,
+    "add_shadow": False,
+    "lifestyle_shot": False,
+    "background_color": "#FFFFFF",
+    "shadow_type": "natural",
+    "scene_description": "",
+    "num_results": 1,
+    "aspect_ratio": "1:1",
+    "sync": True
+}
+
+# Settings without a default that still need a type: how the workflow runs
+# rather than what it produces. Both must be positive.
+RUNTIME_SETTINGS: Dict[str, type] = {
+    "stage_timeout": float,
+    "max_workers": int
+}
+
+_TRUE = ("1", "true", "yes", "on", "y")
+_FALSE = ("0", "false", "no", "off", "n", "")
+
+
+def default_config(**overrides) -> Dict[str, Any]:
+    """
+    Return a fresh copy of the default ad-set settings.
+
+    Args:
+        **overrides: Settings that replace the defaults
+
+    Returns:
+        Config dict for ``generate_ad_set``
+    """
+    config = dict(DEFAULT_CONFIG)
+    config.update(overrides)
+    return config
+
+
+def parse_value(key: str, value: str) -> Any:
+    """
+    Convert a setting given as text (CLI flag, CSV cell) to its default's type.
+
+    Args:
+        key: Setting name
+        value: Text value
+
+    Returns:
+        A bool, int or float when the default (or ``RUNTIME_SETTINGS``) has
+        that type, else the text
+
+    Raises:
+        ValueError: If the text is not a valid value of that type
+    """
+    if key in RUNTIME_SETTINGS:
+        kind = RUNTIME_SETTINGS[key]
+        try:
+            number = kind(value)
+        except ValueError:
+            raise ValueError(f"Invalid {kind.__name__} for {key}: {value!r}")
+        if number <= 0:
+            raise ValueError(f"{key} must be positive, got {value!r}")
+        return number
+
+    default = DEFAULT_CONFIG.get(key)
+    if isinstance(default, bool):
+        lowered = value.strip().lower()
+        if lowered in _TRUE:
+            return True
+        if lowered in _FALSE:
+            return False
+        raise ValueError(f"Invalid boolean for {key}: {value!r}")
+    try:
+        if isinstance(default, int):
+            return int(value)
+        if isinstance(default, float):
+            return float(value)
+    except ValueError:
+        raise ValueError(f"Invalid {type(default).__name__} for {key}: {value!r}")
+    return value
+
+
+__all__ = ['DEFAULT_CONFIG', 'RUNTIME_SETTINGS', 'default_config', 'parse_value']
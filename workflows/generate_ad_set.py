@@ -1,63 +1,419 @@
-from typing import Dict, Any, Optional
+"""
+Ad-set workflow: optional HD generation, then packshot, shadow and lifestyle.
+
+The stages form a small dependency graph. When the set starts from a prompt,
+HD generation runs first; packshot, shadow and lifestyle each need only the
+base image, so they run concurrently on a thread pool. A generated base image
+is handed to them by URL (``image_url``), so it never passes through this
+process. Every stage has its own timeout, and a stage that fails or times out
+is reported under ``errors`` without discarding the other stages' results.
+Stages that depend on a failed stage are skipped.
+
+``iter_ad_set`` yields each stage's result as soon as it is available, with
+timing metadata, so callers can show or save partial results early; closing
+the generator cancels the stages that have not finished yet.
+
+Every entry point takes an optional ``cancel`` token
+(``services.CancelToken``). Cancelling it stops stages that have not sent
+their request and drops the responses of those already in flight; such
+stages are reported as ``CANCELLED``.
+"""
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
 from services import (
     lifestyle_shot_by_text,
     add_shadow,
     create_packshot,
-    generate_hd_image
+    generate_hd_image,
+    fan_out,
+    Cancelled,
+    CancelToken,
+    ImageHandle
 )
+from services.image import ImageInput
+from services.jobs import result_urls
 
-def generate_ad_set(
+# Seconds a stage may run before its result is given up on.
+STAGE_TIMEOUT = float(os.getenv("BRIA_STAGE_TIMEOUT", "180"))
+
+
+@dataclass
+class Stage:
+    """
+    One node of the workflow graph.
+
+    Args:
+        name: Key of the stage's result, e.g. "packshot"
+        run: Called with the results of ``depends_on``; returns the API response
+        depends_on: Stages whose results this stage needs
+        timeout: Seconds before the stage counts as failed
+        cancel: Token of this stage's own requests, cancelled when it times out
+    """
+    name: str
+    run: Callable[[Dict[str, Any]], Dict[str, Any]]
+    depends_on: Tuple[str, ...] = ()
+    timeout: float = STAGE_TIMEOUT
+    cancel: Optional[CancelToken] = None
+
+
+class StageSkipped(Exception):
+    """Raised by a stage that has nothing to work on."""
+
+
+DONE = "done"
+FAILED = "failed"
+TIMED_OUT = "timed_out"
+SKIPPED = "skipped"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class StageResult:
+    """
+    Outcome of one stage, as yielded by ``iter_stages`` and ``iter_ad_set``.
+
+    Args:
+        name: Stage name
+        status: ``DONE``, ``FAILED``, ``TIMED_OUT``, ``SKIPPED`` or ``CANCELLED``
+        response: API response of a finished stage
+        error: Error message of a stage that did not finish
+        started: Seconds from the start of the workflow until the stage started
+        elapsed: Seconds the stage ran (until its timeout, for timed-out stages)
+    """
+    name: str
+    status: str
+    response: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    started: Optional[float] = None
+    elapsed: Optional[float] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == DONE
+
+
+def build_stages(
     api_key: str,
-    image: Optional[bytes] = None,
-    prompt: Optional[str] = None,
-    config: Dict[str, Any] = None
-) -> Dict[str, Any]:
+    image: Optional[ImageInput],
+    prompt: Optional[str],
+    config: Dict[str, Any],
+    cancel: Optional[CancelToken] = None
+) -> List[Stage]:
     """
-    Generate a set of product ads based on configuration.
+    Build the stage graph for an ad set.
+
+    Args:
+        api_key: Bria AI API key
+        image: Product image; HD generation runs only without one
+        prompt: Prompt for HD generation
+        config: Workflow settings (see ``generate_ad_set``)
+        cancel: Token of the whole ad set; each stage's calls get a child of it
     """
-    if not config:
-        config = {}
-    
-    result = {}
-    
-    # Generate HD image if prompt provided
+    timeouts = config.get("stage_timeouts", {})
+    default_timeout = config.get("stage_timeout", STAGE_TIMEOUT)
+    if image:
+        # One handle for every stage, so the upload is hashed and downscaled once.
+        image = ImageHandle.of(image)
+
+    def stage(
+        name: str,
+        run: Callable[[Dict[str, Any], CancelToken], Dict[str, Any]],
+        depends_on: Tuple[str, ...]
+    ) -> Stage:
+        # A token per stage, so a stage that times out can be stopped alone.
+        token = CancelToken(parent=cancel)
+        return Stage(name, lambda inputs: run(inputs, token), depends_on, timeouts.get(name, default_timeout), token)
+
+    stages = []
+    upstream: Tuple[str, ...] = ()
+    chained = any(config.get(key, False) for key in ("create_packshot", "add_shadow", "lifestyle_shot"))
     if prompt and not image:
-        hd_response = generate_hd_image(
+        # More than four results are split into parallel requests.
+        stages.append(stage("hd_image", lambda inputs, token: fan_out(
+            generate_hd_image,
+            config.get("num_results", 1),
             api_key=api_key,
             prompt=prompt,
-            num_results=config.get("num_results", 1),
             aspect_ratio=config.get("aspect_ratio", "1:1"),
-            sync=config.get("sync", True)
-        )
-        result["hd_image"] = hd_response
-        image = hd_response.get("result_url")
-    
-    # Create packshot if requested
-    if config.get("create_packshot", False) and image:
-        packshot_response = create_packshot(
+            # Later stages need a URL that already serves the image.
+            sync=True if chained else config.get("sync", True),
+            cancel=token
+        ), ()))
+        upstream = ("hd_image",)
+    elif not image:
+        return stages
+
+    def base_image(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # Keyword arguments that hand the base image to a service.
+        if image:
+            return {"image_data": image}
+        generated = result_urls(inputs["hd_image"])
+        if not generated:
+            raise StageSkipped("HD generation returned no image")
+        return {"image_data": None, "image_url": generated[0]}
+
+    if config.get("create_packshot", False):
+        stages.append(stage("packshot", lambda inputs, token: create_packshot(
             api_key=api_key,
-            image_data=image,
-            background_color=config.get("background_color", "#FFFFFF")
-        )
-        result["packshot"] = packshot_response
-    
-    # Add shadow if requested
-    if config.get("add_shadow", False) and image:
-        shadow_response = add_shadow(
+            **base_image(inputs),
+            background_color=config.get("background_color", "#FFFFFF"),
+            sku=config.get("sku"),
+            cancel=token
+        ), upstream))
+
+    if config.get("add_shadow", False):
+        stages.append(stage("shadow", lambda inputs, token: add_shadow(
             api_key=api_key,
-            image_data=image,
-            shadow_type=config.get("shadow_type", "natural")
-        )
-        result["shadow"] = shadow_response
-    
-    # Create lifestyle shot if requested
-    if config.get("lifestyle_shot", False) and image:
-        lifestyle_response = lifestyle_shot_by_text(
+            **base_image(inputs),
+            shadow_type=config.get("shadow_type", "natural"),
+            sku=config.get("sku"),
+            cancel=token
+        ), upstream))
+
+    if config.get("lifestyle_shot", False):
+        stages.append(stage("lifestyle", lambda inputs, token: fan_out(
+            lifestyle_shot_by_text,
+            config.get("num_results", 1),
             api_key=api_key,
-            image_data=image,
+            **base_image(inputs),
             scene_description=config.get("scene_description", ""),
-            num_results=config.get("num_results", 1)
-        )
-        result["lifestyle"] = lifestyle_response
-    
-    return result 
\ No newline at end of file
+            sku=config.get("sku"),
+            cancel=token
+        ), upstream))
+
+    return stages
+
+
+def iter_stages(
+    stages: List[Stage],
+    max_workers: Optional[int] = None,
+    cancel: Optional[CancelToken] = None
+) -> Iterator[StageResult]:
+    """
+    Run a stage graph, yielding each stage's outcome as soon as it is known.
+
+    Each stage starts as soon as its dependencies are done. A stage that
+    times out is abandoned and its own token (``Stage.cancel``) cancelled,
+    so its requests stop being retried and their responses are dropped.
+    Closing the generator cancels every stage that has not started, and
+    the tokens of those still running.
+
+    Args:
+        stages: Stages to run
+        max_workers: Threads for concurrent stages (default: one per stage)
+        cancel: Token the stages were built with; once it is cancelled,
+            the remaining stages are reported as ``CANCELLED``
+    """
+    origin = time.monotonic()
+    results: Dict[str, Any] = {}
+    failed: set = set()
+    pending = {stage.name: stage for stage in stages}
+    running: Dict[Future, Stage] = {}
+    # When each stage actually began running; queued stages have no deadline yet.
+    started_at: Dict[str, float] = {}
+
+    def call(stage: Stage, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        started_at[stage.name] = time.monotonic()
+        return stage.run(inputs)
+
+    def timing(stage: Stage, now: float) -> Dict[str, Optional[float]]:
+        started = started_at.get(stage.name, now)
+        return {"started": started - origin, "elapsed": now - started}
+
+    pool = ThreadPoolExecutor(max_workers=max_workers or max(len(stages), 1), thread_name_prefix="ad-set")
+    try:
+        while pending or running:
+            if cancel is not None and cancel.cancelled:
+                now = time.monotonic()
+                reason = f"Cancelled: {cancel.reason}"
+                for stage in running.values():
+                    yield StageResult(stage.name, CANCELLED, error=reason, **timing(stage, now))
+                for name in pending:
+                    yield StageResult(name, CANCELLED, error=reason)
+                running.clear()
+                pending.clear()
+                break
+            for name, stage in list(pending.items()):
+                broken = [dep for dep in stage.depends_on if dep in failed]
+                if broken:
+                    del pending[name]
+                    failed.add(name)
+                    yield StageResult(name, SKIPPED, error=f"Skipped because {broken[0]} failed")
+                elif all(dep in results for dep in stage.depends_on):
+                    del pending[name]
+                    inputs = {dep: results[dep] for dep in stage.depends_on}
+                    running[pool.submit(call, stage, inputs)] = stage
+            if not running:
+                for name, stage in pending.items():
+                    yield StageResult(name, SKIPPED, error=f"Unknown dependency: {', '.join(stage.depends_on)}")
+                break
+
+            deadlines = [
+                started_at[stage.name] + stage.timeout
+                for stage in running.values() if stage.name in started_at
+            ]
+            if len(deadlines) < len(running) or cancel is not None:
+                # Some stages are still queued, or the token may be cancelled; check back soon.
+                deadlines.append(time.monotonic() + 0.1)
+            done, _ = wait(running, timeout=max(0.0, min(deadlines) - time.monotonic()), return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            outcomes = []
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    results[stage.name] = future.result()
+                    outcomes.append(StageResult(stage.name, DONE, response=results[stage.name], **timing(stage, now)))
+                except StageSkipped as e:
+                    failed.add(stage.name)
+                    outcomes.append(StageResult(stage.name, SKIPPED, error=f"Skipped: {str(e)}", **timing(stage, now)))
+                except Cancelled as e:
+                    failed.add(stage.name)
+                    outcomes.append(StageResult(stage.name, CANCELLED, error=f"Cancelled: {e.reason}", **timing(stage, now)))
+                except Exception as e:
+                    failed.add(stage.name)
+                    outcomes.append(StageResult(stage.name, FAILED, error=str(e), **timing(stage, now)))
+
+            for future, stage in list(running.items()):
+                if stage.name in started_at and started_at[stage.name] + stage.timeout <= now:
+                    del running[future]
+                    if stage.cancel is not None:
+                        stage.cancel.cancel("timed out")
+                    failed.add(stage.name)
+                    outcomes.append(StageResult(
+                        stage.name, TIMED_OUT, error=f"Timed out after {stage.timeout:g}s", **timing(stage, now)
+                    ))
+            yield from outcomes
+    finally:
+        # Nobody will read these results; stop paying for them.
+        for stage in running.values():
+            if stage.cancel is not None:
+                stage.cancel.cancel("abandoned")
+        if cancel is not None and running:
+            cancel.cancel("abandoned")
+        pool.shutdown(wait=False, cancel_futures=True)
+        for stage in stages:
+            if stage.cancel is not None:
+                stage.cancel.detach()
+
+
+def run_stages(
+    stages: List[Stage],
+    max_workers: Optional[int] = None,
+    cancel: Optional[CancelToken] = None
+) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Run a stage graph to completion.
+
+    Returns:
+        The responses and the error messages, each keyed by stage name
+    """
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for outcome in iter_stages(stages, max_workers, cancel):
+        if outcome.ok:
+            results[outcome.name] = outcome.response
+        else:
+            errors[outcome.name] = outcome.error
+    return results, errors
+
+
+def _ad_set_stages(
+    api_key: str,
+    image: Optional[ImageInput],
+    prompt: Optional[str],
+    config: Dict[str, Any],
+    journal: Any,
+    cancel: Optional[CancelToken]
+) -> List[Stage]:
+    if image:
+        image = ImageHandle.of(image)
+    stages = build_stages(api_key, image, prompt, config, cancel)
+    if journal is not None:
+        stages = journal.wrap(stages, image, prompt, config)
+    return stages
+
+
+def iter_ad_set(
+    api_key: str,
+    image: Optional[bytes] = None,
+    prompt: Optional[str] = None,
+    config: Dict[str, Any] = None,
+    journal: Any = None,
+    cancel: Optional[CancelToken] = None
+) -> Iterator[StageResult]:
+    """
+    Streaming variant of ``generate_ad_set``.
+
+    Yields a ``StageResult`` per stage ("hd_image", "packshot", "shadow",
+    "lifestyle") in the order the stages finish. Stop iterating (or call
+    ``close()``) to cancel the stages that have not finished yet.
+
+    Args:
+        api_key: Bria AI API key
+        image: Product image; without one, the base image is generated from ``prompt``
+        prompt: Prompt for HD generation
+        config: Same settings as ``generate_ad_set``
+        journal: Optional ``workflows.journal.Journal`` to resume from
+        cancel: Optional token that cancels the whole set
+    """
+    config = config or {}
+    # A token of our own, so closing the generator does not cancel the caller's.
+    token = CancelToken(parent=cancel)
+    stages = _ad_set_stages(api_key, image, prompt, config, journal, token)
+    return _detached(iter_stages(stages, config.get("max_workers"), token), token)
+
+
+def _detached(outcomes: Iterator[StageResult], token: CancelToken) -> Iterator[StageResult]:
+    # Release the set's token from the caller's once the set is over.
+    try:
+        yield from outcomes
+    finally:
+        token.detach()
+
+
+def generate_ad_set(
+    api_key: str,
+    image: Optional[bytes] = None,
+    prompt: Optional[str] = None,
+    config: Dict[str, Any] = None,
+    journal: Any = None,
+    cancel: Optional[CancelToken] = None
+) -> Dict[str, Any]:
+    """
+    Generate a set of product ads based on configuration.
+
+    Args:
+        api_key: Bria AI API key
+        image: Product image; without one, the base image is generated from ``prompt``
+        prompt: Prompt for HD generation
+        config: Stage switches and options ("create_packshot", "add_shadow",
+            "lifestyle_shot", "num_results" (any number; more than four are
+            requested in parallel batches), "sku" (sent with the packshot, shadow
+            and lifestyle requests), ...), plus "stage_timeout" (seconds),
+            "stage_timeouts" (per stage name) and "max_workers"
+        journal: Optional ``workflows.journal.Journal``; stages it records as
+            done are not requested again
+        cancel: Optional token; cancelling it stops the stages still running
+
+    Returns:
+        Dict with one response per finished stage ("hd_image", "packshot",
+        "shadow", "lifestyle") and, if any stage failed, an "errors" dict of
+        messages keyed by stage name
+    """
+    if not config:
+        config = {}
+
+    # A token of our own: giving up on this set must not cancel the caller's.
+    token = CancelToken(parent=cancel)
+    try:
+        stages = _ad_set_stages(api_key, image, prompt, config, journal, token)
+        result, errors = run_stages(stages, config.get("max_workers"), token)
+    finally:
+        token.detach()
+    if errors:
+        result["errors"] = errors
+    return result
@@ -0,0 +1,249 @@
+"""
+Job journal: make long workflow runs resumable.
+
+Every stage of every run is recorded in a SQLite file under the key
+(input hash, stage, config hash), moving from ``queued`` to ``in_flight``
+and then to ``done`` (with its response and result URL) or ``failed``
+(with the error). When a run is repeated with the same journal, stages
+already done are answered from it without an API call; failed stages and
+stages left in flight by a crashed run are sent again. Within a run, a
+stage another worker is already running is waited for rather than
+duplicated.
+
+The input hash covers the product image and the prompt; the config hash
+covers the settings that shape the requests, not runtime knobs such as
+timeouts or worker counts.
+"""
+from typing import Dict, Any, List, Optional
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+from services.image import ImageHandle, ImageInput
+from services.jobs import result_urls
+
+from .generate_ad_set import Stage
+
+QUEUED = "queued"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+# Settings that change how a run is executed, not what it produces.
+RUNTIME_KEYS = ("max_workers", "stage_timeout", "stage_timeouts")
+
+
+def input_hash(image: Optional[ImageInput], prompt: Optional[str]) -> str:
+    """Key for the input of a run: the product image and the prompt."""
+    digest = hashlib.sha256()
+    digest.update(ImageHandle.of(image).data if image else b"")
+    digest.update(b"\0")
+    digest.update((prompt or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def config_hash(config: Dict[str, Any]) -> str:
+    """Key for the settings of a run, ignoring ``RUNTIME_KEYS``."""
+    relevant = {key: value for key, value in config.items() if key not in RUNTIME_KEYS}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Entry:
+    """Journal state of one stage."""
+    input_hash: str
+    stage: str
+    config_hash: str
+    state: str
+    attempts: int = 0
+    response: Optional[Dict[str, Any]] = None
+    result_url: Optional[str] = None
+    error: Optional[str] = None
+    run_id: Optional[str] = None
+    updated_at: float = 0.0
+
+
+class Journal:
+    """
+    A SQLite journal of workflow stages.
+
+    Args:
+        path: SQLite file holding the journal
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Identifies this process's runs; in-flight rows of other runs are stale.
+        self.run_id = uuid.uuid4().hex
+        self.reused = 0
+        self._lock = threading.Lock()
+        self._running: Dict[tuple, threading.Event] = {}
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS stages (
+                input_hash TEXT NOT NULL, stage TEXT NOT NULL, config_hash TEXT NOT NULL,
+                state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,
+                response TEXT, result_url TEXT, error TEXT, run_id TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (input_hash, stage, config_hash)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _write(self, sql: str, params: tuple) -> None:
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+
+    def get(self, input_hash: str, stage: str, config_hash: str) -> Optional[Entry]:
+        """Return the journal state of a stage, or None if it was never queued."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, attempts, response, result_url, error, run_id, updated_at FROM stages "
+                "WHERE input_hash = ? AND stage = ? AND config_hash = ?",
+                (input_hash, stage, config_hash)
+            ).fetchone()
+        if row is None:
+            return None
+        state, attempts, response, result_url, error, run_id, updated_at = row
+        return Entry(
+            input_hash, stage, config_hash, state, attempts,
+            json.loads(response) if response else None, result_url, error, run_id, updated_at
+        )
+
+    def enqueue(self, input_hash: str, config_hash: str, stages: List[str]) -> None:
+        """Record stages as queued; stages already journaled keep their state."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO stages (input_hash, stage, config_hash, state, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(input_hash, stage, config_hash, QUEUED, now) for stage in stages]
+            )
+            self._conn.commit()
+
+    def start(self, input_hash: str, stage: str, config_hash: str) -> None:
+        self._write(
+            "INSERT INTO stages (input_hash, stage, config_hash, state, attempts, run_id, updated_at) "
+            "VALUES (?, ?, ?, ?, 1, ?, ?) ON CONFLICT (input_hash, stage, config_hash) DO UPDATE SET "
+            "state = excluded.state, attempts = attempts + 1, error = NULL, "
+            "run_id = excluded.run_id, updated_at = excluded.updated_at",
+            (input_hash, stage, config_hash, IN_FLIGHT, self.run_id, time.time())
+        )
+
+    def finish(self, input_hash: str, stage: str, config_hash: str, response: Dict[str, Any]) -> None:
+        urls = result_urls(response)
+        self._write(
+            "UPDATE stages SET state = ?, response = ?, result_url = ?, error = NULL, updated_at = ? "
+            "WHERE input_hash = ? AND stage = ? AND config_hash = ?",
+            (DONE, json.dumps(response), urls[0] if urls else None, time.time(),
+             input_hash, stage, config_hash)
+        )
+
+    def fail(self, input_hash: str, stage: str, config_hash: str, error: str) -> None:
+        self._write(
+            "UPDATE stages SET state = ?, error = ?, updated_at = ? "
+            "WHERE input_hash = ? AND stage = ? AND config_hash = ?",
+            (FAILED, error, time.time(), input_hash, stage, config_hash)
+        )
+
+    def run_stage(self, stage: Stage, inputs: Dict[str, Any], input_hash: str, config_hash: str) -> Dict[str, Any]:
+        """
+        Run a stage unless the journal already holds its result.
+
+        Returns:
+            The stage's response, from the journal or from the API
+        """
+        key = (input_hash, stage.name, config_hash)
+        while True:
+            with self._lock:
+                running = self._running.get(key)
+                if running is None:
+                    self._running[key] = threading.Event()
+            if running is None:
+                break
+            # Another worker of this run is on it; use its outcome.
+            running.wait()
+
+        try:
+            entry = self.get(*key)
+            if entry is not None and entry.state == DONE:
+                with self._lock:
+                    self.reused += 1
+                return entry.response
+            self.start(*key)
+            try:
+                response = stage.run(inputs)
+            except Exception as e:
+                self.fail(*key, str(e))
+                raise
+            self.finish(*key, response)
+            return response
+        finally:
+            with self._lock:
+                self._running.pop(key).set()
+
+    def wrap(
+        self,
+        stages: List[Stage],
+        image: Optional[ImageInput],
+        prompt: Optional[str],
+        config: Dict[str, Any]
+    ) -> List[Stage]:
+        """
+        Journal a run's stages.
+
+        Args:
+            stages: Stages built for the run
+            image: Product image of the run
+            prompt: Prompt of the run
+            config: Settings of the run
+
+        Returns:
+            Stages that skip work the journal has already recorded as done
+        """
+        inputs_key = input_hash(image, prompt)
+        config_key = config_hash(config)
+        self.enqueue(inputs_key, config_key, [stage.name for stage in stages])
+
+        def journaled(stage: Stage) -> Stage:
+            return Stage(
+                stage.name,
+                lambda inputs: self.run_stage(stage, inputs, inputs_key, config_key),
+                stage.depends_on,
+                stage.timeout,
+                stage.cancel
+            )
+
+        return [journaled(stage) for stage in stages]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of journaled stages per state."""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM stages GROUP BY state").fetchall()
+        counts = {state: 0 for state in (QUEUED, IN_FLIGHT, DONE, FAILED)}
+        counts.update(dict(rows))
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+__all__ = [
+    'Journal',
+    'Entry',
+    'QUEUED',
+    'IN_FLIGHT',
+    'DONE',
+    'FAILED',
+    'RUNTIME_KEYS',
+    'input_hash',
+    'config_hash'
+]